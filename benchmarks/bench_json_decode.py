@@ -0,0 +1,69 @@
+"""
+Parse-time benchmark for query pages.
+Builds representative wide pages (2,000 records, ~150 fields including long text and
+nested relationship fields) and times each available decoder on them.
+
+    python benchmarks/bench_json_decode.py [--records 2000] [--fields 150] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sftocsv import utils
+
+
+def build_page(records: int, fields: int) -> bytes:
+    page_records = []
+    for i in range(records):
+        record = {'attributes': {'type': 'Opportunity', 'url': f'/services/data/v58.0/sobjects/Opportunity/006{i:015d}'},
+                  'Id': f'006{i:015d}'}
+        for f in range(fields):
+            kind = f % 5
+            if kind == 0:
+                record[f'Text_{f}__c'] = f'value {i} {f} ' * 4
+            elif kind == 1:
+                record[f'Number_{f}__c'] = i * 1.5 + f
+            elif kind == 2:
+                record[f'Flag_{f}__c'] = bool((i + f) % 2)
+            elif kind == 3:
+                record[f'Empty_{f}__c'] = None
+            else:
+                record[f'Notes_{f}__c'] = '<p>' + ('rich text body ' * 20) + '</p>'
+        record['Account'] = {'attributes': {'type': 'Account', 'url': '/services/data/v58.0/sobjects/Account/001'},
+                             'Name': f'Account {i}'}
+        page_records.append(record)
+    return(json.dumps({'totalSize': records, 'done': True, 'records': page_records}).encode('utf-8'))
+
+
+def available_decoders() -> dict:
+    decoders = {'json': json.loads}
+    try:
+        import orjson
+        decoders['orjson'] = orjson.loads
+    except ImportError:
+        pass
+    try:
+        import ujson
+        decoders['ujson'] = ujson.loads
+    except ImportError:
+        pass
+    decoders['utils.decode_json (default)'] = utils.decode_json
+    return(decoders)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--fields', type=int, default=150)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    page = build_page(args.records, args.fields)
+    print(f'page: {args.records} records x {args.fields} fields, {len(page) / 1024 / 1024:.1f} MB')
+    baseline = None
+    for name, decoder in available_decoders().items():
+        best = min(timeit.repeat(lambda: decoder(page), number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f'{name:<30} {best * 1000:8.1f} ms   {baseline / best:5.2f}x')
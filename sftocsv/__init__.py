@@ -1,3 +1,10 @@
 from .sftocsv import Sftocsv
 from .utils import utils
+from .cache import QueryCache
+from .records import ColumnarRecords, ColumnarRow, RecordSchema, Row, MergedRecord
+from .index import RecordIndex
+from .csvsource import CsvSource, CsvIndex
+from .filters import Field
+from .batch import RateLimiter
+from .aio import AsyncSftocsv
 __version__ = '1.0.4'
\ No newline at end of file
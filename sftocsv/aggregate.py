@@ -0,0 +1,115 @@
+from .utils import utils
+from .records import ColumnarRecords
+
+AGGREGATIONS = ('count', 'sum', 'min', 'max', 'count_distinct')
+
+
+def _check_aggregations(aggregations: dict) -> tuple[tuple[str], tuple[str]]:
+    functions, fields = [], []
+    for name, (function, field) in aggregations.items():
+        if function not in AGGREGATIONS:
+            raise Exception(f'group_by requires one of {AGGREGATIONS} as the function of {name!r}')
+        if field is None and function != 'count':
+            raise Exception(f'group_by requires a field for {function!r} of {name!r}')
+        functions.append(function)
+        fields.append(field)
+    return((tuple(functions), tuple(fields)))
+
+
+def _key_value_rows(records, key_fields: tuple[str], value_fields: tuple[str]):
+    """
+    #### Inputs:
+        -@records: iterable of records, or ColumnarRecords
+        -@key_fields: fields grouped on
+        -@value_fields: the field of each aggregation, None for a row count
+    #### Expected Behaviour:
+        - reads only the fields that are needed. ColumnarRecords are read a column at a time, without building records
+    #### Returns:
+        - iterable of (key value, tuple of aggregated values), missing fields read as None and row counts as True
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    composite = len(key_fields) > 1
+    if isinstance(records, ColumnarRecords):
+        length = len(records)
+        key_columns = [records.column(field) for field in key_fields]
+        keys = zip(*key_columns) if composite else key_columns[0]
+        values = zip(*[records.column(field) if field is not None else [True] * length for field in value_fields])
+        return(zip(keys, values))
+    getter = utils.key_getter(key_fields, missing_as_none=True)
+    return(((getter(record), tuple([record.get(field) if field is not None else True for field in value_fields]))
+            for record in records))
+
+
+def accumulate(rows, functions: tuple[str]) -> dict:
+    """
+    #### Inputs:
+        -@rows: iterable of (key value, tuple of values) from _key_value_rows
+        -@functions: the function of each value
+    #### Expected Behaviour:
+        - one pass, keeping a running state per group and function: a count, a sum, a min, a max or a set
+            of the distinct values. None values are skipped, like sql's aggregates
+    #### Returns:
+        - dict of key value to list of states, in the order the groups were first seen
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - TypeError: raised if a key value (or a count_distinct value) can't be hashed
+    """
+    groups = {}
+    numbered = tuple(enumerate(functions))
+    for key_value, values in rows:
+        states = groups.get(key_value)
+        if states is None:
+            states = groups[key_value] = [set() if function == 'count_distinct' else (0 if function == 'count' else None)
+                                          for function in functions]
+        for i, function in numbered:
+            value = values[i]
+            if value is None:
+                continue
+            if function == 'count':
+                states[i] += 1
+            elif function == 'sum':
+                states[i] = value if states[i] is None else states[i] + value
+            elif function == 'min':
+                if states[i] is None or value < states[i]:
+                    states[i] = value
+            elif function == 'max':
+                if states[i] is None or value > states[i]:
+                    states[i] = value
+            else:
+                states[i].add(value)
+    return(groups)
+
+
+def group_by(records, keys: str | tuple[str], aggregations: dict) -> list[dict]:
+    """
+    #### Inputs:
+        -@records: a list of records, ColumnarRecords or any other iterable of records
+        -@keys: field to group on, or a tuple of fields
+        -@aggregations: dict of output field to (function, field), function one of AGGREGATIONS.
+            ('count', None) counts the rows of the group
+    #### Expected Behaviour:
+        - hash aggregation, see accumulate. Only the key and aggregated fields are read from the records
+    #### Returns:
+        - list of one dict per group: the key fields then the output fields, in the order groups are first seen
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - 'group_by requires one of..': Raised if a function isn't one of AGGREGATIONS
+        - 'group_by requires a field..': Raised if a function other than count has no field
+    """
+    key_fields = utils.key_fields(keys)
+    functions, value_fields = _check_aggregations(aggregations)
+    groups = accumulate(_key_value_rows(records, key_fields, value_fields), functions)
+    composite = len(key_fields) > 1
+    names = tuple(aggregations)
+    results = []
+    for key_value, states in groups.items():
+        result = dict(zip(key_fields, key_value)) if composite else {key_fields[0]: key_value}
+        for name, function, state in zip(names, functions, states):
+            result[name] = len(state) if function == 'count_distinct' else state
+        results.append(result)
+    return(results)
@@ -0,0 +1,263 @@
+import asyncio
+import urllib
+from .utils import utils
+from .cache import QueryCache
+from .streaming import PageStreamParser
+from .sftocsv import Sftocsv
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncSftocsv:
+    """
+    asyncio version of the Sftocsv query functions. Every request goes through one aiohttp session
+    and a semaphore, so any number of queries, pages and in-chunks can be awaited together on one event loop
+    while at most max_concurrency requests are in flight. Results have the same shapes as Sftocsv's.
+    Use it as an async context manager (or await close()) so the session is closed.
+    """
+
+    def __init__(self, base_url: str, api_version: float, access_token: str, max_concurrency: int = 10,
+                 session=None, cache: QueryCache | None = None):
+        """
+        #### Inputs:
+            -@base_url: Salesforce org url (i.e 'https://examplecompany.my.salesforce.com')
+            -@api_version: salesforce api version in float format (i.e 58.0)
+            -@access_token: client credentials flow access token
+            -@max_concurrency: most requests in flight at once
+            -@session: optional aiohttp.ClientSession (or anything with the same get), created on first use if None.
+                A passed in session isn't closed by close()
+            -@cache: optional QueryCache, see Sftocsv. Its file reads and writes run on a worker thread
+        #### Exceptions:
+            - 'Access Token missing': Raised if access_token is empty
+            - ImportError: Raised if no session is passed in and aiohttp isn't installed
+        """
+        if not access_token:
+            raise Exception('Access Token missing')
+        if session is None and aiohttp is None:
+            raise ImportError('AsyncSftocsv requires aiohttp, install it with pip install "sftocsv[aio]" (or pip install aiohttp) or pass in a session')
+        self.base_url = base_url
+        self.api_version = f'v{str(api_version)}'
+        self.access_token = access_token
+        self.cache = cache
+        self._session = session
+        self._owns_session = session is None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+
+    async def __aenter__(self):
+        return(self)
+
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+    async def close(self):
+        """
+        #### Expected Behaviour:
+            - closes the session if it was created by this instance
+        #### Returns:
+            - None
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return(self._session)
+
+
+    async def query_records(self, querystring: str, nested: bool = False,
+                            record_format: str = 'dict') -> list[dict] | dict[str, list[dict]]:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@nested: see Sftocsv.query_records
+            -@record_format: one of ('dict', 'columnar', 'row'), see Sftocsv.query_records
+        #### Expected Behaviour:
+            - awaits every page of the query (or reads them from the cache), then shapes the records
+                exactly like Sftocsv.query_records. The pages after the first are requested together, see _fetch_pages
+            - reading and writing the cache runs on a worker thread (asyncio.to_thread) so the event loop isn't blocked
+        #### Returns:
+            - list[dict], or dict[str, list[dict]] if nested (ColumnarRecords / Rows depending on record_format)
+        #### Side Effects:
+            - if a cache is set, a miss saves the raw pages to it
+        #### Exceptions:
+            - If the status returned by a query != 200, re-raises the error as an exception
+            - 'query_records requires one of..' If the 'record_format' doesn't match one of the valid values
+        """
+        if record_format not in ('dict', 'columnar', 'row'):
+            raise Exception('query_records requires one of ("dict", "columnar", "row") in "record_format" argument')
+        pages = None
+        if self.cache is not None:
+            pages = await asyncio.to_thread(self.cache.get, self.base_url, self.api_version, querystring)
+        if pages is None:
+            pages = await self._fetch_pages(querystring)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put, self.base_url, self.api_version, querystring, pages)
+        pages.reverse() # popped from the end, so each page is freed once its records are shaped
+        return(Sftocsv._shape_records((record for _ in range(len(pages)) for record in pages.pop()), nested, record_format))
+
+
+    async def query_many(self, querystrings: list[str], nested: bool = False, record_format: str = 'dict') -> list:
+        """
+        #### Inputs:
+            -@querystrings: list of soql queries
+            -@nested: see query_records
+            -@record_format: see query_records
+        #### Expected Behaviour:
+            - runs every query concurrently (bounded by max_concurrency)
+        #### Returns:
+            - list of the query_records results, in the order of querystrings
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - the first exception raised by a query
+        """
+        return(list(await asyncio.gather(*[self.query_records(querystring, nested=nested, record_format=record_format)
+                                             for querystring in querystrings])))
+
+
+    async def _fetch_pages(self, querystring: str) -> list[list[dict]]:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+        #### Expected Behaviour:
+            - requests the first page, then works out every other page's url from the query locator in its
+                nextRecordsUrl ('.../query/<locator>-<offset>') and the totalSize like Sftocsv._fetch_pages_parallel,
+                and awaits them all together (bounded by max_concurrency). Each page goes into its own slot
+            - if the nextRecordsUrl isn't of that form, or the pages don't add up (see Sftocsv._offset_pages_complete),
+                the pages are followed one after another from the first
+            - pages are decoded on a worker thread (asyncio.to_thread) so the event loop isn't blocked
+        #### Returns:
+            - list[list[dict]]: the raw records of each page, attributes included
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - If the status returned by a query != 200, re-raises the error as an exception
+        """
+        quoted_querystring = urllib.parse.quote_plus(querystring)
+        status, content = await self._get(f"/services/data/{self.api_version}/query/?q={quoted_querystring}")
+        if status != 200:
+            raise Exception(f'Query of -->{quoted_querystring}<-- raised error: \n {str(content)}')
+        resp_json = await asyncio.to_thread(utils.decode_json, content)
+        pages = [resp_json['records']]
+        next_url = resp_json.get('nextRecordsUrl', None)
+        if not next_url:
+            return(pages)
+
+        async def fetch_page(page_url: str) -> dict:
+            status, content = await self._get(page_url)
+            if status != 200:
+                raise Exception(f'Query of -->{quoted_querystring}<-- on nextUrl -->{page_url}<-- raised error: \n {str(content)}')
+            return(await asyncio.to_thread(utils.decode_json, content))
+
+        batch_size = len(pages[0])
+        locator, _, offset = next_url.rpartition('-')
+        if offset.isdigit() and int(offset) == batch_size:
+            page_count = -(-resp_json['totalSize'] // batch_size)
+            resp_jsons = await asyncio.gather(*[fetch_page(f"{locator}-{page * batch_size}") for page in range(1, page_count)])
+            offset_pages = pages + [page_json['records'] for page_json in resp_jsons]
+            if Sftocsv._offset_pages_complete(offset_pages, batch_size, resp_json['totalSize']):
+                return(offset_pages)
+        while next_url:
+            resp_json = await fetch_page(next_url)
+            pages.append(resp_json['records'])
+            next_url = resp_json.get('nextRecordsUrl', None)
+        return(pages)
+
+
+    async def _get(self, path: str) -> tuple[int, bytes]:
+        async with self._semaphore:
+            async with self._get_session().get(f"{self.base_url}{path}", headers=self._headers()) as resp:
+                return((resp.status, await resp.read()))
+
+
+    def _headers(self) -> dict:
+        return({"Authorization": f"Bearer {self.access_token}"})
+
+
+    async def iter_records(self, querystring: str, nested: bool = False, chunk_size: int = 65536):
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@nested: If True the 'attributes' section of each record is kept
+            -@chunk_size: number of bytes read from the socket at a time
+        #### Expected Behaviour:
+            - async version of Sftocsv.iter_records, each page is streamed through a PageStreamParser
+                and records are yielded as their bytes arrive. A request slot is held while a page is read
+        #### Returns:
+            - async generator of records (dicts), in query order (use async for)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - If the status returned by a query != 200, re-raises the error as an exception
+        """
+        quoted_querystring = urllib.parse.quote_plus(querystring)
+        next_url = f"/services/data/{self.api_version}/query/?q={quoted_querystring}"
+        first_page = True
+        while next_url:
+            parser = PageStreamParser()
+            async with self._semaphore:
+                async with self._get_session().get(f"{self.base_url}{next_url}", headers=self._headers()) as resp:
+                    if resp.status != 200:
+                        content = await resp.read()
+                        if first_page:
+                            raise Exception(f'Query of -->{quoted_querystring}<-- raised error: \n {str(content)}')
+                        raise Exception(f'Query of -->{quoted_querystring}<-- on nextUrl -->{next_url}<-- raised error: \n {str(content)}')
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        for record in parser.feed(chunk):
+                            if not nested:
+                                del(record['attributes'])
+                            yield record
+            next_url = parser.close().get('nextRecordsUrl', None)
+            first_page = False
+
+
+    async def large_in_query(self, querystring: str, in_list: list, nested: bool = False,
+                             record_format: str = 'dict') -> list[dict] | dict[str, list[dict]]:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ... <in> ...'
+            -@in_list: a list to substitute into the spot of <in>
+            -@nested: see query_records
+            -@record_format: 'dict' or 'row' ('columnar' results of chunks can't be concatenated)
+        #### Expected Behaviour:
+            - splits the in_list into queries that fit the query length limit like Sftocsv.large_in_query,
+                then runs all of the chunk queries concurrently and combines the results in chunk order
+        #### Returns:
+            - list[dict], or dict[str, list[dict]] if nested
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - No '<in>' found...: Raised if the querystring has no <in> substring
+            - in_list is empty: Raised if in_list is empty
+        """
+        if('<in>' not in querystring):
+            raise Exception(f'No <in> found in query -->{querystring}<--')
+        if(len(in_list) == 0):
+            raise Exception('in_list is empty')
+        if record_format == 'columnar':
+            raise Exception('large_in_query requires one of ("dict", "row") in "record_format" argument')
+        querystrings = []
+        remaining_list = in_list
+        while len(remaining_list) > 0:
+            built_querystring, remaining_list = utils.build_in_querystring(querystring, remaining_list)
+            querystrings.append(built_querystring)
+        results = await self.query_many(querystrings, nested=nested, record_format=record_format)
+        if(nested):
+            current_records = {}
+            for resp in results:
+                current_records = utils.combine_nested_result_dicts(source_dict=resp, destination_dict=current_records)
+            return(current_records)
+        return([record for resp in results for record in resp])
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .cache import QueryCache
+
+
+class RateLimiter:
+    """
+    Thread safe token bucket. Pass one to Sftocsv(rate_limiter=...) and every request of the instance,
+    from any thread, waits for a token first.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        """
+        #### Inputs:
+            -@rate: requests per second allowed on average
+            -@burst: requests allowed back to back after an idle spell (defaults to the rate, at least 1)
+        """
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self):
+        """
+        #### Expected Behaviour:
+            - takes a token, sleeping until one is available
+        #### Returns:
+            - None
+        #### Side Effects:
+            - may block the calling thread
+        #### Exceptions:
+            - None
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_history(history_path: str) -> dict:
+    """
+    #### Inputs:
+        -@history_path: json file written by save_history
+    #### Returns:
+        - dict of normalized soql to {'rows', 'seconds'} of its last run, empty if there's no file
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    if history_path is None or not os.path.isfile(history_path):
+        return({})
+    with open(history_path, 'r') as history_file:
+        return(json.load(history_file))
+
+
+def save_history(history_path: str, history: dict):
+    """
+    #### Inputs:
+        -@history_path: json file to write
+        -@history: dict of normalized soql to {'rows', 'seconds'}
+    #### Expected Behaviour:
+        - written to a uniquely named temporary file next to it first, so a failed write never leaves a broken
+            history. A failed write removes the temporary file
+    #### Returns:
+        - None
+    #### Side Effects:
+        - writes the history file
+    #### Exceptions:
+        - re-raises any error of the write
+    """
+    temp_file = tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(history_path)), suffix='.tmp', delete=False)
+    try:
+        with temp_file:
+            json.dump(history, temp_file)
+        os.replace(temp_file.name, history_path)
+    except BaseException:
+        os.unlink(temp_file.name)
+        raise
+
+
+def schedule(manifest: list[dict], history: dict) -> list[dict]:
+    """
+    #### Inputs:
+        -@manifest: list of jobs, each a dict with a 'query'
+        -@history: from load_history
+    #### Expected Behaviour:
+        - orders the jobs longest first by the row count of their last run, so the longest query starts straight
+            away and the short ones fill in around it. Jobs with no history go first, as they might be the longest
+    #### Returns:
+        - the jobs in the order to start them
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    return([manifest[position] for position in _schedule_positions(manifest, history)])
+
+
+def _schedule_positions(manifest: list[dict], history: dict) -> list[int]:
+    def expected_rows(position: int) -> float:
+        past = history.get(QueryCache.normalize_soql(manifest[position]['query']))
+        return(float('inf') if past is None else past['rows'])
+    return(sorted(range(len(manifest)), key=expected_rows, reverse=True))
+
+
+def run_batch(resource, manifest: list[dict], workers: int = 4, history_path: str = None) -> list[dict]:
+    """
+    #### Inputs:
+        -@resource: the Sftocsv instance to query with, its session, token and rate limiter are shared by every job
+        -@manifest: list of jobs, each a dict of 'query', optional 'output' (csv filename) and optional 'nested'
+        -@workers: number of jobs run at once
+        -@history_path: optional json file of the row counts of earlier runs, used to schedule and updated after
+    #### Expected Behaviour:
+        - the jobs are started longest first (see schedule) on a pool of threads, each runs query_records and
+            writes its output with records_to_csv. A failing job doesn't stop the others
+        - if the resource has no session, one requests.Session (pooling a connection per worker) is set on it for
+            the batch so the jobs reuse connections, then closed and removed
+    #### Returns:
+        - one dict per job, in manifest order: the job plus 'rows', 'seconds' and 'error' (None if it succeeded).
+            Jobs are told apart by their position, so a job listed twice runs twice
+    #### Side Effects:
+        - writes the outputs and the history file
+    #### Exceptions:
+        - None
+    """
+    history = load_history(history_path)
+    batch_session = None
+    if resource.session is None:
+        batch_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 10))
+        batch_session.mount('https://', adapter)
+        batch_session.mount('http://', adapter)
+        resource.session = batch_session
+
+    def run_job(job: dict) -> dict:
+        start = time.monotonic()
+        try:
+            records = resource.query_records(job['query'], nested=job.get('nested', False))
+            rows = sum(len(x) for x in records.values()) if isinstance(records, dict) else len(records)
+            if job.get('output'):
+                resource.records_to_csv(records, job['output'])
+            return({**job, 'rows': rows, 'seconds': time.monotonic() - start, 'error': None})
+        except Exception as e:
+            return({**job, 'rows': None, 'seconds': time.monotonic() - start, 'error': str(e)})
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {position: executor.submit(run_job, manifest[position]) for position in _schedule_positions(manifest, history)}
+        results = [futures[position].result() for position in range(len(manifest))]
+    finally:
+        if batch_session is not None:
+            resource.session = None
+            batch_session.close()
+    if history_path is not None:
+        for result in results:
+            if result['error'] is None:
+                history[QueryCache.normalize_soql(result['query'])] = {'rows': result['rows'], 'seconds': result['seconds']}
+        save_history(history_path, history)
+    return(results)
@@ -0,0 +1,72 @@
+import io
+import csv
+import time
+from .utils import utils
+
+
+def bulk_query(resource, querystring: str, max_records: int = None, poll_interval: float = 2.0,
+               timeout: float = 3600) -> list[dict]:
+    """
+    #### Inputs:
+        -@resource: the Sftocsv instance to send the requests with
+        -@querystring: soql of form 'SELECT ... from ... where ...' (no subqueries)
+        -@max_records: rows per result page, None lets salesforce pick
+        -@poll_interval: seconds between job status checks
+        -@timeout: seconds to wait for the job before giving up
+    #### Expected Behaviour:
+        - creates a Bulk API 2.0 query job, polls it until it completes, then reads the csv result pages
+            by following the Sforce-Locator header. The record list is sized from the job's processed count up front
+        - bulk results are csv, so every value is a string, empty values read as None and
+            relationship fields are flat (i.e 'Account.Name') rather than nested dicts
+    #### Returns:
+        - list[dict] of the records
+    #### Side Effects:
+        - creates a query job in the org
+    #### Exceptions:
+        - If status_code returned by a request != 200, re-raises the error as an exception
+        - 'Bulk query of.. ended in state..': Raised if the job fails or is aborted
+        - 'Bulk query of.. timed out..': Raised if the job doesn't complete within timeout
+    """
+    header_dict = {"Authorization": f"Bearer {resource.access_token}"}
+    jobs_url = f"{resource.base_url}/services/data/{resource.api_version}/jobs/query"
+    resp = resource._post(url=jobs_url, headers=header_dict, json={'operation': 'query', 'query': querystring})
+    if resp.status_code != 200:
+        raise Exception(f'Bulk query of -->{querystring}<-- raised error: \n {str(resp.content)}')
+    job_url = f"{jobs_url}/{utils.decode_json(resp.content)['id']}"
+    deadline = time.monotonic() + timeout
+    while True:
+        resp = resource._get(url=job_url, headers=header_dict)
+        if resp.status_code != 200:
+            raise Exception(f'Bulk query of -->{querystring}<-- raised error: \n {str(resp.content)}')
+        job = utils.decode_json(resp.content)
+        if job['state'] == 'JobComplete':
+            break
+        if job['state'] in ('Failed', 'Aborted'):
+            raise Exception(f"Bulk query of -->{querystring}<-- ended in state {job['state']}: \n {job.get('errorMessage')}")
+        if time.monotonic() > deadline:
+            raise Exception(f'Bulk query of -->{querystring}<-- timed out after {timeout} seconds')
+        time.sleep(poll_interval)
+    records = [None] * job.get('numberRecordsProcessed', 0)
+    filled = 0
+    locator = None
+    while True:
+        params = {}
+        if max_records:
+            params['maxRecords'] = max_records
+        if locator:
+            params['locator'] = locator
+        resp = resource._get(url=f'{job_url}/results', headers=header_dict, params=params)
+        if resp.status_code != 200:
+            raise Exception(f'Bulk query of -->{querystring}<-- on locator -->{locator}<-- raised error: \n {str(resp.content)}')
+        for row in csv.DictReader(io.StringIO(resp.content.decode('utf-8'))):
+            record = {key: (value if value != '' else None) for key, value in row.items()}
+            if filled < len(records):
+                records[filled] = record
+            else:
+                records.append(record)
+            filled += 1
+        locator = resp.headers.get('Sforce-Locator')
+        if not locator or locator == 'null':
+            break
+    del(records[filled:])
+    return(records)
@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import gzip
+import time
+import hashlib
+import tempfile
+from .utils import utils
+
+
+class QueryCache:
+    """
+    Opt-in on-disk cache of raw query pages, pass an instance to Sftocsv(cache=...) to use it.
+    Entries are keyed on the normalized soql, the api version and the org url.
+    """
+
+    def __init__(self, cache_dir: str = None, ttl: float = 3600, max_bytes: int = 512 * 1024 * 1024):
+        """
+        #### Inputs:
+            -@cache_dir: folder the cache entries are stored in, created if it doesn't exist.
+                None for 'sftocsv_cache' in the system temp folder (tempfile.gettempdir(), so TMPDIR and Windows are respected)
+            -@ttl: seconds an entry stays valid after it's written
+            -@max_bytes: size cap of the cache folder, least recently used entries are evicted past it
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), 'sftocsv_cache')
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    @staticmethod
+    def normalize_soql(querystring: str) -> str:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+        #### Expected Behaviour:
+            - Whitespace is collapsed and everything outside of quoted literals is lowercased,
+                literals are kept as they are because their case matters to the query
+        #### Returns:
+            - the normalized querystring
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        parts = re.split(r"('(?:[^'\\]|\\.)*')", querystring.strip())
+        normalized = []
+        for i, part in enumerate(parts):
+            if i % 2 == 1:
+                normalized.append(part)
+            else:
+                normalized.append(re.sub(r'\s+', ' ', part).lower())
+        return(''.join(normalized))
+
+
+    def entry_path(self, base_url: str, api_version: str, querystring: str) -> str:
+        """
+        #### Inputs:
+            -@base_url: Salesforce org url
+            -@api_version: api version string (i.e 'v58.0')
+            -@querystring: soql the entry is for
+        #### Expected Behaviour:
+            - hashes the org, version and normalized soql into the filename of the entry
+        #### Returns:
+            - path of the entry file (it may not exist)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        raw_key = f'{base_url.rstrip("/").lower()}|{api_version}|{QueryCache.normalize_soql(querystring)}'
+        digest = hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+        return(os.path.join(self.cache_dir, f'{digest}.jsonl.gz'))
+
+
+    def get(self, base_url: str, api_version: str, querystring: str) -> list[list[dict]] | None:
+        """
+        #### Inputs:
+            -@base_url: Salesforce org url
+            -@api_version: api version string (i.e 'v58.0')
+            -@querystring: soql to look up
+        #### Expected Behaviour:
+            - if an entry exists and is younger than the ttl, its pages are read back and
+                the entry is marked as used (access time) for the LRU eviction
+            - expired entries are removed
+        #### Returns:
+            - list[list[dict]]: the cached pages of raw records
+            - None: if there is no valid entry
+        #### Side Effects:
+            - updates the access time of the entry, may delete an expired entry
+        #### Exceptions:
+            - None
+        """
+        path = self.entry_path(base_url, api_version, querystring)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - stat.st_mtime > self.ttl:
+            self._remove(path)
+            return None
+        with gzip.open(path, 'rt', encoding='utf-8') as entry_file:
+            pages = [utils.decode_json(line) for line in entry_file]
+        os.utime(path, (now, stat.st_mtime))
+        return(pages)
+
+
+    def put(self, base_url: str, api_version: str, querystring: str, pages: list[list[dict]]):
+        """
+        #### Inputs:
+            -@base_url: Salesforce org url
+            -@api_version: api version string (i.e 'v58.0')
+            -@querystring: soql the pages came from
+            -@pages: list of pages, each page being the raw record list of one response
+        #### Expected Behaviour:
+            - each page is written as one compact json line into a gzipped entry file,
+                written to a uniquely named temporary file first so readers never see a partial entry 
+                and concurrent writers (threads or processes) never share one. A failed write removes it
+            - then entries are evicted until the cache is under max_bytes
+        #### Returns:
+            - None
+        #### Side Effects:
+            - writes the entry file, may delete other entries
+        #### Exceptions:
+            - re-raises any error of the write (i.e a record that isn't json serializable) 
+        """
+        path = self.entry_path(base_url, api_version, querystring)
+        temp_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False)
+        try:
+            with temp_file, gzip.open(temp_file, 'wt', encoding='utf-8', compresslevel=6) as entry_file:
+                for page in pages:
+                    entry_file.write(json.dumps(page, separators=(',', ':')))
+                    entry_file.write('\n')
+            os.replace(temp_file.name, path)
+        except BaseException:
+            os.unlink(temp_file.name)
+            raise
+        self.evict()
+
+
+    def invalidate(self, base_url: str, api_version: str, querystring: str) -> bool:
+        """
+        #### Inputs:
+            -@base_url: Salesforce org url
+            -@api_version: api version string (i.e 'v58.0')
+            -@querystring: soql of the entry to drop
+        #### Expected Behaviour:
+            - removes the entry for the query if there is one
+        #### Returns:
+            - True if an entry was removed, otherwise False
+        #### Side Effects:
+            - may delete the entry file
+        #### Exceptions:
+            - None
+        """
+        return(self._remove(self.entry_path(base_url, api_version, querystring)))
+
+
+    def clear(self):
+        """
+        #### Expected Behaviour:
+            - removes every entry in the cache_dir
+        #### Returns:
+            - None
+        #### Side Effects:
+            - deletes all entry files
+        #### Exceptions:
+            - None
+        """
+        for path, _ in self._entries():
+            self._remove(path)
+
+
+    def evict(self):
+        """
+        #### Expected Behaviour:
+            - expired entries are removed, then if the total size is still over max_bytes,
+                entries are removed least recently used first until it fits
+        #### Returns:
+            - None
+        #### Side Effects:
+            - may delete entry files
+        #### Exceptions:
+            - None
+        """
+        now = time.time()
+        live_entries = []
+        for path, stat in self._entries():
+            if now - stat.st_mtime > self.ttl:
+                self._remove(path)
+            else:
+                live_entries.append((stat.st_atime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in live_entries)
+        live_entries.sort()
+        for _, size, path in live_entries:
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+
+    def _entries(self) -> list:
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.jsonl.gz'):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                entries.append((path, os.stat(path)))
+            except FileNotFoundError:
+                continue
+        return(entries)
+
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
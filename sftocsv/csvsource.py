@@ -0,0 +1,210 @@
+import os
+import csv
+import mmap
+from array import array
+from .index import RecordIndex
+
+
+class CsvSource:
+    """
+    Records of a csv file (i.e one written by records_to_csv) read from disk as they're needed.
+    Iterating streams the rows through csv.DictReader, so any join or records_to_csv can take it like a
+    generator. Indexing, len and index() memory map the file and record the byte offset of each row
+    (the only thing held per row), so a row can be read on its own.
+    Values are strings, as csv.DictReader reads them.
+    """
+
+    def __init__(self, path: str, encoding: str = 'utf-8'):
+        """
+        #### Inputs:
+            -@path: the csv file (.csv is optional on the end, like records_to_csv)
+            -@encoding: encoding of the file
+        #### Exceptions:
+            - FileNotFoundError: Raised if the file doesn't exist
+        """
+        if not os.path.isfile(path) and os.path.isfile(f'{path}.csv'):
+            path = f'{path}.csv'
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.encoding = encoding
+        self._fieldnames = None
+        self._offsets = None
+        self._map = None
+
+
+    @property
+    def fieldnames(self) -> list[str]:
+        """
+        #### Returns:
+            - the header of the file
+        """
+        if self._fieldnames is None:
+            with open(self.path, 'r', newline='', encoding=self.encoding) as csv_file:
+                self._fieldnames = next(csv.reader(csv_file), [])
+        return(self._fieldnames)
+
+
+    def __iter__(self):
+        with open(self.path, 'r', newline='', encoding=self.encoding) as csv_file:
+            for row in csv.DictReader(csv_file):
+                yield row
+
+
+    def _scan(self):
+        """
+        #### Expected Behaviour:
+            - maps the file and records where each row starts and ends. A line ends a row once the quotes
+                read so far are balanced, so quoted values holding line breaks stay in their row
+        #### Returns:
+            - None
+        #### Side Effects:
+            - keeps the file mapped until close()
+        #### Exceptions:
+            - None
+        """
+        offsets = array('q')
+        if os.path.getsize(self.path) == 0:
+            self._offsets = offsets
+            return
+        with open(self.path, 'rb') as csv_file:
+            file_map = mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(file_map)
+        header = True
+        start = position = 0
+        quotes = 0
+        while position < size:
+            end = file_map.find(b'\n', position)
+            end = size if end == -1 else end + 1
+            quotes += file_map[position:end].count(b'"')
+            position = end
+            if quotes % 2:
+                continue
+            if header:
+                header = False
+            elif file_map[start:end].rstrip(b'\r\n'): # csv.DictReader skips blank lines too
+                offsets.append(start)
+                offsets.append(end)
+            start = end
+            quotes = 0
+        self._map = file_map
+        self._offsets = offsets
+
+
+    def _read(self, row: int) -> dict:
+        start, end = self._offsets[2 * row], self._offsets[2 * row + 1]
+        values = next(csv.reader([self._map[start:end].decode(self.encoding)]))
+        record = dict(zip(self.fieldnames, values))
+        for field in self.fieldnames[len(values):]:
+            record[field] = None # short rows read like csv.DictReader's
+        return(record)
+
+
+    def __len__(self) -> int:
+        if self._offsets is None:
+            self._scan()
+        return(len(self._offsets) // 2)
+
+
+    def __getitem__(self, row):
+        if self._offsets is None:
+            self._scan()
+        if isinstance(row, slice):
+            return([self._read(i) for i in range(*row.indices(len(self)))])
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('CsvSource index out of range')
+        return(self._read(row))
+
+
+    def index(self, key: str | tuple[str], unique: bool = False, key_func=None) -> 'CsvIndex':
+        """
+        #### Inputs:
+            -@key: the column to index on, or a tuple of columns for a composite key
+            -@unique: if True, every row must have a different key value
+            -@key_func: optional callable applied to each key value (i.e utils.normalize_key)
+        #### Expected Behaviour:
+            - reads the file once to map each key value to its rows, see CsvIndex
+        #### Returns:
+            - a CsvIndex on the key
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - 'RecordIndex key .. is not unique': Raised if unique is True and a key value repeats
+        """
+        return(CsvIndex(self, key, unique=unique, key_func=key_func))
+
+
+    def close(self):
+        """
+        #### Expected Behaviour:
+            - unmaps the file, it's mapped again if a row is read after
+        #### Returns:
+            - None
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        if self._map is not None:
+            self._map.close()
+        self._map = None
+        self._offsets = None
+
+
+    def __repr__(self) -> str:
+        return(f'CsvSource({self.path!r})')
+
+
+class CsvIndex(RecordIndex):
+    """
+    RecordIndex over a CsvSource. Only the key values and row numbers are held, the rows themselves
+    are read from the mapped file when a lookup or a join finds them, so a join can probe a csv much
+    bigger than memory. Pass it to the joins like a RecordIndex.
+    """
+
+    @staticmethod
+    def _hold(records):
+        return(records)
+
+
+    def join_tables(self) -> tuple[dict, list]:
+        """
+        #### Expected Behaviour:
+            - like RecordIndex.join_tables, but the table reads the matching rows when it's probed
+                rather than holding them. Every row has every column, so none are left out unless
+                a key field isn't a column at all
+        #### Returns:
+            - (mapping of key value to list of records, list of (key value, record) for unhashable key values)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        if self._join_tables is None:
+            complete = all(field in self.records.fieldnames for field in self.fields)
+            self._join_tables = (_CsvJoinTable(self if complete else None), [])
+        return(self._join_tables)
+
+
+    def __repr__(self) -> str:
+        return(f'CsvIndex({self.records.path!r}, key={self.fields}, unique={self.unique})')
+
+
+class _CsvJoinTable:
+
+    def __init__(self, index: CsvIndex | None):
+        self._index = index._index if index is not None else {}
+        self._records = index.records if index is not None else ()
+
+
+    def get(self, key_value, default=None):
+        positions = self._index.get(key_value)
+        if not positions:
+            return(default)
+        return([self._records[i] for i in positions])
+
+
+    def __contains__(self, key_value) -> bool:
+        return(key_value in self._index)
@@ -0,0 +1,124 @@
+import hashlib
+from .utils import utils
+from .records import ColumnarRecords
+from .index import RecordIndex
+from .csvsource import CsvSource
+
+
+def _compared(value, value_func):
+    # records_to_csv writes None as '', so a missing field, None and '' all read as ''
+    if value is None:
+        value = ''
+    return(value if value_func is None else value_func(value))
+
+
+def fingerprint(record, fields: tuple[str] | None, value_func=None) -> bytes:
+    """
+    #### Inputs:
+        -@record: a record
+        -@fields: fields to fingerprint, None for all of them
+        -@value_func: optional callable applied to each value first
+    #### Returns:
+        - a 16 byte blake2b digest of the repr of the values. Missing fields, None and '' give the same digest
+            and with fields None the items are sorted, so the order of the record's keys doesn't matter.
+            Unlike hash() (hash(-1) == hash(-2)) different values don't share a digest, so matching digests
+            can be skipped. Values that compare equal but print differently (i.e 1 and 1.0) only cost a field comparison
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    if fields is None:
+        values = [(field, _compared(value, value_func)) for field, value in record.items()]
+        values = tuple(sorted([item for item in values if not (isinstance(item[1], str) and item[1] == '')]))
+    else:
+        values = tuple([_compared(record.get(field), value_func) for field in fields])
+    return(hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).digest())
+
+
+def field_deltas(old_record, new_record, fields: tuple[str] | None, value_func=None) -> dict:
+    """
+    #### Inputs:
+        -@old_record: the record of the old extract
+        -@new_record: the record of the new extract
+        -@fields: fields to compare, None for every field of either record
+        -@value_func: optional callable applied to each value before comparing
+    #### Returns:
+        - dict of field to (old value, new value) for the fields that differ. A missing field reads as None,
+            and missing, None and '' compare equal
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    if fields is None:
+        fields = dict.fromkeys(old_record)
+        fields.update(dict.fromkeys(new_record))
+    deltas = {}
+    for field in fields:
+        old_value, new_value = old_record.get(field), new_record.get(field)
+        if _compared(old_value, value_func) != _compared(new_value, value_func):
+            deltas[field] = (old_value, new_value)
+    return(deltas)
+
+
+def diff(old, new, key: str | tuple[str], fields: list[str] = None, key_func=None, value_func=None):
+    """
+    #### Inputs:
+        -@old: the old extract, a list, ColumnarRecords, CsvSource or RecordIndex (any other iterable is listed)
+        -@new: the new extract, any iterable of records, read once
+        -@key: the field identifying a record, or a tuple of fields for a composite key
+        -@fields: fields to compare, None for all of them
+        -@key_func: optional callable applied to each key value (i.e utils.normalize_key)
+        -@value_func: optional callable applied to each value before comparing (i.e str, to compare a csv against a query).
+            None values are passed to it as ''
+    #### Expected Behaviour:
+        - one pass over old keeps only each key value's fingerprint and position, then new is streamed against it.
+            Records whose fingerprints match are skipped without comparing fields, the rest are compared
+            field by field (old records are read back by position, so a CsvSource is never loaded whole)
+        - records missing a key field read its value as None
+        - a missing field, None and '' are the same value, as records_to_csv writes None as an empty cell
+    #### Returns:
+        - generator of dicts of 'change' ('inserted', 'changed' or 'deleted'), 'key', 'old' and 'new' records
+            (None on the side that has none) and 'deltas' (field to (old value, new value), empty unless changed).
+            Inserted and changed come in the order of new, then deleted in the order of old
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - 'diff_records key .. is not unique..': Raised if a key value repeats in either extract
+    """
+    if isinstance(old, RecordIndex):
+        old = old.records
+    if not isinstance(old, (list, ColumnarRecords, CsvSource)):
+        old = list(old)
+    fields = tuple(fields) if fields is not None else None
+    getter = utils.key_getter(key, missing_as_none=True, key_func=key_func)
+    old_table = {}
+    for position, record in enumerate(old):
+        key_value = getter(record)
+        if key_value in old_table:
+            raise Exception(f'diff_records key {key_value!r} is not unique in the old records')
+        old_table[key_value] = (fingerprint(record, fields, value_func), position)
+
+    def entries():
+        seen = set()
+        for record in new:
+            key_value = getter(record)
+            if key_value in seen:
+                raise Exception(f'diff_records key {key_value!r} is not unique in the new records')
+            seen.add(key_value)
+            match = old_table.get(key_value)
+            if match is None:
+                yield {'change': 'inserted', 'key': key_value, 'old': None, 'new': record, 'deltas': {}}
+                continue
+            old_fingerprint, position = match
+            if old_fingerprint == fingerprint(record, fields, value_func):
+                continue
+            old_record = old[position]
+            deltas = field_deltas(old_record, record, fields, value_func)
+            if deltas:
+                yield {'change': 'changed', 'key': key_value, 'old': old_record, 'new': record, 'deltas': deltas}
+        for key_value, (_, position) in old_table.items():
+            if key_value not in seen:
+                yield {'change': 'deleted', 'key': key_value, 'old': old[position], 'new': None, 'deltas': {}}
+    return(entries())
@@ -0,0 +1,360 @@
+import re
+import math
+from decimal import Decimal
+from datetime import date, datetime, timezone
+from .utils import utils
+
+
+def soql_literal(value) -> str:
+    """
+    #### Inputs:
+        -@value: a python value
+    #### Returns:
+        - the value written as a soql literal: quoted and escaped strings, true/false, null, numbers
+            (floats without an exponent, i.e 100000000000000000000 for 1e20), dates, and datetimes in UTC.
+            Naive datetimes are taken as local time
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - TypeError: raised for a value with no soql literal (including nan and infinite floats)
+    """
+    if value is None:
+        return('null')
+    if isinstance(value, bool):
+        return('true' if value else 'false')
+    if isinstance(value, int):
+        return(repr(value))
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise TypeError(f'No soql literal for {value!r}')
+        return(format(Decimal(repr(value)), 'f'))
+    if isinstance(value, datetime):
+        return(value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))
+    if isinstance(value, date):
+        return(value.isoformat())
+    if isinstance(value, str):
+        return("'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'")
+    raise TypeError(f'No soql literal for {value!r}')
+
+
+def _local_value(value):
+    # dates compare against the strings salesforce returns, text ignores case like soql
+    if isinstance(value, datetime):
+        return(value.astimezone(timezone.utc))
+    if isinstance(value, date):
+        return(value.isoformat())
+    if isinstance(value, str):
+        return(value.casefold())
+    return(value)
+
+
+def _parse_datetime(value: str) -> datetime | None:
+    """
+    #### Inputs:
+        -@value: a datetime as salesforce returns it, i.e '2024-01-05T10:00:00.000+0000'
+    #### Returns:
+        - the aware datetime (UTC if the string has no offset), None if the string isn't a datetime
+    """
+    for pattern in ('%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S%z'):
+        try:
+            return(datetime.strptime(value, pattern))
+        except ValueError:
+            pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return(None)
+    return(parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc))
+
+
+def _record_value(value, datetimes: bool):
+    # the value of a record, made comparable to the _local_value of a condition
+    if not isinstance(value, str):
+        return(value)
+    if datetimes:
+        parsed = _parse_datetime(value)
+        if parsed is not None:
+            return(parsed)
+    return(value.casefold())
+
+
+class Expression:
+    """
+    A filter on records. Call it with a record to test it locally, or use to_soql() for a WHERE clause.
+    Combine expressions with & (and), | (or) and ~ (not).
+    """
+
+    def __and__(self, other: 'Expression') -> 'Expression':
+        return(And(self, other))
+
+
+    def __or__(self, other: 'Expression') -> 'Expression':
+        return(Or(self, other))
+
+
+    def __invert__(self) -> 'Expression':
+        return(Not(self))
+
+
+    def __bool__(self):
+        # 'a and b' would quietly keep only b
+        raise TypeError('Combine filter expressions with & (and), | (or) and ~ (not), not and/or/not')
+
+
+    def conjuncts(self) -> list['Expression']:
+        """
+        #### Returns:
+            - the parts that are ANDed at the top level (just this expression if it isn't an And)
+        """
+        return([self])
+
+
+    def __repr__(self) -> str:
+        return(f'{type(self).__name__}({self.to_soql()})')
+
+
+class Field:
+    """
+    A field of the records, i.e Field('StageName') or Field('Account.Name') for a relationship field.
+    Comparing it builds an Expression: Field('StageName') == 'Parked', Field('Amount') >= 1000,
+    Field('Type').isin(['New', 'Renewal']), Field('Name').like('Acme%').
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+    def value(self, record):
+        """
+        #### Inputs:
+            -@record: a record, relationship fields are followed through the nested dicts
+        #### Returns:
+            - the value of the field, None if the record (or a relationship on the way) doesn't have it.
+                Each part of the name is matched ignoring case like soql, so a pushed down and a local filter agree
+        """
+        value = record
+        for part in self.name.split('.'):
+            if value is None:
+                return(None)
+            if part not in value:
+                part = utils.lowered_keys(tuple(value)).get(part.lower(), part)
+            value = value.get(part)
+        return(value)
+
+
+    def __eq__(self, value) -> 'Expression':
+        return(Comparison(self, '=', value))
+
+
+    def __ne__(self, value) -> 'Expression':
+        return(Comparison(self, '!=', value))
+
+
+    def __lt__(self, value) -> 'Expression':
+        return(Comparison(self, '<', value))
+
+
+    def __le__(self, value) -> 'Expression':
+        return(Comparison(self, '<=', value))
+
+
+    def __gt__(self, value) -> 'Expression':
+        return(Comparison(self, '>', value))
+
+
+    def __ge__(self, value) -> 'Expression':
+        return(Comparison(self, '>=', value))
+
+
+    __hash__ = None
+
+
+    def isin(self, values) -> 'Expression':
+        return(In(self, values))
+
+
+    def not_in(self, values) -> 'Expression':
+        return(In(self, values, negate=True))
+
+
+    def like(self, pattern: str) -> 'Expression':
+        return(Like(self, pattern))
+
+
+class Comparison(Expression):
+    """
+    field operator value, text is compared ignoring case like soql does
+    """
+
+    _operators = {'=': lambda a, b: a == b, '!=': lambda a, b: a != b,
+                  '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+                  '>': lambda a, b: a > b, '>=': lambda a, b: a >= b}
+
+    def __init__(self, field: Field, operator: str, value):
+        self.field = field
+        self.operator = operator
+        self.value = value
+        self._compare = self._operators[operator]
+        self._local = _local_value(value)
+        self._datetimes = isinstance(value, datetime)
+
+
+    def __call__(self, record) -> bool:
+        value = _record_value(self.field.value(record), self._datetimes)
+        if value is None or self._local is None:
+            # like soql, only = and != match against null
+            if self.operator == '=':
+                return(value is None and self._local is None)
+            if self.operator == '!=':
+                return((value is None) != (self._local is None))
+            return(False)
+        try:
+            return(self._compare(value, self._local))
+        except TypeError:
+            return(False)
+
+
+    def fields(self) -> set[str]:
+        return({self.field.name})
+
+
+    def to_soql(self) -> str:
+        return(f'{self.field.name} {self.operator} {soql_literal(self.value)}')
+
+
+class In(Expression):
+    """
+    field IN (values) or NOT IN, text is matched ignoring case like soql does
+    """
+
+    def __init__(self, field: Field, values, negate: bool = False):
+        self.field = field
+        self.values = list(values)
+        self.negate = negate
+        self._local = {_local_value(value) for value in self.values}
+        self._datetimes = any(isinstance(value, datetime) for value in self.values)
+
+
+    def __call__(self, record) -> bool:
+        value = _record_value(self.field.value(record), self._datetimes)
+        try:
+            return((value in self._local) != self.negate)
+        except TypeError:
+            return(self.negate)
+
+
+    def fields(self) -> set[str]:
+        return({self.field.name})
+
+
+    def to_soql(self) -> str:
+        if not self.values:
+            # soql has no empty IN (), every record has an Id so these are always false/true
+            return('Id != null' if self.negate else 'Id = null')
+        return(f"{self.field.name} {'NOT IN' if self.negate else 'IN'} ({', '.join(soql_literal(value) for value in self.values)})")
+
+
+class Like(Expression):
+
+    def __init__(self, field: Field, pattern: str):
+        self.field = field
+        self.pattern = pattern
+        translated = ''.join('.*' if char == '%' else '.' if char == '_' else re.escape(char) for char in pattern)
+        self._regex = re.compile(translated, re.IGNORECASE | re.DOTALL)
+
+
+    def __call__(self, record) -> bool:
+        value = self.field.value(record)
+        return(isinstance(value, str) and self._regex.fullmatch(value) is not None)
+
+
+    def fields(self) -> set[str]:
+        return({self.field.name})
+
+
+    def to_soql(self) -> str:
+        return(f'{self.field.name} LIKE {soql_literal(self.pattern)}')
+
+
+class And(Expression):
+
+    def __init__(self, *parts: Expression):
+        self.parts = [conjunct for part in parts for conjunct in part.conjuncts()]
+
+
+    def __call__(self, record) -> bool:
+        return(all(part(record) for part in self.parts))
+
+
+    def conjuncts(self) -> list[Expression]:
+        return(list(self.parts))
+
+
+    def fields(self) -> set[str]:
+        return(set().union(*[part.fields() for part in self.parts]))
+
+
+    def to_soql(self) -> str:
+        return(' AND '.join(f'({part.to_soql()})' for part in self.parts))
+
+
+class Or(Expression):
+
+    def __init__(self, *parts: Expression):
+        self.parts = list(parts)
+
+
+    def __call__(self, record) -> bool:
+        return(any(part(record) for part in self.parts))
+
+
+    def fields(self) -> set[str]:
+        return(set().union(*[part.fields() for part in self.parts]))
+
+
+    def to_soql(self) -> str:
+        return(' OR '.join(f'({part.to_soql()})' for part in self.parts))
+
+
+class Not(Expression):
+
+    def __init__(self, part: Expression):
+        self.part = part
+
+
+    def __call__(self, record) -> bool:
+        return(not self.part(record))
+
+
+    def fields(self) -> set[str]:
+        return(self.part.fields())
+
+
+    def to_soql(self) -> str:
+        return(f'NOT ({self.part.to_soql()})')
+
+
+def split_pushdown(expression: Expression, pushable) -> tuple[Expression | None, Expression | None]:
+    """
+    #### Inputs:
+        -@expression: the filter
+        -@pushable: callable(field name) returning True if the field can be filtered in soql
+    #### Expected Behaviour:
+        - splits the top level AND of the expression: parts whose fields are all pushable go to soql,
+            the rest are run locally. An OR (or NOT) with any unpushable field stays local as a whole
+    #### Returns:
+        - (expression for the WHERE clause or None, expression to run locally or None)
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    pushed, local = [], []
+    for part in expression.conjuncts():
+        (pushed if all(pushable(field) for field in part.fields()) else local).append(part)
+
+    def combine(parts: list[Expression]) -> Expression | None:
+        if not parts:
+            return(None)
+        return(parts[0] if len(parts) == 1 else And(*parts))
+    return((combine(pushed), combine(local)))
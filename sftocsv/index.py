@@ -0,0 +1,181 @@
+from .utils import utils
+
+
+class RecordIndex:
+    """
+    Hash index over a list of records on one or more key fields, built once and reused.
+    Pass it to inner_join/outer_join in place of the list it was built from (as the right list,
+    or the inner list of an outer join) and the join only has to probe it.
+    """
+
+    def __init__(self, records, key: str | tuple[str], unique: bool = False, key_func=None):
+        """
+        #### Inputs:
+            -@records: iterable of records, read once
+            -@key: the field to index on, or a tuple of fields for a composite key
+            -@unique: if True, every record must have a different key value
+            -@key_func: optional callable applied to each key value when indexing and looking up (i.e utils.normalize_key)
+        #### Exceptions:
+            - 'RecordIndex key .. is not unique': Raised if unique is True and a key value repeats
+        """
+        self.fields = utils.key_fields(key)
+        self.unique = unique
+        self.key_func = key_func
+        self.records = self._hold(records)
+        self._index = {}
+        self._unhashable = [] # i.e relationship dicts, these can only be compared
+        self._join_tables = None
+        getter = utils.key_getter(self.fields, missing_as_none=True, key_func=key_func)
+        index = self._index
+        for position, record in enumerate(self.records):
+            key_value = getter(record)
+            try:
+                positions = index.get(key_value)
+                if positions is None:
+                    index[key_value] = [position]
+                    continue
+                positions.append(position)
+            except TypeError:
+                repeated = any(value == key_value for value, _ in self._unhashable)
+                self._unhashable.append((key_value, position))
+                if not repeated:
+                    continue
+            if unique:
+                raise Exception(f'RecordIndex key {key_value!r} is not unique')
+
+
+    @staticmethod
+    def _hold(records):
+        return(list(records))
+
+
+    def lookup(self, key_value) -> list[dict]:
+        """
+        #### Inputs:
+            -@key_value: value to look up, a tuple of values for a composite key
+        #### Expected Behaviour:
+            - finds the records with that key value (after the key_func), a missing key field reads as None
+        #### Returns:
+            - list of the matching records in their original order (empty if there are none)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        records = self.records
+        return([records[i] for i in self.positions(key_value)])
+
+
+    def get(self, key_value, default=None):
+        """
+        #### Inputs:
+            -@key_value: value to look up, a tuple of values for a composite key
+            -@default: returned if there's no match
+        #### Expected Behaviour:
+            - for unique indexes, finds the one record with that key value
+        #### Returns:
+            - the first matching record, or default
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        positions = self.positions(key_value)
+        return(self.records[positions[0]] if positions else default)
+
+
+    def positions(self, key_value) -> list[int]:
+        """
+        #### Inputs:
+            -@key_value: value to look up, a tuple of values for a composite key
+        #### Returns:
+            - list of the positions of the matching records (don't modify it)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        key_value = utils.map_key(key_value, self.key_func, len(self.fields) > 1)
+        try:
+            return(self._index.get(key_value, []))
+        except TypeError:
+            return([i for value, i in self._unhashable if value == key_value])
+
+
+    def resolve_join(self, fields: tuple[str], key_func, key_name: str):
+        """
+        #### Inputs:
+            -@fields: key fields the join uses for this side
+            -@key_func: key_func passed to the join
+            -@key_name: name of the join argument, for the exception message
+        #### Expected Behaviour:
+            - checks the join uses the same key as the index. If the join has no key_func it takes the index's
+        #### Returns:
+            - the key_func the join should use
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - '.._key must match the key of the RecordIndex': Raised if the fields differ
+            - 'key_func must match..': Raised if the join passes a different key_func
+        """
+        if self.fields != tuple(fields):
+            raise Exception(f'{key_name} must match the key of the RecordIndex {self.fields}')
+        if key_func is not None and key_func is not self.key_func:
+            raise Exception('key_func must match the key_func of the RecordIndex')
+        return(self.key_func)
+
+
+    def position_tables(self) -> tuple[dict, list]:
+        """
+        #### Expected Behaviour:
+            - gives the tables outer_join probes, where a missing key field reads as None
+        #### Returns:
+            - (dict of key value to list of positions, list of (key value, position) for unhashable key values)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        return((self._index, self._unhashable))
+
+
+    def join_tables(self) -> tuple[dict, list]:
+        """
+        #### Expected Behaviour:
+            - builds the tables inner_join probes, the records grouped by key value, leaving out records
+                missing any of the key fields (they never match in an inner join). Built on first use then kept
+        #### Returns:
+            - (dict of key value to list of records, list of (key value, record) for unhashable key values)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        if self._join_tables is None:
+            fields = self.fields
+            records = self.records
+            index = {}
+            for key_value, positions in self._index.items():
+                complete = [records[i] for i in positions if all(field in records[i] for field in fields)]
+                if complete:
+                    index[key_value] = complete
+            unhashable = [(key_value, records[i]) for key_value, i in self._unhashable
+                          if all(field in records[i] for field in fields)]
+            self._join_tables = (index, unhashable)
+        return(self._join_tables)
+
+
+    def __contains__(self, key_value) -> bool:
+        return(len(self.positions(key_value)) > 0)
+
+
+    def __len__(self) -> int:
+        return(len(self.records))
+
+
+    def __iter__(self):
+        return(iter(self.records))
+
+
+    def __repr__(self) -> str:
+        return(f'RecordIndex({len(self.records)} records, key={self.fields}, unique={self.unique})')
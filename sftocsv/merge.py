@@ -0,0 +1,99 @@
+def _component_order(value, order_key):
+    if value is None:
+        return((False, None)) # nulls sort first, like soql's default NULLS FIRST
+    return((True, value if order_key is None else order_key(value)))
+
+
+def sort_key(key_value, composite: bool, order_key=None):
+    """
+    #### Inputs:
+        -@key_value: key value of a record (a tuple of values for a composite key)
+        -@composite: True if the key_value is a tuple of values
+        -@order_key: optional callable applied to each non-None value for ordering (i.e str.lower)
+    #### Expected Behaviour:
+        - builds a value that orders None first and the other values by order_key,
+            so keys containing None can still be compared
+    #### Returns:
+        - the comparable sort key
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    if composite:
+        return(tuple([_component_order(value, order_key) for value in key_value]))
+    return(_component_order(key_value, order_key))
+
+
+def key_runs(records, getter, composite: bool, order_key=None, side: str = 'left'):
+    """
+    #### Inputs:
+        -@records: iterable of records sorted on their key
+        -@getter: callable returning the key value of a record (missing fields as None)
+        -@composite: True if the getter returns a tuple of values
+        -@order_key: see sort_key
+        -@side: name of the list, for the exception message
+    #### Expected Behaviour:
+        - reads the records one at a time, grouping consecutive records with an equal sort key into a run,
+            checking each run sorts after the previous one
+    #### Returns:
+        - generator of (sort key, list of records) for each run
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - 'merge join requires..' Raised once a record is found out of order
+    """
+    run = []
+    run_order = None
+    for record in records:
+        order = sort_key(getter(record), composite, order_key)
+        if run:
+            if order == run_order:
+                run.append(record)
+                continue
+            if order < run_order:
+                raise Exception(f'merge join requires the {side}_list sorted on its key, found {getter(record)!r} after {getter(run[0])!r}')
+            yield(run_order, run)
+        run = [record]
+        run_order = order
+    if run:
+        yield(run_order, run)
+
+
+def merge_join(left_list, right_list, left_getter, right_getter, join_run, composite: bool, order_key=None):
+    """
+    #### Inputs:
+        -@left_list: iterable of records sorted on the left key
+        -@right_list: iterable of records sorted on the right key
+        -@left_getter: callable returning the key value of a left record (missing fields as None)
+        -@right_getter: callable returning the key value of a right record (missing fields as None)
+        -@join_run: callable(left_run, right_run) returning the joined records of two runs sharing a sort key,
+            one of the runs is empty when the key is only found on one side
+        -@composite: True if the getters return tuples of values
+        -@order_key: see sort_key
+    #### Expected Behaviour:
+        - walks both lists in step, a run at a time. The side with the lower key is joined against nothing
+            and advanced, equal keys are joined together and both advance
+        - only the current run of each side is held in memory, so both lists can be generators
+    #### Returns:
+        - generator of joined records, in key order
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - 'merge join requires..' Raised once a record is found out of order
+    """
+    left_runs = key_runs(left_list, left_getter, composite, order_key, side='left')
+    right_runs = key_runs(right_list, right_getter, composite, order_key, side='right')
+    left_run = next(left_runs, None)
+    right_run = next(right_runs, None)
+    while left_run is not None or right_run is not None:
+        if right_run is None or (left_run is not None and left_run[0] < right_run[0]):
+            yield from join_run(left_run[1], [])
+            left_run = next(left_runs, None)
+        elif left_run is None or right_run[0] < left_run[0]:
+            yield from join_run([], right_run[1])
+            right_run = next(right_runs, None)
+        else:
+            yield from join_run(left_run[1], right_run[1])
+            left_run = next(left_runs, None)
+            right_run = next(right_runs, None)
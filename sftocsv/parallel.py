@@ -0,0 +1,196 @@
+import os
+import io
+import csv
+import mmap
+import zlib
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from .utils import utils
+from .csvsource import CsvSource
+from . import spill
+
+_COUNT_BLOCK = 16 * 1024 * 1024 # bytes of the file counted at a time when looking for row boundaries
+_PARTITIONS_PER_WORKER = 4 # more, smaller partitions than workers, so a slow one doesn't hold up the rest
+
+
+def stable_partition_of(key_value, salt: int, partitions: int) -> int:
+    """
+    #### Inputs:
+        -@key_value: a key value
+        -@salt: mixed into the checksum
+        -@partitions: number of partitions
+    #### Returns:
+        - the partition of the key value, from a crc32 of its repr. Unlike hash() of a str (see PYTHONHASHSEED)
+            it's the same in every process, so records split by different workers still meet in one partition
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    return(zlib.crc32(repr((salt, key_value)).encode('utf-8', 'backslashreplace')) % partitions)
+
+
+def _count_quotes(file_map, start: int, end: int) -> int:
+    return(sum(file_map[block:min(block + _COUNT_BLOCK, end)].count(b'"') for block in range(start, end, _COUNT_BLOCK)))
+
+
+def row_chunks(path: str, chunks: int, encoding: str = 'utf-8') -> tuple[list[str], list[tuple[int, int]]]:
+    """
+    #### Inputs:
+        -@path: a csv file
+        -@chunks: number of byte ranges to split its rows into
+        -@encoding: encoding of the file
+    #### Expected Behaviour:
+        - splits the rows after the header into byte ranges of about the same size. A range ends at a line break
+            once the quotes before it are balanced (like CsvSource), so quoted values holding line breaks stay whole.
+            The quotes are counted a block at a time rather than parsed, so this is quick next to reading the rows
+    #### Returns:
+        - (the header, list of (start, end) byte offsets of each range), both empty for an empty file
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    if os.path.getsize(path) == 0:
+        return(([], []))
+    with open(path, 'rb') as csv_file:
+        file_map = mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        size = len(file_map)
+
+        def row_end(position: int, quotes: int) -> tuple[int, int]:
+            while position < size:
+                end = file_map.find(b'\n', position)
+                end = size if end == -1 else end + 1
+                quotes += file_map[position:end].count(b'"')
+                position = end
+                if quotes % 2 == 0:
+                    break
+            return((position, quotes))
+        data_start, quotes = row_end(0, 0)
+        header = next(csv.reader(io.StringIO(file_map[:data_start].decode(encoding), newline='')), [])
+        bounds = [data_start]
+        for chunk in range(1, chunks):
+            target = data_start + (size - data_start) * chunk // chunks
+            if target <= bounds[-1]:
+                continue
+            quotes += _count_quotes(file_map, bounds[-1], target)
+            bound, quotes = row_end(target, quotes)
+            if bound >= size:
+                break
+            bounds.append(bound)
+        bounds.append(size)
+    finally:
+        file_map.close()
+    return((header, [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]))
+
+
+def _split_rows(path: str, encoding: str, header: list[str], start: int, end: int, key, key_func,
+                partitions: int, directory: str, prefix: str) -> list[str]:
+    with open(path, 'rb') as csv_file:
+        csv_file.seek(start)
+        text = csv_file.read(end - start).decode(encoding)
+    records = csv.DictReader(io.StringIO(text, newline=''), fieldnames=header)
+    getter = utils.key_getter(key, missing_as_none=True, key_func=key_func)
+    return([part_path for part_path, _ in spill.partition_records(records, getter, partitions, directory, prefix,
+                                                                   partition_of=stable_partition_of)])
+
+
+def _join_partition(join_function, left_paths: list[str], right_paths: list[str], header: list[str],
+                    part_path: str, encoding: str) -> int:
+    left_records = [record for path in left_paths for record in spill.read_partition(path)]
+    right_records = [record for path in right_paths for record in spill.read_partition(path)]
+    for path in left_paths + right_paths:
+        os.remove(path)
+    count = 0
+    with open(part_path, 'w', newline='', encoding=encoding) as part_file:
+        writer = csv.DictWriter(part_file, header, extrasaction='ignore')
+        for record in join_function(left_records, right_records):
+            writer.writerow(record)
+            count += 1
+    return(count)
+
+
+def joined_header(join_function, left_header: list[str], right_header: list[str], left_key, right_key) -> list[str]:
+    """
+    #### Inputs:
+        -@join_function: callable(left_records, right_records) returning the joined records
+        -@left_header: fields of the left csv
+        -@right_header: fields of the right csv
+        -@left_key: key field(s) of the left records
+        -@right_key: key field(s) of the right records
+    #### Expected Behaviour:
+        - joins one blank record of each header, once with matching keys and once without, so the header
+            follows whatever the join keeps (the hidden key, fields, unmatched records of an outer join)
+    #### Returns:
+        - the fields of the joined records, in the order the join gives them
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - any exception the join raises for the keys (i.e keys of different lengths)
+    """
+    def blank(header: list[str], key, value: str) -> dict:
+        record = dict.fromkeys(header, '')
+        record.update(dict.fromkeys(utils.key_fields(key), value))
+        return(record)
+    joined = list(join_function([blank(left_header, left_key, 'match')], [blank(right_header, right_key, 'match')]))
+    joined.extend(join_function([blank(left_header, left_key, 'left')], [blank(right_header, right_key, 'right')]))
+    return(list(dict.fromkeys(field for record in joined for field in record)))
+
+
+def join_csv(left_csv, right_csv, left_key, right_key, join_function, output_path: str,
+             workers: int = None, key_func=None, spill_dir: str = None) -> int:
+    """
+    #### Inputs:
+        -@left_csv: path of the left csv, or a CsvSource
+        -@right_csv: path of the right csv, or a CsvSource
+        -@left_key: key field(s) of the left records
+        -@right_key: key field(s) of the right records
+        -@join_function: picklable callable(left_records, right_records) returning the joined records of one partition
+            (i.e a functools.partial of Sftocsv.inner_join)
+        -@output_path: the csv the joined records are written to
+        -@workers: number of processes, os.cpu_count() if None
+        -@key_func: picklable callable applied to each key value before partitioning, the same as the join's
+        -@spill_dir: folder for the temporary files, the system temp folder if None
+    #### Expected Behaviour:
+        - both files are cut into byte ranges of whole rows (see row_chunks). Each worker reads its own range and
+            hashes its rows on their key into partition files (see stable_partition_of), so records sharing a key
+            always meet in one partition. Each worker then joins a partition pair and writes it to a csv part
+        - only offsets, file paths and counts go between the processes, no records. The calling process just
+            finds the ranges and copies the parts into the output, so the reading, joining and writing is shared
+            by the workers
+    #### Returns:
+        - the number of joined records written, grouped by partition (not in input order)
+    #### Side Effects:
+        - starts a pool of worker processes, writes temporary files (removed at the end) and the output csv
+    #### Exceptions:
+        - any exception of the join or of a worker
+    """
+    workers = workers or os.cpu_count() or 1
+    left_csv = left_csv if isinstance(left_csv, CsvSource) else CsvSource(left_csv)
+    right_csv = right_csv if isinstance(right_csv, CsvSource) else CsvSource(right_csv)
+    partitions = workers * _PARTITIONS_PER_WORKER
+    with tempfile.TemporaryDirectory(prefix='sftocsv_parallel_', dir=spill_dir) as directory:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            headers = []
+            splits = []
+            for side, source, key in (('l', left_csv, left_key), ('r', right_csv, right_key)):
+                header, chunks = row_chunks(source.path, workers, source.encoding)
+                headers.append(header)
+                splits.append([executor.submit(_split_rows, source.path, source.encoding, header, start, end, key, key_func,
+                                               partitions, directory, f'{side}{i}') for i, (start, end) in enumerate(chunks)])
+            output_header = joined_header(join_function, headers[0], headers[1], left_key, right_key)
+            left_parts, right_parts = [[future.result() for future in futures] for futures in splits]
+            part_paths = [os.path.join(directory, f'joined_{partition}.csv') for partition in range(partitions)]
+            joins = [executor.submit(_join_partition, join_function, [paths[partition] for paths in left_parts],
+                                     [paths[partition] for paths in right_parts], output_header,
+                                     part_paths[partition], left_csv.encoding) for partition in range(partitions)]
+            count = sum(future.result() for future in joins)
+        with open(output_path, 'w', newline='', encoding=left_csv.encoding) as output_file:
+            csv.writer(output_file).writerow(output_header)
+        with open(output_path, 'ab') as output_file:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part_file:
+                    shutil.copyfileobj(part_file, output_file)
+    return(count)
@@ -0,0 +1,216 @@
+from operator import itemgetter
+from .utils import utils
+
+
+def key_stats(records, fields: tuple[str], key_func=None) -> dict:
+    """
+    #### Inputs:
+        -@records: list of records
+        -@fields: key fields
+        -@key_func: optional callable applied to each key value
+    #### Expected Behaviour:
+        - counts the records, the distinct key values and the records missing a key field
+            (unhashable key values are each counted as distinct)
+    #### Returns:
+        - dict of 'rows', 'distinct' and 'missing'
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    getter = utils.key_getter(fields, key_func=key_func)
+    distinct = set()
+    unhashable = 0
+    missing = 0
+    for record in records:
+        try:
+            distinct.add(getter(record))
+        except KeyError:
+            missing += 1
+        except TypeError:
+            unhashable += 1
+    return({'rows': len(records), 'distinct': len(distinct) + unhashable, 'missing': missing})
+
+
+def _estimate(left_rows: float, right_rows: float, selectivities: list[float]) -> float:
+    estimate = left_rows * right_rows
+    for distinct in selectivities:
+        estimate /= max(distinct, 1)
+    return(estimate)
+
+
+def plan_joins(lists: dict[str, list], conditions: list[tuple], key_func=None) -> list[dict]:
+    """
+    #### Inputs:
+        -@lists: dict of name to list of records
+        -@conditions: list of (left name, left key, right name, right key), keys being a field or a tuple of fields
+        -@key_func: optional callable applied to each key value
+    #### Expected Behaviour:
+        - gathers the row and distinct key counts of every list on the keys it's joined on, then estimates
+            the size of a join as rows(a) * rows(b) / max(distinct(a), distinct(b)) for each condition between them
+        - starts with the pair of lists with the smallest estimated join, then adds the connected list that keeps
+            the estimated result smallest until every list is joined. Lists are only added through a condition,
+            so there's never a cross join
+    #### Returns:
+        - list of steps, each a dict of 'join' (the list added), 'with' (the lists joined before it),
+            'on' (the conditions applied) and 'estimated_rows'. The first step is the first list on its own
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - 'multi_join needs..': Raised if there are no conditions
+        - 'multi_join has no list named..': Raised if a condition names an unknown list
+        - 'multi_join condition joins .. to itself..': Raised if a condition has the same list on both sides
+        - 'left_key and right_key..': Raised if a condition's keys have a different number of fields
+        - 'multi_join conditions must connect every list': Raised if a list can't be reached through the conditions
+    """
+    if not conditions:
+        raise Exception('multi_join needs at least one join condition')
+    normalized = []
+    for left_name, left_key, right_name, right_key in conditions:
+        for name in (left_name, right_name):
+            if name not in lists:
+                raise Exception(f'multi_join has no list named {name!r}')
+        if left_name == right_name:
+            raise Exception(f'multi_join condition joins {left_name!r} to itself, add the list again under another name to self join')
+        left_fields, right_fields = utils.key_fields(left_key), utils.key_fields(right_key)
+        if len(left_fields) != len(right_fields):
+            raise Exception('left_key and right_key must have the same number of fields')
+        normalized.append((left_name, left_fields, right_name, right_fields))
+    stats = {}
+    for left_name, left_fields, right_name, right_fields in normalized:
+        for name, fields in ((left_name, left_fields), (right_name, right_fields)):
+            if (name, fields) not in stats:
+                stats[(name, fields)] = key_stats(lists[name], fields, key_func)
+
+    def connecting(joined: set, name: str) -> list[tuple]:
+        return([condition for condition in normalized
+                if (condition[0] == name and condition[2] in joined) or (condition[2] == name and condition[0] in joined)])
+
+    def distinct_of(name: str, fields: tuple, current_rows: float) -> float:
+        return(min(stats[(name, fields)]['distinct'], current_rows))
+
+    best = None
+    for left_name, _, right_name, _ in normalized:
+        on = connecting({left_name}, right_name)
+        estimate = _estimate(len(lists[left_name]), len(lists[right_name]),
+                             [max(stats[(c[0], c[1])]['distinct'], stats[(c[2], c[3])]['distinct']) for c in on])
+        if best is None or estimate < best[0]:
+            best = (estimate, left_name, right_name, on)
+    estimate, first, second, on = best
+    steps = [{'join': first, 'with': [], 'on': [], 'estimated_rows': len(lists[first])},
+             {'join': second, 'with': [first], 'on': on, 'estimated_rows': round(estimate)}]
+    joined = {first, second}
+    current_rows = estimate
+    while len(joined) < len(lists):
+        best = None
+        for name in lists:
+            if name in joined:
+                continue
+            on = connecting(joined, name)
+            if not on:
+                continue
+            selectivities = []
+            for condition in on:
+                if condition[0] == name:
+                    selectivities.append(max(stats[(condition[0], condition[1])]['distinct'],
+                                             distinct_of(condition[2], condition[3], current_rows)))
+                else:
+                    selectivities.append(max(distinct_of(condition[0], condition[1], current_rows),
+                                             stats[(condition[2], condition[3])]['distinct']))
+            estimate = _estimate(current_rows, len(lists[name]), selectivities)
+            if best is None or estimate < best[0]:
+                best = (estimate, name, on)
+        if best is None:
+            raise Exception('multi_join conditions must connect every list')
+        estimate, name, on = best
+        steps.append({'join': name, 'with': [step['join'] for step in steps], 'on': on, 'estimated_rows': round(estimate)})
+        joined.add(name)
+        current_rows = estimate
+    return(steps)
+
+
+def _row_key_getter(parts: list[tuple], key_func):
+    getters = [(position, itemgetter(*fields), len(fields) > 1) for position, fields in parts]
+    if len(getters) == 1:
+        position, getter, composite = getters[0]
+        return(lambda row: utils.map_key(getter(row[position]), key_func, composite))
+    return(lambda row: tuple([utils.map_key(getter(row[position]), key_func, composite) for position, getter, composite in getters]))
+
+
+def _join_rows(left_rows: list[tuple], right_rows: list[tuple], left_getter, right_getter) -> list[tuple]:
+    build_left = len(left_rows) < len(right_rows)
+    build_rows, build_getter = (left_rows, left_getter) if build_left else (right_rows, right_getter)
+    probe_rows, probe_getter = (right_rows, right_getter) if build_left else (left_rows, left_getter)
+    index = {}
+    unhashable = [] # i.e relationship dicts, these can only be compared
+    for row in build_rows:
+        try:
+            key_value = build_getter(row)
+        except KeyError:
+            continue
+        try:
+            if key_value in index:
+                index[key_value].append(row)
+            else:
+                index[key_value] = [row]
+        except TypeError:
+            unhashable.append((key_value, row))
+    joined = []
+    for row in probe_rows:
+        try:
+            key_value = probe_getter(row)
+        except KeyError:
+            continue
+        try:
+            matches = index.get(key_value, ())
+        except TypeError:
+            matches = [match for value, match in unhashable if value == key_value]
+        for match in matches:
+            joined.append(match + row if build_left else row + match)
+    return(joined)
+
+
+def run_plan(lists: dict[str, list], steps: list[dict], key_func=None) -> list[dict]:
+    """
+    #### Inputs:
+        -@lists: dict of name to list of records
+        -@steps: plan from plan_joins
+        -@key_func: optional callable applied to each key value
+    #### Expected Behaviour:
+        - joins the lists in the order of the steps. Intermediate results are tuples of references to the
+            original records (one per list joined so far), so nothing is copied until the end.
+            Each step is a hash join built on whichever side is smaller, records missing a key field never match
+        - the final tuples are combined into dicts in the order of lists, the earlier list's value wins
+            if two lists share a field
+    #### Returns:
+        - list[dict] of the joined records
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    order = [steps[0]['join']]
+    rows = [(record,) for record in lists[steps[0]['join']]]
+    for step in steps[1:]:
+        name = step['join']
+        row_parts, new_parts = [], []
+        for left_name, left_fields, right_name, right_fields in step['on']:
+            if left_name == name:
+                new_parts.append((0, left_fields))
+                row_parts.append((order.index(right_name), right_fields))
+            else:
+                row_parts.append((order.index(left_name), left_fields))
+                new_parts.append((0, right_fields))
+        rows = _join_rows(rows, [(record,) for record in lists[name]],
+                          _row_key_getter(row_parts, key_func), _row_key_getter(new_parts, key_func))
+        order.append(name)
+    positions = [order.index(name) for name in lists]
+    resulting_list = []
+    for row in rows:
+        combined = dict(row[positions[0]])
+        setdefault = combined.setdefault
+        for position in positions[1:]:
+            for key, value in row[position].items():
+                setdefault(key, value)
+        resulting_list.append(combined)
+    return(resulting_list)
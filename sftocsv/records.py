@@ -0,0 +1,384 @@
+from collections.abc import Sequence, Mapping, MutableMapping
+
+class _Missing:
+    __slots__ = ()
+
+    def __reduce__(self):
+        return('_MISSING') # pickles by name so the marker keeps its identity across processes
+
+    def __repr__(self) -> str:
+        return('<missing>')
+
+_MISSING = _Missing() # marks a field a record doesn't have, None is a valid field value
+
+
+class ColumnarRecords(Sequence):
+    """
+    Compact container for a list of records. Stores one list per field plus a shared header instead of
+    a dict per record, while iterating and indexing like the list[dict] returned by query_records.
+    Each record read from it is a ColumnarRow over its columns, so changing a record changes the container
+    like changing a dict in a list would. Slices are new containers with their own columns.
+    """
+
+    def __init__(self, records=None):
+        """
+        #### Inputs:
+            -@records: optional iterable of dicts to load in
+        """
+        self.header = []
+        self.columns = {}
+        self._length = 0
+        if records is not None:
+            self.extend(records)
+
+
+    def append(self, record: dict):
+        """
+        #### Inputs:
+            -@record: a dict
+        #### Expected Behaviour:
+            - each value is appended to the column of its key, keys not seen before add a new column
+                which is back-filled as missing for the earlier records
+            - columns of keys the record doesn't have get a missing marker, so it isn't read back as None
+        #### Returns:
+            - None
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        columns = self.columns
+        for key in record:
+            if key not in columns:
+                self.header.append(key)
+                columns[key] = [_MISSING] * self._length
+        for key in self.header:
+            columns[key].append(record.get(key, _MISSING))
+        self._length += 1
+
+
+    def extend(self, records):
+        """
+        #### Inputs:
+            -@records: iterable of dicts
+        #### Expected Behaviour:
+            - appends each record
+        #### Returns:
+            - None
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        for record in records:
+            self.append(record)
+
+
+    def column(self, key: str) -> list:
+        """
+        #### Inputs:
+            -@key: field name
+        #### Expected Behaviour:
+            - returns the values of the field for every record, None where the record doesn't have it
+        #### Returns:
+            - list of values (a copy, changing it doesn't change the records)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        if key not in self.columns:
+            return([None] * self._length)
+        return([None if value is _MISSING else value for value in self.columns[key]])
+
+
+    def to_records(self) -> list[dict]:
+        """
+        #### Expected Behaviour:
+            - builds the list of dicts equivalent to this container
+        #### Returns:
+            - list[dict], copies that don't change the container
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        return(list(self._dicts()))
+
+
+    def _dicts(self):
+        header = self.header
+        for values in zip(*[self.columns[key] for key in header]):
+            yield {key: value for key, value in zip(header, values) if value is not _MISSING}
+        if not header:
+            for _ in range(self._length):
+                yield {}
+
+
+    def _set(self, index: int, key: str, value):
+        column = self.columns.get(key)
+        if column is None:
+            self.header.append(key)
+            column = self.columns[key] = [_MISSING] * self._length
+        column[index] = value
+
+
+    def __len__(self) -> int:
+        return(self._length)
+
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield ColumnarRow(self, index)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sliced = ColumnarRecords()
+            sliced.header = list(self.header)
+            sliced.columns = {key: column[index] for key, column in self.columns.items()}
+            sliced._length = len(range(*index.indices(self._length)))
+            return(sliced)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('ColumnarRecords index out of range')
+        return(ColumnarRow(self, index))
+
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (list, ColumnarRecords)):
+            return NotImplemented
+        others = other._dicts() if isinstance(other, ColumnarRecords) else other
+        return(len(self) == len(other) and all(a == b for a, b in zip(self._dicts(), others)))
+
+
+    def __repr__(self) -> str:
+        return(f'ColumnarRecords({len(self)} records, header={self.header})')
+
+
+class ColumnarRow(MutableMapping):
+    """
+    A record of a ColumnarRecords, read from its columns when a field is read. Setting or deleting a field
+    writes to the columns (a new field adds a column), so changes show in the container.
+    Pickles (i.e in a grace join partition) as a plain dict.
+    """
+    __slots__ = ('_records', '_index')
+
+    def __init__(self, records: ColumnarRecords, index: int):
+        self._records = records
+        self._index = index
+
+    def __getitem__(self, key):
+        column = self._records.columns.get(key)
+        if column is None or column[self._index] is _MISSING:
+            raise KeyError(key)
+        return(column[self._index])
+
+    def get(self, key, default=None):
+        column = self._records.columns.get(key)
+        if column is None:
+            return(default)
+        value = column[self._index]
+        return(default if value is _MISSING else value)
+
+    def __contains__(self, key) -> bool:
+        return(self.get(key, _MISSING) is not _MISSING)
+
+    def __iter__(self):
+        columns = self._records.columns
+        index = self._index
+        for key in self._records.header:
+            if columns[key][index] is not _MISSING:
+                yield key
+
+    def __len__(self) -> int:
+        return(sum(1 for _ in self))
+
+    def __setitem__(self, key, value):
+        self._records._set(self._index, key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._records.columns[key][self._index] = _MISSING
+
+    def __reduce__(self):
+        return((dict, (dict(self.items()),)))
+
+    def __repr__(self) -> str:
+        return(f'ColumnarRow({dict(self.items())})')
+
+
+class RecordSchema:
+    """
+    Field names shared by every Row of a query (or of a record type in a nested query).
+    Fields are added as they're first seen, rows made before that just don't have them.
+    """
+    __slots__ = ('fields', 'positions')
+
+    def __init__(self, fields=()):
+        """
+        #### Inputs:
+            -@fields: optional field names to start with
+        """
+        self.fields = []
+        self.positions = {}
+        for key in fields:
+            self.add_field(key)
+
+
+    def add_field(self, key: str) -> int:
+        """
+        #### Inputs:
+            -@key: field name
+        #### Expected Behaviour:
+            - adds the field to the end of the schema if it isn't already in it
+        #### Returns:
+            - the position of the field
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        position = self.positions.get(key)
+        if position is None:
+            position = len(self.fields)
+            self.fields.append(key)
+            self.positions[key] = position
+        return(position)
+
+
+    def make_row(self, record: dict) -> 'Row':
+        """
+        #### Inputs:
+            -@record: a dict
+        #### Expected Behaviour:
+            - adds any new keys of the record to the schema, then stores its values in a tuple
+                ordered by the schema, keys the record doesn't have are marked missing
+        #### Returns:
+            - a Row sharing this schema
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        positions = self.positions
+        for key in record:
+            if key not in positions:
+                self.add_field(key)
+        values = [_MISSING] * len(self.fields)
+        for key, value in record.items():
+            values[positions[key]] = value
+        return(Row(self, tuple(values)))
+
+
+class Row(Mapping):
+    """
+    Read-only record backed by a tuple of values and a RecordSchema shared with the other rows
+    of the query. Supports row['Email'], row.get('Email'), keys/items/values and == against dicts.
+    """
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, schema: RecordSchema, values: tuple):
+        self._schema = schema
+        self._values = values
+
+    def __getitem__(self, key):
+        position = self._schema.positions.get(key)
+        if position is None or position >= len(self._values):
+            raise KeyError(key)
+        value = self._values[position]
+        if value is _MISSING:
+            raise KeyError(key)
+        return(value)
+
+    def get(self, key, default=None):
+        position = self._schema.positions.get(key)
+        if position is None or position >= len(self._values):
+            return(default)
+        value = self._values[position]
+        return(default if value is _MISSING else value)
+
+    def __contains__(self, key) -> bool:
+        return(self.get(key, _MISSING) is not _MISSING)
+
+    def __iter__(self):
+        for key, value in zip(self._schema.fields, self._values):
+            if value is not _MISSING:
+                yield key
+
+    def __len__(self) -> int:
+        return(sum(1 for value in self._values if value is not _MISSING))
+
+    def __repr__(self) -> str:
+        return(f'Row({dict(self)})')
+
+
+class MergedRecord(MutableMapping):
+    """
+    View of a joined record over the left and right records it came from, nothing is copied.
+    Keys of the left record win, like utils.combine_records, and hidden keys (i.e a dropped join key) are left out.
+    The first change made to it copies the view into its own dict, the source records are never modified.
+    """
+    __slots__ = ('_left', '_right', '_hidden', '_data')
+
+    def __init__(self, left: Mapping, right: Mapping, hidden: tuple = ()):
+        """
+        #### Inputs:
+            -@left: the record whose values win on a key collision
+            -@right: the record it's joined with
+            -@hidden: keys left out of the view
+        """
+        self._left = left
+        self._right = right
+        self._hidden = hidden
+        self._data = None
+
+    def _materialize(self) -> dict:
+        if self._data is None:
+            self._data = dict(self.items())
+            self._left = self._right = None
+        return(self._data)
+
+    def __getitem__(self, key):
+        if self._data is not None:
+            return(self._data[key])
+        if key in self._hidden:
+            raise KeyError(key)
+        left = self._left
+        if key in left:
+            return(left[key])
+        return(self._right[key])
+
+    def __contains__(self, key) -> bool:
+        if self._data is not None:
+            return(key in self._data)
+        return(key not in self._hidden and (key in self._left or key in self._right))
+
+    def __iter__(self):
+        if self._data is not None:
+            yield from self._data
+            return
+        hidden = self._hidden
+        left = self._left
+        for key in left:
+            if key not in hidden:
+                yield key
+        for key in self._right:
+            if key not in left and key not in hidden:
+                yield key
+
+    def __len__(self) -> int:
+        if self._data is not None:
+            return(len(self._data))
+        return(sum(1 for _ in self))
+
+    def __setitem__(self, key, value):
+        self._materialize()[key] = value
+
+    def __delitem__(self, key):
+        del self._materialize()[key]
+
+    def __repr__(self) -> str:
+        return(f'MergedRecord({dict(self.items())})')
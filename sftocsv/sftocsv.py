@@ -1,39 +1,223 @@
+import re
 import requests
-import json
 import urllib
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from .utils import *
+from .cache import QueryCache
+from .streaming import PageStreamParser
+from .records import ColumnarRecords, RecordSchema, MergedRecord
+from .index import RecordIndex
+from .csvsource import CsvSource
+from . import spill, merge, planner, batch, bulk, sqlite, diff, aggregate, filters, parallel
+
+COMPOSITE_BATCH_LIMIT = 25 # most subrequests salesforce takes in one composite batch
 
 class Sftocsv:
 
-    def __init__(self, base_url: str, api_version: float, access_token: str = '', tokenless: bool=False):
+    def __init__(self, base_url: str, api_version: float, access_token: str = '', tokenless: bool=False,
+                 cache: QueryCache | None = None, session: requests.Session | None = None, rate_limiter=None):
         """
         #### Inputs:
             -@base_url: Salesforce org url (i.e 'https://examplecompany.my.salesforce.com') 
             -@api_version: salesforce api version in float format (i.e 58.0)
             -@access_token: client credentials flow access token 
             -@tokenless: disables missing token exception. Useful if you want the joins and don't need to query
+            -@cache: optional QueryCache, if passed query results are served from / saved to it
+            -@session: optional requests.Session, reuses its connections across requests (and threads, see run_batch)
+            -@rate_limiter: optional batch.RateLimiter, every request waits on it first
         """
         self.base_url = base_url
         self.api_version = f'v{str(api_version)}' ## 58.0
         if not access_token and not tokenless:
             raise Exception('Access Token missing. If you want to use non-query functions pass in tokenless = True')
         self.access_token = access_token 
+        self.cache = cache
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self._filterable = {}
 
   
-    def query_records(self, querystring: str, nested: bool=False) -> list[dict] | dict[str, list[dict]]: 
+    def query_records(self, querystring: str, nested: bool=False, stream: bool=False,
+                      record_format: str='dict', where: filters.Expression=None,
+                      local_fields: list[str]=None, fields: list[str]=None) -> list[dict] | dict[str, list[dict]]: 
         """
         #### Inputs:
             -@queryString: soql of form 'SELECT ... from ... where ...'
             -@nested: If you're using this function for a nested query, set to True 
+            -@stream: If True, pages are parsed record by record as they download (see iter_records),
+                rather than each page being held as bytes and as a parsed tree. The cache isn't used in this mode
+            -@record_format: one of ('dict', 'columnar', 'row'). 'columnar' returns a ColumnarRecords (one per type if nested)
+                which iterates and indexes like a list of dicts but stores one list per field.
+                'row' returns a list of read-only Rows, tuple-backed and sharing one schema per query (per type if nested)
+            -@where: optional filter built from Fields, i.e (Field('StageName') == 'Parked') & (Field('Amount') > 1000). 
+                The parts on filterable fields are added to the query's WHERE clause, the rest are run on the records 
+            -@local_fields: fields that can't be filtered in soql (i.e rich text). If None they're looked up with filterable_fields 
+            -@fields: optional, the only fields kept in the records (see utils.projector), i.e a query selecting 
+                columns for a join and a where filter that only needs a few of them in the result 
         #### Expected Behaviour: 
             - the input string is url-parsed and the request is sent
             - the results are paginated through if required and records are read into a list of dicts 
+            - with fields (or a filter run locally) each page is filtered then pruned as soon as it's decoded, 
+                so only the kept fields of the kept records are held while the rest of the pages download 
+            - if a cache is set and holds a valid entry for the query, the pages are read from it instead
             - if 'nested' is true, the 'attributes' section of each record is kept so that child records 
                 can inheret a parent record id and save it in a field of the parent type. 
                 If it's not nested, the attributes section is removed. 
         ##### Returns:
             - list[dict]: in the case of nested=False, returns a list of dicts, each dict being a record from the query 
             - dict[str, list[dict]]: in the case of nested=True, list of records are stored against a key of their type in the dict
+        #### Side Effects:  
+            - if a cache is set, a miss saves the raw pages to it 
+        #### Exceptions: 
+            - If status_code returned by query != 200, re-raises the error as an exception
+            - 'query_records requires one of..' If the 'record_format' doesn't match one of the valid values 
+        """
+        if record_format not in ('dict', 'columnar', 'row'):
+            raise Exception('query_records requires one of ("dict", "columnar", "row") in "record_format" argument')
+        local_filter = None
+        if where is not None:
+            querystring, local_filter = self._push_filter(querystring, where, local_fields)
+        project = utils.projector(fields, nested=nested) if fields is not None else None
+
+        def select(records):
+            if local_filter is not None:
+                records = filter(local_filter, records)
+            if project is not None:
+                records = map(project, records)
+            return(records)
+        if stream:
+            raw_records = select(self.iter_records(querystring, nested=True))
+        else:
+            page_select = (lambda page: list(select(page))) if local_filter is not None or project is not None else None
+            pages = self._get_pages(querystring, page_select)
+            pages.reverse() # popped from the end, so each page is freed once its records are shaped
+            raw_records = (record for _ in range(len(pages)) for record in pages.pop())
+        return(Sftocsv._shape_records(raw_records, nested, record_format))
+
+
+    def _push_filter(self, querystring: str, where: filters.Expression, local_fields: list[str]=None) -> tuple:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@where: the filter 
+            -@local_fields: fields that can't be filtered in soql, None to look them up 
+        #### Expected Behaviour: 
+            - splits the filter with filters.split_pushdown. Without local_fields a field is pushed if the describe 
+                of the queried object marks it filterable, relationship fields (i.e 'Account.Name') are always pushed 
+            - the pushed part is ANDed onto the query's WHERE clause
+        #### Returns:
+            - (the querystring to send, the filter to run on the records or None)
+        #### Side Effects:  
+            - may describe the queried object (once per object per instance) 
+        #### Exceptions: 
+            - No FROM found...: Raised if the querystring has no top level FROM
+        """
+        if local_fields is None:
+            from_match = re.search(r'\bfrom\s+(\w+)', utils.mask_soql(querystring), re.IGNORECASE)
+            if from_match is None:
+                raise Exception(f'No FROM found in query -->{querystring}<--')
+            filterable = self.filterable_fields(from_match.group(1))
+            pushable = lambda field: '.' in field or field.lower() in filterable
+        else:
+            unfilterable = {field.lower() for field in local_fields}
+            pushable = lambda field: field.lower() not in unfilterable
+        pushed, local_filter = filters.split_pushdown(where, pushable)
+        if pushed is not None:
+            querystring = utils.add_where_condition(querystring, pushed.to_soql())
+        return((querystring, local_filter))
+
+
+    def filterable_fields(self, sobject: str) -> set[str]:
+        """
+        #### Inputs:
+            -@sobject: api name of the object, i.e 'Opportunity'
+        #### Expected Behaviour: 
+            - describes the object and keeps the names of the fields that can be used in a WHERE clause. 
+                The result is kept on the instance, so each object is only described once 
+        #### Returns:
+            - set of the lower cased names of the filterable fields 
+        #### Side Effects:  
+            - None 
+        #### Exceptions: 
+            - If status_code returned by the describe != 200, re-raises the error as an exception
+        """
+        if sobject.lower() not in self._filterable:
+            header_dict = {"Authorization": f"Bearer {self.access_token}"}
+            resp = self._get(url=f"{self.base_url}/services/data/{self.api_version}/sobjects/{sobject}/describe", headers=header_dict)
+            if resp.status_code != 200:
+                raise Exception(f'Describe of -->{sobject}<-- raised error: \n {str(resp.content)}')
+            self._filterable[sobject.lower()] = {field['name'].lower() for field in utils.decode_json(resp.content)['fields']
+                                                 if field.get('filterable')}
+        return(self._filterable[sobject.lower()])
+
+
+    @staticmethod
+    def _shape_records(raw_records, nested: bool, record_format: str) -> list[dict] | dict[str, list[dict]]:
+        """
+        #### Inputs:
+            -@raw_records: iterable of raw query records, attributes included, read once as they're shaped
+            -@nested: see query_records
+            -@record_format: see query_records
+        #### Expected Behaviour: 
+            - nested records are split by type, otherwise the attributes are dropped and the records 
+                are collected in the record_format 
+        #### Returns:
+            - the query_records result
+        #### Side Effects:  
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        if(nested): 
+            return utils.split_nested_record_list(raw_records, record_format=record_format)
+        records = ColumnarRecords() if record_format == 'columnar' else []
+        schema = RecordSchema()
+        for record in raw_records:
+            record.pop('attributes', None) # bulk results have none
+            if record_format == 'row':
+                record = schema.make_row(record)
+            records.append(record)
+        return records
+
+
+    def _get_pages(self, querystring: str, select=None) -> list[list[dict]]:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@select: optional callable taking a page's raw records and returning the records to keep 
+        #### Expected Behaviour: 
+            - if a cache is set the pages are read from it, on a miss they're fetched and saved to it. 
+                The cache holds the whole pages, select is applied to them afterwards 
+            - otherwise the pages are fetched, select being applied to each page as it's decoded 
+        #### Returns:
+            - list[list[dict]]: the raw records of each page, attributes included 
+        #### Side Effects:  
+            - may write a cache entry 
+        #### Exceptions: 
+            - None 
+        """
+        if self.cache is None:
+            return(self._fetch_pages(querystring, select))
+        pages = self.cache.get(self.base_url, self.api_version, querystring)
+        if pages is None:
+            pages = self._fetch_pages(querystring)
+            self.cache.put(self.base_url, self.api_version, querystring, pages)
+        if select is not None:
+            pages = [select(page) for page in pages]
+        return(pages)
+
+
+    def _fetch_pages(self, querystring: str, select=None) -> list[list[dict]]:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@select: optional, see _follow_pages 
+        #### Expected Behaviour: 
+            - the input string is url-parsed and the request is sent, following nextRecordsUrl 
+                until all pages are collected
+        #### Returns:
+            - list[list[dict]]: the raw records of each page, attributes included 
         #### Side Effects:  
             - None 
         #### Exceptions: 
@@ -42,33 +226,340 @@ class Sftocsv:
         querystring = urllib.parse.quote_plus(querystring)
         urlstring = f"{self.base_url}/services/data/{self.api_version}/query/?q={querystring}"
         header_dict = {"Authorization": f"Bearer {self.access_token}"}
-        resp = requests.get(url=urlstring, headers=header_dict)
+        resp = self._get(url=urlstring, headers=header_dict)
         if resp.status_code != 200:
             raise Exception(f'Query of -->{querystring}<-- raised error: \n {str(resp.content)}')
-        resp_json = json.loads(resp.content)
-        records = resp_json['records']
+        return(self._follow_pages(querystring, utils.decode_json(resp.content), header_dict, select))
+
+
+    def _follow_pages(self, querystring: str, resp_json: dict, header_dict: dict, select=None) -> list[list[dict]]:
+        """
+        #### Inputs:
+            -@querystring: the url-parsed soql, for error messages
+            -@resp_json: the decoded first page of the query
+            -@header_dict: headers of the requests
+            -@select: optional callable taking a page's raw records and returning the records to keep 
+        #### Expected Behaviour: 
+            - follows nextRecordsUrl from the first page until all pages are collected
+            - select is applied to each page as soon as it's decoded, so the dropped records and fields 
+                are freed before the next page is requested
+        #### Returns:
+            - list[list[dict]]: the raw records of each page, attributes included 
+        #### Side Effects:  
+            - None 
+        #### Exceptions: 
+            - If status_code returned by a page != 200, re-raises the error as an exception
+        """
+        if select is None:
+            select = lambda records: records
+        pages = [select(resp_json['records'])]
         next_url = resp_json.get('nextRecordsUrl', None)
+        del resp_json
         while next_url: 
-            resp = requests.get(url=f"{self.base_url}{next_url}", headers=header_dict)
+            resp = self._get(url=f"{self.base_url}{next_url}", headers=header_dict)
             if resp.status_code != 200:
                 raise Exception(f'Query of -->{querystring}<-- on nextUrl -->{next_url}<-- raised error: \n {str(resp.content)}')
-            resp_json = json.loads(resp.content)
-            records += resp_json['records']
+            resp_json = utils.decode_json(resp.content)
+            pages.append(select(resp_json['records']))
             next_url = resp_json.get('nextRecordsUrl', None)
-        if(not nested): 
-            for record in records:
-                del(record['attributes'])
-        else: 
-            records = utils.split_nested_record_list(records)
-        return records
+        return pages
+
+
+    def count_records(self, querystring: str) -> int:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+        #### Expected Behaviour: 
+            - sends the query as a 'SELECT COUNT() ...' probe (see utils.build_count_querystring), which 
+                returns no records so it costs one small request whatever the size of the result
+        #### Returns:
+            - the number of records the query returns 
+        #### Side Effects:  
+            - None 
+        #### Exceptions: 
+            - If status_code returned by query != 200, re-raises the error as an exception
+            - No FROM found...: Raised if the querystring has no top level FROM
+            - Can't count...: Raised if the query has a GROUP BY or OFFSET
+        """
+        count_querystring = urllib.parse.quote_plus(utils.build_count_querystring(querystring))
+        header_dict = {"Authorization": f"Bearer {self.access_token}"}
+        resp = self._get(url=f"{self.base_url}/services/data/{self.api_version}/query/?q={count_querystring}", headers=header_dict)
+        if resp.status_code != 200:
+            raise Exception(f'Query of -->{count_querystring}<-- raised error: \n {str(resp.content)}')
+        return(utils.decode_json(resp.content)['totalSize'])
+
+
+    def query_auto(self, querystring: str, nested: bool=False, record_format: str='dict', 
+                   parallel_threshold: int=10000, bulk_threshold: int=None, workers: int=4, 
+                   dry_run: bool=False) -> list[dict] | dict[str, list[dict]] | dict:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@nested: see query_records
+            -@record_format: see query_records
+            -@parallel_threshold: from this many records the pages are fetched in parallel 
+            -@bulk_threshold: from this many records a Bulk API 2.0 job is used (not for nested queries). 
+                None (the default) never uses bulk, as its values all come back as strings 
+            -@workers: number of pages fetched at once by the parallel engine
+            -@dry_run: If True only the plan is returned, nothing but the count probe is sent 
+        #### Expected Behaviour: 
+            - if a cache is set and holds the query, it's served from the cache 
+            - otherwise the query is sized with count_records and fetched with: 
+                'rest', the usual sequential pages, below parallel_threshold 
+                'parallel', every page requested at once from its offset in the query locator, into pre-sized slots 
+                'bulk', a Bulk API 2.0 job (see bulk.bulk_query), from bulk_threshold 
+            - queries with a GROUP BY or OFFSET can't be sized by the probe (see utils.countable), 
+                they skip it and use 'rest' with a count of None 
+        #### Returns:
+            - the query_records result, or if dry_run a dict of 'engine' and 'count' 
+        #### Side Effects:  
+            - if a cache is set, a miss saves the raw pages to it ('rest' and 'parallel' only) 
+        #### Exceptions: 
+            - If status_code returned by a request != 200, re-raises the error as an exception
+            - 'query_auto requires one of..' If the 'record_format' doesn't match one of the valid values 
+        """
+        if record_format not in ('dict', 'columnar', 'row'):
+            raise Exception('query_auto requires one of ("dict", "columnar", "row") in "record_format" argument')
+        pages = None
+        if self.cache is not None:
+            pages = self.cache.get(self.base_url, self.api_version, querystring)
+        if pages is not None:
+            plan = {'engine': 'cache', 'count': sum(len(page) for page in pages)}
+        elif not utils.countable(querystring):
+            plan = {'engine': 'rest', 'count': None}
+        else:
+            count = self.count_records(querystring)
+            engine = 'rest'
+            if bulk_threshold is not None and not nested and count >= bulk_threshold:
+                engine = 'bulk'
+            elif count >= parallel_threshold:
+                engine = 'parallel'
+            plan = {'engine': engine, 'count': count}
+        if dry_run:
+            return(plan)
+        if plan['engine'] == 'bulk':
+            return(Sftocsv._shape_records(bulk.bulk_query(self, querystring), nested, record_format))
+        if plan['engine'] == 'rest':
+            pages = self._fetch_pages(querystring)
+        elif plan['engine'] == 'parallel':
+            pages = self._fetch_pages_parallel(querystring, workers)
+        if plan['engine'] != 'cache' and self.cache is not None:
+            self.cache.put(self.base_url, self.api_version, querystring, pages)
+        return(Sftocsv._shape_records((record for page in pages for record in page), nested, record_format))
+
+
+    def _fetch_pages_parallel(self, querystring: str, workers: int) -> list[list[dict]]:
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@workers: number of pages requested at once
+        #### Expected Behaviour: 
+            - requests the first page, then works out every other page's url from the query locator in its 
+                nextRecordsUrl ('.../query/<locator>-<offset>') and the totalSize, and requests them on a pool of threads. 
+                Each page goes into its own slot of a list sized up front, so they're in query order without sorting
+            - if the nextRecordsUrl isn't of that form, the pages are followed one after another 
+            - the offsets assume every page is the size of the first, so the pages are checked afterwards 
+                (see _offset_pages_complete). If Salesforce sent shorter or uneven pages they're thrown away 
+                and the pages are followed from the first one instead, rather than skipping or repeating records 
+        #### Returns:
+            - list[list[dict]]: the raw records of each page, attributes included 
+        #### Side Effects:  
+            - None 
+        #### Exceptions: 
+            - If status_code returned by a page != 200, re-raises the error as an exception
+        """
+        quoted_querystring = urllib.parse.quote_plus(querystring)
+        header_dict = {"Authorization": f"Bearer {self.access_token}"}
+        resp = self._get(url=f"{self.base_url}/services/data/{self.api_version}/query/?q={quoted_querystring}", headers=header_dict)
+        if resp.status_code != 200:
+            raise Exception(f'Query of -->{quoted_querystring}<-- raised error: \n {str(resp.content)}')
+        resp_json = utils.decode_json(resp.content)
+        next_url = resp_json.get('nextRecordsUrl', None)
+        if not next_url:
+            return([resp_json['records']])
+        batch_size = len(resp_json['records'])
+        locator, _, offset = next_url.rpartition('-')
+        if not offset.isdigit() or int(offset) != batch_size:
+            return(self._follow_pages(quoted_querystring, resp_json, header_dict))
+        pages = [None] * -(-resp_json['totalSize'] // batch_size)
+        pages[0] = resp_json['records']
+
+        def fetch_page(page: int):
+            page_url = f"{locator}-{page * batch_size}"
+            resp = self._get(url=f"{self.base_url}{page_url}", headers=header_dict)
+            if resp.status_code != 200:
+                raise Exception(f'Query of -->{quoted_querystring}<-- on nextUrl -->{page_url}<-- raised error: \n {str(resp.content)}')
+            pages[page] = utils.decode_json(resp.content)['records']
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fetch_page, range(1, len(pages))))
+        if not Sftocsv._offset_pages_complete(pages, batch_size, resp_json['totalSize']):
+            return(self._follow_pages(quoted_querystring, resp_json, header_dict))
+        return(pages)
+
+
+    @staticmethod
+    def _offset_pages_complete(pages: list[list[dict]], batch_size: int, total_size: int) -> bool:
+        """
+        #### Inputs:
+            -@pages: the pages fetched from their locator offsets
+            -@batch_size: the size of the first page, that the offsets were worked out from 
+            -@total_size: the totalSize of the query 
+        #### Returns:
+            - True if every page but the last holds batch_size records and there are total_size records in all, 
+                so no record was skipped or fetched twice 
+        """
+        return(all(len(page) == batch_size for page in pages[:-1]) and sum(len(page) for page in pages) == total_size)
+
+
+    def query_composite(self, querystrings: list[str], nested: bool=False,
+                        record_format: str='dict') -> list[list[dict] | dict[str, list[dict]]]:
+        """
+        #### Inputs:
+            -@querystrings: list of soql queries, usually many small ones
+            -@nested: see query_records
+            -@record_format: see query_records
+        #### Expected Behaviour: 
+            - sends the queries as subrequests of Composite Batch API calls, 25 per call, so a few hundred small 
+                queries cost a handful of round trips instead of one each. Queries with more than one page 
+                have the rest of their pages followed as usual
+            - if a cache is set, queries it holds aren't sent and the fetched ones are saved to it 
+        #### Returns:
+            - list of query_records results, in the order of querystrings
+        #### Side Effects:  
+            - if a cache is set, misses save their raw pages to it 
+        #### Exceptions: 
+            - If status_code returned by the batch call or a subrequest != 200, re-raises the error as an exception
+            - 'query_composite requires one of..' If the 'record_format' doesn't match one of the valid values 
+        """
+        if record_format not in ('dict', 'columnar', 'row'):
+            raise Exception('query_composite requires one of ("dict", "columnar", "row") in "record_format" argument')
+        query_pages = [None] * len(querystrings)
+        if self.cache is not None:
+            query_pages = [self.cache.get(self.base_url, self.api_version, querystring) for querystring in querystrings]
+        misses = [position for position, pages in enumerate(query_pages) if pages is None]
+        for start in range(0, len(misses), COMPOSITE_BATCH_LIMIT):
+            positions = misses[start:start + COMPOSITE_BATCH_LIMIT]
+            fetched = self._fetch_composite([querystrings[position] for position in positions])
+            for position, pages in zip(positions, fetched):
+                query_pages[position] = pages
+                if self.cache is not None:
+                    self.cache.put(self.base_url, self.api_version, querystrings[position], pages)
+        return([Sftocsv._shape_records((record for page in pages for record in page), nested, record_format)
+                for pages in query_pages])
+
+
+    def _fetch_composite(self, querystrings: list[str]) -> list[list[list[dict]]]:
+        """
+        #### Inputs:
+            -@querystrings: at most COMPOSITE_BATCH_LIMIT soql queries
+        #### Expected Behaviour: 
+            - posts the queries as one composite batch, then follows the nextRecordsUrl of each result 
+        #### Returns:
+            - list of the pages of each query, in the order of querystrings
+        #### Side Effects:  
+            - None 
+        #### Exceptions: 
+            - If status_code returned by the batch call or a subrequest != 200, re-raises the error as an exception
+        """
+        header_dict = {"Authorization": f"Bearer {self.access_token}"}
+        quoted_querystrings = [urllib.parse.quote_plus(querystring) for querystring in querystrings]
+        batch_requests = [{'method': 'GET', 'url': f'{self.api_version}/query/?q={quoted_querystring}'}
+                          for quoted_querystring in quoted_querystrings]
+        resp = self._post(url=f"{self.base_url}/services/data/{self.api_version}/composite/batch", 
+                          headers=header_dict, json={'batchRequests': batch_requests})
+        if resp.status_code != 200:
+            raise Exception(f'Composite batch of {len(querystrings)} queries raised error: \n {str(resp.content)}')
+        query_pages = []
+        for quoted_querystring, result in zip(quoted_querystrings, utils.decode_json(resp.content)['results']):
+            if result['statusCode'] != 200:
+                raise Exception(f'Query of -->{quoted_querystring}<-- raised error: \n {str(result["result"])}')
+            query_pages.append(self._follow_pages(quoted_querystring, result['result'], header_dict))
+        return(query_pages)
+
+
+    def _get(self, **kwargs) -> requests.Response:
+        return(self._request('get', **kwargs))
+
+
+    def _post(self, **kwargs) -> requests.Response:
+        return(self._request('post', **kwargs))
+
+
+    def _request(self, method: str, **kwargs) -> requests.Response:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return(getattr(self.session if self.session is not None else requests, method)(**kwargs))
+
+
+    def iter_records(self, querystring: str, nested: bool=False, chunk_size: int=65536):
+        """
+        #### Inputs:
+            -@querystring: soql of form 'SELECT ... from ... where ...'
+            -@nested: If True the 'attributes' section of each record is kept, so the records can be 
+                passed to utils.split_nested_record_list
+            -@chunk_size: number of bytes read from the socket at a time
+        #### Expected Behaviour: 
+            - each page is requested as a stream and fed through a PageStreamParser, so records are 
+                decoded one at a time as their bytes arrive and never held as a whole page 
+            - the nextRecordsUrl of each page is followed until all pages are read 
+        #### Returns:
+            - generator of records (dicts), in query order 
+        #### Side Effects:  
+            - None 
+        #### Exceptions: 
+            - If status_code returned by query != 200, re-raises the error as an exception
+        """
+        quoted_querystring = urllib.parse.quote_plus(querystring)
+        header_dict = {"Authorization": f"Bearer {self.access_token}"}
+        next_url = f"/services/data/{self.api_version}/query/?q={quoted_querystring}"
+        first_page = True
+        while next_url:
+            resp = self._get(url=f"{self.base_url}{next_url}", headers=header_dict, stream=True)
+            if resp.status_code != 200:
+                if first_page:
+                    raise Exception(f'Query of -->{quoted_querystring}<-- raised error: \n {str(resp.content)}')
+                raise Exception(f'Query of -->{quoted_querystring}<-- on nextUrl -->{next_url}<-- raised error: \n {str(resp.content)}')
+            parser = PageStreamParser()
+            try:
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    for record in parser.feed(chunk):
+                        if not nested:
+                            del(record['attributes'])
+                        yield record
+            finally:
+                resp.close()
+            next_url = parser.close().get('nextRecordsUrl', None)
+            first_page = False
+
+
+    def invalidate_cached(self, querystring: str) -> bool:
+        """
+        #### Inputs:
+            -@querystring: soql of the cached result to drop
+        #### Expected Behaviour: 
+            - removes the cached result of the query for this org and api version, so the next 
+                query_records call goes to Salesforce again
+        #### Returns:
+            - True if a cached result was removed, otherwise False
+        #### Side Effects:  
+            - deletes the cache entry file
+        #### Exceptions: 
+            - No cache...: Raised if the instance wasn't created with a cache
+        """
+        if self.cache is None:
+            raise Exception('No cache set on this Sftocsv instance')
+        return(self.cache.invalidate(self.base_url, self.api_version, querystring))
             
             
-    def large_in_query(self, querystring: str, in_list:list, nested: bool=False) -> list[dict] | dict[str, list[dict]]: 
+    def large_in_query(self, querystring: str, in_list:list, nested: bool=False, 
+                       composite: bool=False) -> list[dict] | dict[str, list[dict]]: 
         """
         #### Inputs:
             -@querystring: soql of form 'SELECT ... from ... where ... <in> ...'
             -@in_list: a list to substitute into the spot of <in> 
             -@nested: If you're using this function for a nested query, set to True
+            -@composite: If True the chunk queries are sent 25 at a time through query_composite
         #### Expected Behaviour: 
             - This is for use in avoiding hitting the 20,000 character limit on a query. You're likely to only hit this if you have a 
                 very large list of values in a 'in' query. This function splits the 'in_list' into amounts that will fit into the 
@@ -87,6 +578,19 @@ class Sftocsv:
             raise Exception(f'No <in> found in query -->{querystring}<--')
         if(len(in_list) == 0):
             raise Exception('in_list is empty')
+        if(composite):
+            querystrings = []
+            remaining_list = in_list
+            while len(remaining_list) > 0:
+                built_querystring, remaining_list = utils.build_in_querystring(querystring, remaining_list)
+                querystrings.append(built_querystring)
+            results = self.query_composite(querystrings, nested=nested)
+            if(nested):
+                current_records = {}
+                for resp in results:
+                    current_records = utils.combine_nested_result_dicts(source_dict=resp, destination_dict=current_records)
+                return(current_records)
+            return([record for resp in results for record in resp])
         
         built_querystring, remaining_list = utils.build_in_querystring(querystring, in_list)
         current_records = [] 
@@ -107,68 +611,384 @@ class Sftocsv:
         return(current_records)
 
 
+    def run_batch(self, manifest: list[dict], workers: int = 4, history_path: str = None) -> list[dict]:
+        """
+        #### Inputs:
+            -@manifest: list of jobs, each a dict of 'query', optional 'output' (csv filename) and optional 'nested'
+            -@workers: number of queries run at once
+            -@history_path: optional json file of the row counts of earlier runs
+        #### Expected Behaviour: 
+            - runs every query of the manifest on a pool of threads sharing this instance's token, session (one is 
+                made for the batch if the instance has none) and rate limiter, writing each result to its output csv. Jobs are started longest first by the
+                row counts in the history (unknown queries first), so a long query doesn't start last.
+                A failing job is reported and doesn't stop the others
+        #### Returns:
+            - one dict per job, in manifest order: the job plus 'rows', 'seconds' and 'error' (None if it succeeded)
+        #### Side Effects: 
+            - writes the output csvs, and the history file if history_path is set
+        #### Exceptions:
+            - None
+        """
+        return(batch.run_batch(self, manifest, workers=workers, history_path=history_path))
+
+
     @staticmethod
-    def records_to_csv(records: list[dict] | dict[str, list[dict]] , output_filename: str, append: bool=False): #tested #need to make this work for nested as well 
+    def records_to_csv(records: list[dict] | dict[str, list[dict]] , output_filename: str, append: bool=False,
+                       fieldnames: list=None, fields: list=None): #tested #need to make this work for nested as well 
         """
         #### Inputs: 
-            -@records: either a list of dicts (representing a non-nested query result), 
-                        of a dict with lists of dicts as values, (representing a nested query result)
+            -@records: either a list of dicts or ColumnarRecords (representing a non-nested query result), 
+                        of a dict with lists of dicts as values, (representing a nested query result),
+                        or any other iterable of records (i.e a generator from iter_records or an iter_ join) which is streamed
             -@output_filename: string to use as the filename. (.csv format is optional on the end) 
                 In the case of a nested query result this string will become a prefix and the record type will be appended (i.e _Account.csv)
             -@append: if True, will attempt to append to the file, rather than write new ones
+            -@fieldnames: only used when streaming, the csv header (see utils.stream_records_to_csv)
+            -@fields: optional, the only fields written, other keys are dropped as the rows are written. 
+                When streaming they're the header 
         #### Expected Behaviour: 
             - First checks that .csv wasn't passed in, trims it if it was, so that it can be used as a 
                 prefix if needed in record_list_dict_to_csv
             - then depending on the type of records parameter passed in, either calls 
-                utils.record_list_to_csv or record_list_dict_to_csv 
+                utils.record_list_to_csv, record_list_dict_to_csv or stream_records_to_csv
             
         Takes in a list of records (dicts) and a filename ending with csv,
         Each record will be saved as a row in the csv output
         Each unique key will become a header in the csv
         """
         output_filename = output_filename.rpartition('.csv')[0]
-        if(type(records) == list):
-            utils.record_list_to_csv(record_list=records, output_filename=output_filename, append=append)
+        if(type(records) == list or isinstance(records, ColumnarRecords)):
+            utils.record_list_to_csv(record_list=records, output_filename=output_filename, append=append, fields=fields)
         elif(type(records) == dict):
-            utils.record_list_dict_to_csv(record_list_dict=records, filename_prefix=output_filename, append=append)
+            utils.record_list_dict_to_csv(record_list_dict=records, filename_prefix=output_filename, append=append, fields=fields)
+        else:
+            utils.stream_records_to_csv(records, output_filename=output_filename, fieldnames=fieldnames, append=append, fields=fields)
+
+
+    @staticmethod
+    def records_to_sqlite(records: list[dict] | dict[str, list[dict]], database: str, table: str=None, 
+                          append: bool=False, indexes: tuple[str]=(), batch_size: int=5000) -> int | dict[str, int]:
+        """
+        #### Inputs: 
+            -@records: a list of dicts or ColumnarRecords, any other iterable of records (i.e from iter_records), 
+                        or a dict with lists of dicts as values (representing a nested query result)
+            -@database: path of the sqlite file, or an open sqlite3 connection 
+            -@table: the table name, required unless the records are a nested result (one table per type) 
+            -@append: if True, rows are added to the existing tables rather than replacing them 
+            -@indexes: columns to index as well as 'Id' (and the parent type columns of a nested result) 
+            -@batch_size: number of records inserted at a time 
+        #### Expected Behaviour: 
+            - see sqlite.records_to_sqlite, the records are inserted in batches with executemany inside one 
+                transaction per table and indexes are built after the rows are in 
+        #### Returns:
+            - the number of rows inserted, or for a nested result a dict of type to rows inserted
+        #### Side Effects: 
+            - writes to the database 
+        #### Exceptions:
+            - 'records_to_sqlite requires a table..': Raised if non-nested records are passed without a table name
+        """
+        return(sqlite.records_to_sqlite(records, database, table=table, append=append, indexes=indexes, batch_size=batch_size))
 
     
     @staticmethod
-    def inner_join(left_list: list[dict], right_list: list[dict], left_key: str, right_key:str, preserve_right_key:bool=False) -> list[dict]:
+    def inner_join(left_list: list[dict], right_list: list[dict], left_key: str | tuple[str], right_key: str | tuple[str],
+                   preserve_right_key:bool=False, strategy: str='hash', memory_budget: int=256*1024*1024,
+                   spill_dir: str=None, order_key=None,
+                   views: bool=False, key_func=None, fields: list[str]=None) -> list[dict]:
         """
         #### Inputs: 
             -@left_list: list[dict]
-            -@right_list: list[dict]
-            -@left_key: the key you want to match with from the left_list
-            -@right_key: the key you want to match with from the right_lis
+            -@right_list: list[dict], or a RecordIndex built on the right_key (the index is probed instead of building one)
+            -@left_key: the key you want to match with from the left_list, or a tuple of keys for a composite key
+            -@right_key: the key you want to match with from the right_list, or a tuple of keys (same length as left_key)
             -@preserve_right_key: If true, will keep the right key in the resulting dicts, otherwise 
                 just preserves the left key 
+            -@strategy: one of ('hash', 'grace', 'merge'). 'grace' spills both lists to disk in partitions of their hashed key 
+                and joins one partition pair at a time, for lists too big to index in memory. The records then come out 
+                grouped by partition rather than in left_list order. 
+                'merge' is for lists already sorted on their keys (i.e queried with ORDER BY), both are read in step 
+                without an index, and the records come out in key order. 
+            -@memory_budget: 'grace' only, bytes a partition of the right_list may take in memory
+            -@spill_dir: 'grace' only, folder for the temporary partition files (system temp folder if None)
+            -@order_key: 'merge' only, callable applied to each key value to get the order the lists are sorted in, 
+                i.e str.lower for text fields sorted by soql, which orders them ignoring case. None values sort first 
+            -@views: if True the combined records are MergedRecord views over the left and right records instead of 
+                new dicts, which saves copying every matched pair. A view turns into its own dict the first time it's changed 
+            -@key_func: optional callable applied to each key value before matching, i.e utils.normalize_key to match 
+                ignoring case and whitespace. It's computed once per record as the keys are read, records aren't copied or changed 
+            -@fields: optional, the only fields of the combined records. They're built with just these fields 
+                (left values winning, like utils.combine_records) rather than copied whole and trimmed, and in their order. 
+                The right key is still left out unless preserve_right_key is True. Can't be used with views 
         #### Expected Behaviour: 
             -will produce a list of records equivalent to an INNER JOIN 
                 (exclusively rows that have a key found in both lists are combined and output)
             - i.e, for each value in left_list, if left_key matches any record in right_list on the right_key, 
                 those records are combined into the output. 
+            - the right_list is read once into a hash index on its key value (a tuple of values for composite keys),
+                then each left record looks up its matches, so the join is a single pass over each list
+            - records missing any of the key fields are skipped
         #### Returns: 
             - The resulting dict
         #### Side Effects: 
-            - None 
+            - 'grace' writes temporary partition files 
         #### Exceptions: 
+            - left_key and right_key...: Raised if the keys have a different number of fields
+            - '_key must match the key of the RecordIndex': Raised if an index is passed with a different key (or key_func)
+            - 'inner_join requires one of..' If the 'strategy' doesn't match one of the valid values 
+            - 'merge join requires..' Raised with strategy 'merge' if a list isn't sorted on its key 
+            - 'inner_join can't use views and fields together': Raised if both are set 
+        """
+        return(list(Sftocsv.iter_inner_join(left_list, right_list, left_key, right_key, preserve_right_key, strategy=strategy,
+                                            memory_budget=memory_budget, spill_dir=spill_dir, order_key=order_key,
+                                            views=views, key_func=key_func, fields=fields)))
+
+
+    @staticmethod
+    def iter_inner_join(left_list: list[dict], right_list: list[dict], left_key: str | tuple[str], right_key: str | tuple[str],
+                        preserve_right_key:bool=False, strategy: str='hash', memory_budget: int=256*1024*1024,
+                        spill_dir: str=None, order_key=None,
+                        views: bool=False, key_func=None, fields: list[str]=None):
+        """
+        #### Inputs: 
+            - Same as inner_join, left_list can be any iterable of records (i.e iter_records) 
+        #### Expected Behaviour: 
+            - the hash index of the right_list is built straight away, then combined records are produced 
+                one at a time as the left records are read, so only the right_list (the build side) is held in memory
+            - with strategy 'grace' both lists are partitioned to disk first and each partition pair is joined 
+                this way, so only one partition of the right_list is held in memory
+            - with strategy 'merge' nothing is read up front, both lists are walked in step and only the records 
+                sharing the current key are held in memory, so both lists can be generators
+        #### Returns: 
+            - generator of the records inner_join would return, in the same order 
+        #### Side Effects: 
+            - 'grace' writes temporary partition files 
+        #### Exceptions: 
+            - left_key and right_key...: Raised if the keys have a different number of fields
+            - '_key must match the key of the RecordIndex': Raised if an index is passed with a different key (or key_func)
+            - 'inner_join requires one of..' If the 'strategy' doesn't match one of the valid values 
+            - 'merge join requires..' Raised with strategy 'merge' once a record is read out of order 
+            - 'inner_join can't use views and fields together': Raised if both are set 
+        """
+        left_fields = utils.key_fields(left_key)
+        right_fields = utils.key_fields(right_key)
+        if len(left_fields) != len(right_fields):
+            raise Exception('left_key and right_key must have the same number of fields')
+        if strategy not in ('hash', 'grace', 'merge'):
+            raise Exception('inner_join requires one of ("hash", "grace", "merge") in "strategy" argument')
+        if views and fields is not None:
+            raise Exception("inner_join can't use views and fields together")
+        if isinstance(right_list, RecordIndex):
+            key_func = right_list.resolve_join(right_fields, key_func, 'right_key')
+        if strategy == 'merge':
+            return(merge.merge_join(left_list, right_list, utils.key_getter(left_fields, missing_as_none=True, key_func=key_func), 
+                                    utils.key_getter(right_fields, missing_as_none=True, key_func=key_func),
+                                    lambda left_run, right_run: Sftocsv.iter_inner_join(left_run, right_run, left_key, right_key, preserve_right_key, 
+                                                                                        views=views, key_func=key_func, fields=fields),
+                                    composite=len(left_fields) > 1, order_key=order_key))
+        if strategy == 'grace':
+            return(spill.grace_join(left_list, right_list, utils.key_getter(left_fields, missing_as_none=True, key_func=key_func), 
+                                    utils.key_getter(right_fields, missing_as_none=True, key_func=key_func),
+                                    lambda left_part, right_part: Sftocsv.iter_inner_join(left_part, right_part, left_key, right_key, preserve_right_key, 
+                                                                                          views=views, key_func=key_func, fields=fields),
+                                    build_side='right', memory_budget=memory_budget, spill_dir=spill_dir))
+        left_getter = utils.key_getter(left_fields, key_func=key_func)
+        right_getter = utils.key_getter(right_fields, key_func=key_func)
+        right_index = {}
+        unhashable_rights = [] # i.e relationship dicts, these can only be compared
+        if isinstance(right_list, RecordIndex):
+            right_index, unhashable_rights = right_list.join_tables()
+            right_list = ()
+        for right_record in right_list:
+            try:
+                key_value = right_getter(right_record)
+            except KeyError:
+                continue
+            try:
+                if key_value in right_index:
+                    right_index[key_value].append(right_record)
+                else:
+                    right_index[key_value] = [right_record]
+            except TypeError:
+                unhashable_rights.append((key_value, right_record))
+
+        hidden_fields = () if preserve_right_key else right_fields
+        if fields is not None:
+            hidden = {field.lower() for field in hidden_fields}
+            fields = [field for field in fields if field.lower() not in hidden]
+
+        def probe():
+            for left_record in left_list:
+                try:
+                    key_value = left_getter(left_record)
+                except KeyError:
+                    continue
+                try:
+                    matches = right_index.get(key_value, ())
+                except TypeError:
+                    matches = [right_record for right_value, right_record in unhashable_rights if right_value == key_value]
+                for right_record in matches:
+                    if views:
+                        yield MergedRecord(left_record, right_record, hidden_fields)
+                        continue
+                    if fields is not None:
+                        yield utils.combine_projected(left_record, right_record, fields)
+                        continue
+                    combined_record = utils.combine_records(left_record, right_record)
+                    if not preserve_right_key:
+                        for field in right_fields:
+                            del combined_record[field]
+                    yield combined_record
+        return(probe())
+    
+
+    @staticmethod
+    def semi_join(left_list: list[dict], right_list: list[dict], left_key: str | tuple[str], right_key: str | tuple[str],
+                  key_func=None) -> list[dict]:
+        """
+        #### Inputs: 
+            -@left_list: list[dict]
+            -@right_list: list[dict], or a RecordIndex built on the right_key
+            -@left_key: key to match upon from the left_list, or a tuple of keys for a composite key
+            -@right_key: key to match upon from the right_list, or a tuple of keys (same length as left_key)
+            -@key_func: optional callable applied to each key value before matching, see inner_join
+        #### Expected Behaviour: 
+            - produces the left records that have at least one match in the right_list, equivalent to 
+                WHERE left_key IN (SELECT right_key ...). i.e Leads whose Email appears in Contacts 
+            - a set of the right key values is built, then the left_list is filtered on it 
+            - key matching works as in inner_join, records missing a key field never match
+        #### Returns: 
+            - list of the original left records (not copies), in their original order, each at most once
+        #### Side Effects: 
             - None 
+        #### Exceptions: 
+            - left_key and right_key...: Raised if the keys have a different number of fields
         """
+        left_getter, has_match = Sftocsv._filter_join_setup(right_list, left_key, right_key, key_func)
         resulting_list = []
         for left_record in left_list:
-            if left_key not in left_record.keys():
+            try:
+                if has_match(left_getter(left_record)):
+                    resulting_list.append(left_record)
+            except KeyError:
                 continue
-            for right_record in right_list:
-                if right_key not in right_record.keys():
+        return(resulting_list)
+
+
+    @staticmethod
+    def anti_join(left_list: list[dict], right_list: list[dict], left_key: str | tuple[str], right_key: str | tuple[str],
+                  key_func=None) -> list[dict]:
+        """
+        #### Inputs: 
+            -@left_list: list[dict]
+            -@right_list: list[dict], or a RecordIndex built on the right_key
+            -@left_key: key to match upon from the left_list, or a tuple of keys for a composite key
+            -@right_key: key to match upon from the right_list, or a tuple of keys (same length as left_key)
+            -@key_func: optional callable applied to each key value before matching, see inner_join
+        #### Expected Behaviour: 
+            - produces the left records that have no match in the right_list, equivalent to 
+                WHERE left_key NOT IN (SELECT right_key ...). i.e Accounts with no Opportunities
+            - a set of the right key values is built, then the left_list is filtered on it 
+            - key matching works as in inner_join, a left record missing a key field has no match so it's kept
+        #### Returns: 
+            - list of the original left records (not copies), in their original order
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - left_key and right_key...: Raised if the keys have a different number of fields
+        """
+        left_getter, has_match = Sftocsv._filter_join_setup(right_list, left_key, right_key, key_func)
+        resulting_list = []
+        for left_record in left_list:
+            try:
+                if has_match(left_getter(left_record)):
                     continue
-                if right_record[right_key] == left_record[left_key]:
-                    combined_record = utils.combine_records(left_record, right_record)
-                    if not preserve_right_key:
-                        del combined_record[right_key]
-                    resulting_list.append(combined_record)
+            except KeyError:
+                pass
+            resulting_list.append(left_record)
         return(resulting_list)
-    
+
+
+    @staticmethod
+    def _filter_join_setup(right_list: list[dict], left_key: str | tuple[str], right_key: str | tuple[str], key_func=None) -> tuple:
+        """
+        #### Inputs: 
+            -@right_list: list[dict]
+            -@left_key: key of the left records
+            -@right_key: key of the right records
+            -@key_func: optional callable applied to each key value
+        #### Expected Behaviour: 
+            - builds the getter for left key values and the set of key values found in the right_list,
+                right records missing a key field are left out of the set 
+            - key values that can't be hashed (i.e relationship dicts) are kept in a list and compared, like inner_join 
+        #### Returns: 
+            - tuple of the left key getter and a callable telling if a key value is found in the right_list 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - left_key and right_key...: Raised if the keys have a different number of fields
+        """
+        left_fields = utils.key_fields(left_key)
+        right_fields = utils.key_fields(right_key)
+        if len(left_fields) != len(right_fields):
+            raise Exception('left_key and right_key must have the same number of fields')
+        unhashable_keys = [] # i.e relationship dicts, these can only be compared
+        if isinstance(right_list, RecordIndex):
+            key_func = right_list.resolve_join(right_fields, key_func, 'right_key')
+            right_keys, unhashable_rights = right_list.join_tables()
+            unhashable_keys = [key_value for key_value, _ in unhashable_rights]
+        else:
+            right_getter = utils.key_getter(right_fields, key_func=key_func)
+            right_keys = set()
+            for right_record in right_list:
+                try:
+                    key_value = right_getter(right_record)
+                except KeyError:
+                    continue
+                try:
+                    right_keys.add(key_value)
+                except TypeError:
+                    unhashable_keys.append(key_value)
+
+        def has_match(key_value) -> bool:
+            try:
+                return(key_value in right_keys)
+            except TypeError:
+                return(key_value in unhashable_keys)
+        return(utils.key_getter(left_fields, key_func=key_func), has_match)
+
+
+    @staticmethod
+    def multi_join(lists: dict[str, list[dict]], conditions: list[tuple], dry_run: bool=False, key_func=None) -> list[dict]:
+        """
+        #### Inputs: 
+            -@lists: dict of a name for each list to the list, i.e {'Account': accounts, 'Opportunity': opportunities}
+            -@conditions: list of (left name, left key, right name, right key) inner join conditions between the lists, 
+                i.e [('Account', 'Id', 'Opportunity', 'AccountId')]. Keys can be tuples for composite keys 
+            -@dry_run: if True nothing is joined, the plan is returned instead 
+            -@key_func: optional callable applied to each key value before matching, see inner_join 
+        #### Expected Behaviour: 
+            - an INNER JOIN of all of the lists, the join order is chosen from the row and distinct key counts of each list
+                so the intermediate results stay as small as possible (see planner.plan_joins)
+            - intermediate results hold references to the original records, the output records are only built at the end.
+                They're combined in the order of lists, so the result is the same whatever the plan: 
+                the earlier list's value wins if two lists share a field, and key fields are kept 
+        #### Returns: 
+            - list of the joined records 
+            - if dry_run, the list of plan steps: dicts of 'join', 'with', 'on' and 'estimated_rows' 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - 'multi_join needs..': Raised if there are no conditions 
+            - 'multi_join has no list named..': Raised if a condition names an unknown list 
+            - 'multi_join condition joins .. to itself..': Raised if a condition has the same list on both sides 
+            - left_key and right_key...: Raised if a condition's keys have a different number of fields
+            - 'multi_join conditions must connect every list': Raised if a list isn't joined to the others 
+        """
+        steps = planner.plan_joins(lists, conditions, key_func=key_func)
+        if dry_run:
+            return(steps)
+        return(planner.run_plan(lists, steps, key_func=key_func))
+
 
     @staticmethod
     def natural_join(left_list: list[dict], right_list: list[dict], exclusive:bool=False):     
@@ -193,76 +1013,365 @@ class Sftocsv:
         #### Exceptions: 
             - None 
         """
-        resulting_list = []
-        for left_record in left_list:
-            for right_record in right_list:
-                match = False
-                retrieved = [left_record.get(key) == right_record.get(key) for key in left_record.keys() if key in right_record.keys()]
-                #inclusive method, if any of these match it's all good 
-                if not exclusive and True in retrieved:  
-                    match = True                        
-                #exclusive method, all must match on shared keys 
-                elif exclusive and False not in retrieved:
-                    match = True 
-                if(match == True):                    
-                    combined_record = utils.combine_records(left_record, right_record)
-                    resulting_list.append(combined_record)
-                    break
-        return(resulting_list)
+        return(list(Sftocsv.iter_natural_join(left_list, right_list, exclusive)))
+
+
+    @staticmethod
+    def iter_natural_join(left_list: list[dict], right_list: list[dict], exclusive:bool=False):
+        """
+        #### Inputs: 
+            - Same as natural_join, left_list can be any iterable of records 
+        #### Expected Behaviour: 
+            - the right_list is read straight away. In inclusive mode it's indexed on each (key, value) pair, 
+                so for each left record the first right record sharing any key and value is found with one lookup per key
+                rather than a scan. Records with unhashable values (i.e relationship dicts) are also kept aside and 
+                checked by comparison, so the result is the same as a scan.
+            - in exclusive mode each left record is compared against the right records in order, as in natural_join 
+            - combined records are produced one at a time as the left records are read
+        #### Returns: 
+            - generator of the records natural_join would return, in the same order 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        right_records = list(right_list)
+
+        def matches(left_record: dict, right_record: dict) -> bool:
+            retrieved = [left_record.get(key) == right_record.get(key) for key in left_record.keys() if key in right_record.keys()]
+            #inclusive method, if any of these match it's all good 
+            if not exclusive:
+                return(True in retrieved)
+            #exclusive method, all must match on shared keys 
+            return(False not in retrieved)
+
+        if exclusive:
+            def scan():
+                for left_record in left_list:
+                    for right_record in right_records:
+                        if matches(left_record, right_record):
+                            yield utils.combine_records(left_record, right_record)
+                            break
+            return(scan())
+
+        pair_index = {}
+        unhashable_rights = []
+        for right_i, right_record in enumerate(right_records):
+            has_unhashable = False
+            for pair in right_record.items():
+                try:
+                    if pair not in pair_index:
+                        pair_index[pair] = right_i
+                except TypeError:
+                    has_unhashable = True
+            if has_unhashable:
+                unhashable_rights.append(right_i)
+
+        def probe():
+            for left_record in left_list:
+                first_match = len(right_records)
+                for pair in left_record.items():
+                    try:
+                        right_i = pair_index.get(pair, first_match)
+                    except TypeError:
+                        continue
+                    if right_i < first_match:
+                        first_match = right_i
+                for right_i in unhashable_rights:
+                    if right_i >= first_match:
+                        break
+                    if matches(left_record, right_records[right_i]):
+                        first_match = right_i
+                        break
+                if first_match < len(right_records):
+                    yield utils.combine_records(left_record, right_records[first_match])
+        return(probe())
     
 
     @staticmethod
-    def outer_join(left_list: list[dict], right_list: list[dict], left_key: str, right_key: str,
-                    side: str, preserve_innner_key:bool=False):
+    def outer_join(left_list: list[dict], right_list: list[dict], left_key: str | tuple[str], right_key: str | tuple[str],
+                    side: str, preserve_innner_key:bool=False, strategy: str='hash', memory_budget: int=256*1024*1024,
+                    spill_dir: str=None, order_key=None,
+                    views: bool=False, key_func=None, fields: list[str]=None):
         """
         #### Inputs: 
-            -@left_list: list[dict]
-            -@right_list: list[dict]
-            -@left_key: key to match upon from the left_list 
-            -@right_key: key to match upon from the right_list
+            -@left_list: list[dict], or a RecordIndex built on the left_key if side is 'right'
+            -@right_list: list[dict], or a RecordIndex built on the right_key if side is 'left' or 'full'
+            -@left_key: key to match upon from the left_list, or a tuple of keys for a composite key
+            -@right_key: key to match upon from the right_list, or a tuple of keys (same length as left_key)
             -@side: on of ['left', 'right', 'full'], to designate the type of outer join
+            -@strategy: one of ('hash', 'grace', 'merge'), see inner_join. With 'grace' the unmatched inner records of a full join 
+                come out with their partition rather than at the end, with 'merge' they come out in key order 
+            -@memory_budget: 'grace' only, bytes a partition of the inner list may take in memory
+            -@spill_dir: 'grace' only, folder for the temporary partition files (system temp folder if None)
+            -@order_key: 'merge' only, see inner_join 
+            -@views: if True the combined records are MergedRecord views, see inner_join. Unmatched records are returned as they are 
+            -@key_func: optional callable applied to each key value before matching, see inner_join 
+            -@fields: optional, the only fields of the records returned, see inner_join. Unmatched records are cut down to them too 
         #### Expected Behaviour: 
             - if the 'side' is entered, it fills the outer, inner, outer_key, inner_key accordingly 
-                for each record in the outer list, it is checked against all elements of the inner list,
-                anny inner record that matches results in a new combined record being created and added to the return list
+            - the inner list is read once into a hash index on its key value (a tuple of values for composite keys), 
+                keeping each record's position. Missing key fields read as None, like record.get
+            - each record in the outer list looks up its matches in the index, any inner record that matches 
+                results in a new combined record being created and added to the return list
             - if an outer record is not matched on any inner record, it is still appended to the return list 
-            - for the inner list, a set of indexes of records that are unmatched is kept. In the case of a full outer join,
-                even if the inner list record is never matched against an outer record, it should still be added to the list. 
-                if it is matched, it doesn't need adding to the list again, hence the unmatched_inner storage. 
+            - the inner positions that get matched are marked. In the case of a full outer join,
+                even if the inner list record is never matched against an outer record, it should still be added to the list,
+                so the unmarked inner records are appended in their original order. 
         #### Returns: 
             - List of records resulting from the join 
         #### Side Effects: 
-            - None 
+            - 'grace' writes temporary partition files 
+        #### Exceptions: 
+            - 'outer_join requires one of..' If the 'side' or 'strategy' doesn't match one of the valid values 
+            - left_key and right_key...: Raised if the keys have a different number of fields
+            - '_key must match the key of the RecordIndex': Raised if an index is passed with a different key (or key_func)
+            - 'merge join requires..' Raised with strategy 'merge' if a list isn't sorted on its key 
+            - 'outer_join can't use views and fields together': Raised if both are set 
+        """
+        side_map = {'left': {'outer' : left_list, 'outer_key': left_key, 'inner': right_list, 'inner_key': right_key},
+                    'right': {'outer':right_list, 'outer_key':  right_key, 'inner': left_list, 'inner_key': left_key},
+                    'full': {'outer' : left_list, 'outer_key': left_key, 'inner': right_list, 'inner_key': right_key}}
+        if side not in side_map.keys():
+            raise Exception('outer_join requires one of ("left", "right", "full") in "side" argument')
+        if len(utils.key_fields(left_key)) != len(utils.key_fields(right_key)):
+            raise Exception('left_key and right_key must have the same number of fields')
+        return(list(Sftocsv.iter_outer_join(left_list, right_list, left_key, right_key, side, preserve_innner_key, strategy=strategy,
+                                            memory_budget=memory_budget, spill_dir=spill_dir, order_key=order_key,
+                                            views=views, key_func=key_func, fields=fields)))
+
+
+    @staticmethod
+    def iter_outer_join(left_list: list[dict], right_list: list[dict], left_key: str | tuple[str], right_key: str | tuple[str],
+                        side: str, preserve_innner_key:bool=False, strategy: str='hash', memory_budget: int=256*1024*1024,
+                        spill_dir: str=None, order_key=None,
+                        views: bool=False, key_func=None, fields: list[str]=None):
+        """
+        #### Inputs: 
+            - Same as outer_join, the outer list can be any iterable of records 
+        #### Expected Behaviour: 
+            - the hash index of the inner list is built straight away, then combined (or unmatched outer) records are produced 
+                one at a time as the outer records are read, so only the inner list (the build side) is held in memory
+            - for a full join the unmatched inner records come last, once the outer list is exhausted 
+            - with strategy 'grace' both lists are partitioned to disk first and each partition pair is joined 
+                this way, so only one partition of the inner list is held in memory
+            - with strategy 'merge' both lists are walked in step and only the records sharing the current key 
+                are held in memory, so both lists can be generators
+        #### Returns: 
+            - generator of the records outer_join would return, in the same order 
+        #### Side Effects: 
+            - 'grace' writes temporary partition files 
         #### Exceptions: 
-            - 'outer_join requires one of..' If the 'side' doesn't match one of the valid values 
+            - 'outer_join requires one of..' If the 'side' or 'strategy' doesn't match one of the valid values 
+            - left_key and right_key...: Raised if the keys have a different number of fields
+            - '_key must match the key of the RecordIndex': Raised if an index is passed with a different key (or key_func)
+            - 'merge join requires..' Raised with strategy 'merge' once a record is read out of order 
+            - 'outer_join can't use views and fields together': Raised if both are set 
         """
         side_map = {'left': {'outer' : left_list, 'outer_key': left_key, 'inner': right_list, 'inner_key': right_key},
                     'right': {'outer':right_list, 'outer_key':  right_key, 'inner': left_list, 'inner_key': left_key},
                     'full': {'outer' : left_list, 'outer_key': left_key, 'inner': right_list, 'inner_key': right_key}}
         if side not in side_map.keys():
             raise Exception('outer_join requires one of ("left", "right", "full") in "side" argument')
+        if len(utils.key_fields(left_key)) != len(utils.key_fields(right_key)):
+            raise Exception('left_key and right_key must have the same number of fields')
+        if strategy not in ('hash', 'grace', 'merge'):
+            raise Exception('outer_join requires one of ("hash", "grace", "merge") in "strategy" argument')
+        if views and fields is not None:
+            raise Exception("outer_join can't use views and fields together")
+        inner_fields = utils.key_fields(side_map[side]['inner_key'])
+        inner = side_map[side]['inner']
+        if isinstance(inner, RecordIndex):
+            key_func = inner.resolve_join(inner_fields, key_func, 'left_key' if side == 'right' else 'right_key')
+        if strategy == 'merge':
+            return(merge.merge_join(left_list, right_list, utils.key_getter(left_key, missing_as_none=True, key_func=key_func), 
+                                    utils.key_getter(right_key, missing_as_none=True, key_func=key_func),
+                                    lambda left_run, right_run: Sftocsv.iter_outer_join(left_run, right_run, left_key, right_key, side, preserve_innner_key, 
+                                                                                        views=views, key_func=key_func, fields=fields),
+                                    composite=len(inner_fields) > 1, order_key=order_key))
+        if strategy == 'grace':
+            return(spill.grace_join(left_list, right_list, utils.key_getter(left_key, missing_as_none=True, key_func=key_func), 
+                                    utils.key_getter(right_key, missing_as_none=True, key_func=key_func),
+                                    lambda left_part, right_part: Sftocsv.iter_outer_join(left_part, right_part, left_key, right_key, side, preserve_innner_key, 
+                                                                                          views=views, key_func=key_func, fields=fields),
+                                    build_side='left' if side == 'right' else 'right', memory_budget=memory_budget, spill_dir=spill_dir))
        
         #outer and inner 
-        outer_key = side_map[side]['outer_key']
+        outer_getter = utils.key_getter(side_map[side]['outer_key'], missing_as_none=True, key_func=key_func)
         outer = side_map[side]['outer']
-        inner_key = side_map[side]['inner_key']
-        inner = side_map[side]['inner']
-        return_list = []
-        unmatched_inner = set(list(range(len(inner))))
-        for outer_record in outer: 
-            matched = False
-            for inner_i, inner_record in enumerate(inner):
-                if outer_record.get(outer_key) == inner_record.get(inner_key):
-                    matched = True
-                    combined_record = utils.combine_records(outer_record, inner_record)
+        inner_getter = utils.key_getter(inner_fields, missing_as_none=True, key_func=key_func)
+        inner_index = {}
+        unhashable_inners = [] # i.e relationship dicts, these can only be compared
+        inner_records = []
+        if isinstance(inner, RecordIndex):
+            inner_index, unhashable_inners = inner.position_tables()
+            inner_records = inner.records
+            inner = ()
+        for inner_i, inner_record in enumerate(inner):
+            key_value = inner_getter(inner_record)
+            try:
+                if key_value in inner_index:
+                    inner_index[key_value].append(inner_i)
+                else:
+                    inner_index[key_value] = [inner_i]
+            except TypeError:
+                unhashable_inners.append((key_value, inner_i))
+            inner_records.append(inner_record)
+
+        hidden_fields = () if preserve_innner_key else inner_fields
+        hidden = {field.lower() for field in hidden_fields}
+        combined_fields = [field for field in fields if field.lower() not in hidden] if fields is not None else None
+
+        def probe():
+            matched_inner = [False] * len(inner_records)
+            for outer_record in outer: 
+                key_value = outer_getter(outer_record)
+                try:
+                    matches = inner_index.get(key_value, ())
+                except TypeError:
+                    matches = [inner_i for inner_value, inner_i in unhashable_inners if inner_value == key_value]
+                for inner_i in matches:
+                    matched_inner[inner_i] = True
+                    if views:
+                        yield MergedRecord(outer_record, inner_records[inner_i], hidden_fields)
+                        continue
+                    if fields is not None:
+                        yield utils.combine_projected(outer_record, inner_records[inner_i], combined_fields)
+                        continue
+                    combined_record = utils.combine_records(outer_record, inner_records[inner_i])
                     if(not preserve_innner_key):
-                        del(combined_record[inner_key])
-                    return_list.append(combined_record)
-                    if(inner_i in unmatched_inner):
-                        unmatched_inner.remove(inner_i)
-            if not matched:
-                return_list.append(outer_record)
-        if side == 'full':
-            for x in unmatched_inner:
-                return_list.append(inner[x])
-        return(return_list)
+                        for field in inner_fields:
+                            combined_record.pop(field, None)
+                    yield combined_record
+                if not matches:
+                    yield outer_record if fields is None else utils.combine_projected(outer_record, {}, fields)
+            if side == 'full':
+                for inner_i, matched in enumerate(matched_inner):
+                    if not matched:
+                        yield inner_records[inner_i] if fields is None else utils.combine_projected(inner_records[inner_i], {}, fields)
+        return(probe())
+
+
+    @staticmethod
+    def parallel_join_csv(left_csv: str | CsvSource, right_csv: str | CsvSource, left_key: str | tuple[str], right_key: str | tuple[str],
+                          output_filename: str, side: str='inner', preserve_key: bool=False, workers: int=None,
+                          key_func=None, fields: list[str]=None, spill_dir: str=None) -> int:
+        """
+        #### Inputs: 
+            -@left_csv: path of the left csv (i.e one written by records_to_csv), or a CsvSource 
+            -@right_csv: path of the right csv, or a CsvSource 
+            -@left_key: key to match upon from the left records, or a tuple of keys for a composite key
+            -@right_key: key to match upon from the right records, or a tuple of keys (same length as left_key)
+            -@output_filename: the csv the joined records are written to (.csv is optional on the end) 
+            -@side: 'inner' for inner_join, or one of ('left', 'right', 'full') for that outer_join 
+            -@preserve_key: keep the inner side's key field, preserve_right_key of inner_join or preserve_innner_key of outer_join 
+            -@workers: number of processes, the number of cores if None 
+            -@key_func: optional callable applied to each key value before matching, see inner_join. 
+                It has to be picklable (a named function like utils.normalize_key, not a lambda) 
+            -@fields: optional, the only fields written, see inner_join 
+            -@spill_dir: folder for the temporary files (system temp folder if None)
+        #### Expected Behaviour: 
+            - joins two csvs across worker processes, see parallel.join_csv. Each worker reads its own byte range of 
+                both files and splits the rows by key into partition files, then joins partition pairs with 
+                iter_inner_join / iter_outer_join and writes them out, so no records are sent between processes 
+            - values are strings, as read by CsvSource. The rows are the same as joining the two CsvSources in 
+                one process, grouped by partition rather than in input order 
+        #### Returns: 
+            - the number of joined records written 
+        #### Side Effects: 
+            - starts worker processes, writes temporary files and the output csv 
+        #### Exceptions: 
+            - 'parallel_join_csv requires one of..' If the 'side' doesn't match one of the valid values 
+            - left_key and right_key...: Raised if the keys have a different number of fields
+            - FileNotFoundError: Raised if a csv doesn't exist 
+        """
+        if side == 'inner':
+            join_function = partial(Sftocsv.iter_inner_join, left_key=left_key, right_key=right_key, 
+                                    preserve_right_key=preserve_key, key_func=key_func, fields=fields)
+        elif side in ('left', 'right', 'full'):
+            join_function = partial(Sftocsv.iter_outer_join, left_key=left_key, right_key=right_key, side=side, 
+                                    preserve_innner_key=preserve_key, key_func=key_func, fields=fields)
+        else:
+            raise Exception('parallel_join_csv requires one of ("inner", "left", "right", "full") in "side" argument')
+        if len(utils.key_fields(left_key)) != len(utils.key_fields(right_key)):
+            raise Exception('left_key and right_key must have the same number of fields')
+        output_path = output_filename if output_filename.endswith('.csv') else f'{output_filename}.csv'
+        return(parallel.join_csv(left_csv, right_csv, left_key, right_key, join_function, output_path, 
+                                 workers=workers, key_func=key_func, spill_dir=spill_dir))
+
+
+    @staticmethod
+    def group_by(records: list[dict], keys: str | tuple[str], aggregations: dict[str, tuple]) -> list[dict]:
+        """
+        #### Inputs: 
+            -@records: a list of dicts, ColumnarRecords or any other iterable of records (i.e from iter_records or an iter_ join) 
+            -@keys: the field to group on, or a tuple of fields 
+            -@aggregations: dict of output field to (function, field), function one of 'count', 'sum', 'min', 'max' 
+                and 'count_distinct', i.e {'Total': ('sum', 'Amount'), 'Deals': ('count', None)}. A field of None counts rows 
+        #### Expected Behaviour: 
+            - a hash aggregation in one pass over the records, keeping only a running state per group 
+                (see aggregate.group_by). None values are skipped like in sql, a missing key field groups as None 
+        #### Returns: 
+            - list of one dict per group, the key fields and the output fields, in the order the groups first appear 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - 'group_by requires one of..': Raised if an aggregation's function isn't valid 
+            - 'group_by requires a field..': Raised if a function other than count has no field 
+        """
+        return(aggregate.group_by(records, keys, aggregations))
+
+
+    @staticmethod
+    def diff_records(old: list[dict], new: list[dict], key: str | tuple[str]='Id', fields: list[str]=None, 
+                     key_func=None, value_func=None) -> dict[str, list]:
+        """
+        #### Inputs: 
+            -@old: the old extract, a list of dicts, ColumnarRecords, CsvSource or RecordIndex 
+            -@new: the new extract, any iterable of records (i.e a generator from iter_records) 
+            -@key: the field identifying a record, or a tuple of fields for a composite key 
+            -@fields: fields to compare, None for all of them 
+            -@key_func: optional callable applied to each key value, see inner_join 
+            -@value_func: optional callable applied to each value before comparing, i.e str to compare a csv against a query 
+        #### Expected Behaviour: 
+            - matches the records of both extracts on the key and sorts them into inserted (only in new), 
+                deleted (only in old) and changed (in both with a field that differs). Unchanged records are 
+                skipped on a fingerprint of their values, without comparing fields (see diff.diff) 
+            - a missing field, None and '' count as the same value, like they are once written to a csv 
+        #### Returns: 
+            - dict of 'inserted' (list of new records), 'deleted' (list of old records) and 'changed' 
+                (list of dicts of 'key', 'old', 'new' and 'deltas', a dict of field to (old value, new value)) 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - 'diff_records key .. is not unique..': Raised if a key value repeats in either extract 
+        """
+        result = {'inserted': [], 'deleted': [], 'changed': []}
+        for entry in diff.diff(old, new, key, fields=fields, key_func=key_func, value_func=value_func):
+            if entry['change'] == 'inserted':
+                result['inserted'].append(entry['new'])
+            elif entry['change'] == 'deleted':
+                result['deleted'].append(entry['old'])
+            else:
+                result['changed'].append({'key': entry['key'], 'old': entry['old'], 'new': entry['new'], 'deltas': entry['deltas']})
+        return(result)
+
+
+    @staticmethod
+    def iter_diff_records(old: list[dict], new, key: str | tuple[str]='Id', fields: list[str]=None, 
+                          key_func=None, value_func=None):
+        """
+        #### Inputs: 
+            - see diff_records 
+        #### Expected Behaviour: 
+            - like diff_records, but new is streamed and each difference is produced as it's found, 
+                so neither extract has to be held as a list (old can be a CsvSource) 
+        #### Returns: 
+            - generator of dicts of 'change' ('inserted', 'changed' or 'deleted'), 'key', 'old', 'new' and 'deltas'. 
+                Inserted and changed come in the order of new, then deleted in the order of old 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - 'diff_records key .. is not unique..': Raised if a key value repeats in either extract 
+        """
+        return(diff.diff(old, new, key, fields=fields, key_func=key_func, value_func=value_func))
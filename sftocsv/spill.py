@@ -0,0 +1,127 @@
+import os
+import pickle
+import tempfile
+
+_IN_MEMORY_FACTOR = 4 # a record held as a dict takes roughly this many times its pickled size
+_WRITE_BATCH = 256 # records buffered per partition before they're pickled to disk
+
+
+def _partition_of(key_value, salt: int, partitions: int) -> int:
+    try:
+        return(hash((salt, key_value)) % partitions)
+    except TypeError:
+        return(0) # unhashable values (i.e relationship dicts) can only be compared, keep them together
+
+
+def partition_records(records, getter, partitions: int, directory: str, prefix: str, salt: int = 0,
+                      partition_of=_partition_of) -> list[tuple[str, int]]:
+    """
+    #### Inputs:
+        -@records: iterable of records
+        -@getter: callable returning the key value of a record (missing fields as None)
+        -@partitions: number of partition files to split the records into
+        -@directory: folder the partition files are written to
+        -@prefix: prefix of the partition filenames
+        -@salt: mixed into the hash, so re-partitioning a partition splits it differently
+        -@partition_of: callable(key value, salt, partitions) returning the partition of a key value. The default
+            uses hash(), which is only the same within one process (see parallel.stable_partition_of)
+    #### Expected Behaviour:
+        - each record goes to the partition of its hashed key value, so records sharing a key value
+            always land in the same partition. Records are pickled in small batches
+    #### Returns:
+        - list of (path, bytes written) for each partition
+    #### Side Effects:
+        - writes the partition files
+    #### Exceptions:
+        - None
+    """
+    paths = [os.path.join(directory, f'{prefix}_{i}.pkl') for i in range(partitions)]
+    files = [open(path, 'wb') for path in paths]
+    buffers = [[] for _ in range(partitions)]
+    try:
+        for record in records:
+            i = partition_of(getter(record), salt, partitions)
+            buffers[i].append(record)
+            if len(buffers[i]) >= _WRITE_BATCH:
+                pickle.dump(buffers[i], files[i], protocol=pickle.HIGHEST_PROTOCOL)
+                buffers[i] = []
+        for i, buffer in enumerate(buffers):
+            if buffer:
+                pickle.dump(buffer, files[i], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for f in files:
+            f.close()
+    return([(path, os.path.getsize(path)) for path in paths])
+
+
+def read_partition(path: str):
+    """
+    #### Inputs:
+        -@path: a partition file written by partition_records
+    #### Expected Behaviour:
+        - reads the pickled batches back one at a time
+    #### Returns:
+        - generator of the records in the partition, in the order they were written
+    #### Side Effects:
+        - None
+    #### Exceptions:
+        - None
+    """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def grace_join(left_list, right_list, left_getter, right_getter, join_partition, build_side: str,
+               memory_budget: int, spill_dir: str = None, fanout: int = 16, max_depth: int = 3):
+    """
+    #### Inputs:
+        -@left_list: iterable of records
+        -@right_list: iterable of records
+        -@left_getter: callable returning the key value of a left record (missing fields as None)
+        -@right_getter: callable returning the key value of a right record (missing fields as None)
+        -@join_partition: callable(left_records, right_records) returning the joined records of one partition pair,
+            the build side is passed as a list and the other side as a generator
+        -@build_side: 'left' or 'right', the side the in memory join indexes
+        -@memory_budget: bytes a build partition may take in memory
+        -@spill_dir: folder for the temporary partition files, the system temp folder if None
+        -@fanout: number of partitions each split makes
+        -@max_depth: how many times an oversized partition is split again before it's joined anyway
+    #### Expected Behaviour:
+        - both sides are hashed on their key into fanout partition files, so matching records always
+            share a partition. Each partition pair is then joined in memory, the build partition loaded as a list
+            and the other streamed from disk
+        - a build partition estimated over the memory_budget is split again with a different salt
+            (a partition holding a single huge key can't be split, it's joined once max_depth is reached)
+    #### Returns:
+        - generator of joined records, grouped by partition (not in input order)
+    #### Side Effects:
+        - writes temporary files, removed once the generator finishes or is closed
+    #### Exceptions:
+        - None
+    """
+    with tempfile.TemporaryDirectory(prefix='sftocsv_spill_', dir=spill_dir) as directory:
+        yield from _join_partitions(left_list, right_list, left_getter, right_getter, join_partition, build_side,
+                                    memory_budget, directory, fanout, max_depth, depth=0, prefix='p')
+
+
+def _join_partitions(left_list, right_list, left_getter, right_getter, join_partition, build_side,
+                     memory_budget, directory, fanout, max_depth, depth, prefix):
+    left_parts = partition_records(left_list, left_getter, fanout, directory, f'{prefix}_l', salt=depth)
+    right_parts = partition_records(right_list, right_getter, fanout, directory, f'{prefix}_r', salt=depth)
+    for i, ((left_path, _), (right_path, right_size)) in enumerate(zip(left_parts, right_parts)):
+        build_size = right_size if build_side == 'right' else left_parts[i][1]
+        if build_size * _IN_MEMORY_FACTOR > memory_budget and depth + 1 < max_depth:
+            yield from _join_partitions(read_partition(left_path), read_partition(right_path), left_getter, right_getter,
+                                        join_partition, build_side, memory_budget, directory, fanout, max_depth,
+                                        depth=depth + 1, prefix=f'{prefix}_{i}')
+        elif build_side == 'right':
+            yield from join_partition(read_partition(left_path), list(read_partition(right_path)))
+        else:
+            yield from join_partition(list(read_partition(left_path)), read_partition(right_path))
+        os.remove(left_path)
+        os.remove(right_path)
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+from itertools import islice
+
+
+def _quote(identifier: str) -> str:
+    return('"' + identifier.replace('"', '""') + '"')
+
+
+def _to_sql(value):
+    if value is None or isinstance(value, (str, int, float, bytes)):
+        return(value)
+    return(json.dumps(value)) # i.e relationship dicts
+
+
+def write_table(connection: sqlite3.Connection, table: str, records, append: bool = False,
+                indexes: tuple[str] = (), batch_size: int = 5000) -> int:
+    """
+    #### Inputs:
+        -@connection: an open sqlite3 connection
+        -@table: name of the table to write
+        -@records: any iterable of records (dicts, Rows or MergedRecords)
+        -@append: if True rows are added to an existing table, otherwise it's replaced
+        -@indexes: columns to index, those the table doesn't have are skipped
+        -@batch_size: number of records inserted per executemany
+    #### Expected Behaviour:
+        - the records are read batch_size at a time, so an iterable is never held as a whole. Columns are
+            added to the table as new keys turn up (every column is untyped), and each batch is inserted
+            with one executemany. Nested values (i.e relationship dicts) are stored as json
+        - the indexes are built once all rows are in, which is cheaper than updating them per insert
+    #### Returns:
+        - the number of rows inserted
+    #### Side Effects:
+        - writes the table, not committed (see records_to_sqlite)
+    #### Exceptions:
+        - None
+    """
+    quoted_table = _quote(table)
+    if not append:
+        connection.execute(f'DROP TABLE IF EXISTS {quoted_table}')
+    columns = [row[1] for row in connection.execute(f'PRAGMA table_info({quoted_table})')]
+    known = set(columns)
+    records = iter(records)
+    count = 0
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        for record in batch:
+            for key in record:
+                if key not in known:
+                    if not columns:
+                        connection.execute(f'CREATE TABLE IF NOT EXISTS {quoted_table} ({_quote(key)})')
+                    else:
+                        connection.execute(f'ALTER TABLE {quoted_table} ADD COLUMN {_quote(key)}')
+                    columns.append(key)
+                    known.add(key)
+        if not columns:
+            continue
+        insert = (f'INSERT INTO {quoted_table} ({", ".join(_quote(column) for column in columns)}) '
+                  f'VALUES ({", ".join("?" * len(columns))})')
+        connection.executemany(insert, [tuple([_to_sql(record.get(column)) for column in columns]) for record in batch])
+        count += len(batch)
+    for column in indexes:
+        if column in known:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {_quote(f"{table}_{column}_idx")} '
+                               f'ON {quoted_table} ({_quote(column)})')
+    return(count)
+
+
+def records_to_sqlite(records, database: str | sqlite3.Connection, table: str = None, append: bool = False,
+                      indexes: tuple[str] = (), batch_size: int = 5000) -> int | dict[str, int]:
+    """
+    #### Inputs:
+        -@records: a list of dicts, ColumnarRecords or any other iterable of records (needs a table),
+                    or a dict with lists of dicts as values (a nested query result), written one table per type
+        -@database: path of the sqlite file (':memory:' works too), or an open sqlite3 connection
+        -@table: the table name for non-nested records
+        -@append: if True rows are added to existing tables, otherwise they're replaced
+        -@indexes: extra columns to index
+        -@batch_size: number of records inserted per executemany
+    #### Expected Behaviour:
+        - every table is written in a single transaction (see write_table)
+        - 'Id' is always indexed, and for a nested result so are the parent type columns that
+            split_nested_record_list adds (i.e the 'Account' column of Contact), so joins between the tables use indexes
+    #### Returns:
+        - the number of rows inserted, or for a nested result a dict of type to rows inserted
+    #### Side Effects:
+        - writes and commits to the database, a connection opened from a path is closed after
+    #### Exceptions:
+        - 'records_to_sqlite requires a table..': Raised if non-nested records are passed without a table name
+    """
+    if not isinstance(records, dict) and table is None:
+        raise Exception('records_to_sqlite requires a table name for non-nested records')
+    connection = sqlite3.connect(database) if isinstance(database, str) else database
+    try:
+        with connection:
+            if isinstance(records, dict):
+                return({record_type: write_table(connection, record_type, record_list, append=append,
+                                                 indexes=('Id', *records.keys(), *indexes), batch_size=batch_size)
+                        for record_type, record_list in records.items()})
+            return(write_table(connection, table, records, append=append, indexes=('Id', *indexes), batch_size=batch_size))
+    finally:
+        if isinstance(database, str):
+            connection.close()
@@ -0,0 +1,128 @@
+import re
+from .utils import utils
+
+_TOKEN = re.compile(rb'["\\\[\]{}:]')
+_QUOTE, _BACKSLASH, _COLON = ord('"'), ord('\\'), ord(':')
+_OPENERS, _CLOSERS = (ord('{'), ord('[')), (ord('}'), ord(']'))
+
+
+class PageStreamParser:
+    """
+    Incremental parser for a single query response page. Bytes are fed in as they arrive and
+    each record of the top level 'records' array is decoded as soon as its closing brace is seen,
+    so only the record currently being read is held as bytes.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._phase = 'prefix'
+        self._envelope = bytearray()
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        self._last_key = None
+        self._records_next = False
+        self._record_start = None
+
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        """
+        #### Inputs:
+            -@chunk: the next bytes of the response body
+        #### Expected Behaviour:
+            - scans the new bytes for json structure, tracking strings and depth,
+                the top level 'records' array is located and every record completed in this chunk is decoded
+            - everything outside of the records array is kept so the rest of the page (nextRecordsUrl etc.)
+                can be read by close
+            - bytes of finished records are dropped from the buffer
+        #### Returns:
+            - list of the records completed by this chunk (often empty)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - None
+        """
+        if self._phase == 'suffix':
+            self._envelope += chunk
+            return []
+        buf = self._buffer
+        buf += chunk
+        pos = self._pos
+        records = []
+        while True:
+            match = _TOKEN.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            i = match.start()
+            c = buf[i]
+            if self._in_string:
+                if c == _BACKSLASH:
+                    if i + 1 >= len(buf):
+                        pos = i
+                        break
+                    pos = i + 2
+                    continue
+                if c == _QUOTE:
+                    self._in_string = False
+                    if self._phase == 'prefix' and self._depth == 1:
+                        self._last_key = bytes(buf[self._string_start:i])
+                pos = i + 1
+                continue
+            if c == _QUOTE:
+                self._in_string = True
+                self._string_start = i + 1
+            elif c in _OPENERS:
+                self._depth += 1
+                if self._phase == 'prefix' and self._depth == 2:
+                    if c == _OPENERS[1] and self._records_next:
+                        self._phase = 'records'
+                        self._envelope += buf[:i + 1]
+                        del buf[:i + 1]
+                        pos = 0
+                        continue
+                    self._records_next = False
+                elif self._phase == 'records' and self._depth == 3 and c == _OPENERS[0]:
+                    self._record_start = i
+            elif c in _CLOSERS:
+                self._depth -= 1
+                if self._phase == 'records':
+                    if self._depth == 2 and self._record_start is not None:
+                        records.append(utils.decode_json(bytes(buf[self._record_start:i + 1])))
+                        self._record_start = None
+                    elif self._depth == 1:
+                        self._phase = 'suffix'
+                        self._envelope += buf[i:]
+                        buf.clear()
+                        pos = 0
+                        break
+            elif c == _COLON and self._phase == 'prefix' and self._depth == 1:
+                self._records_next = self._last_key == b'records'
+            pos = i + 1
+        if self._phase == 'records':
+            trim_to = pos if self._record_start is None else self._record_start
+            del buf[:trim_to]
+            pos -= trim_to
+            if self._record_start is not None:
+                self._record_start = 0
+        self._pos = pos
+        return(records)
+
+
+    def close(self) -> dict:
+        """
+        #### Expected Behaviour:
+            - called once the whole body has been fed, decodes everything outside the records array
+        #### Returns:
+            - the page json with 'records' as an empty list (i.e totalSize, done, nextRecordsUrl)
+        #### Side Effects:
+            - None
+        #### Exceptions:
+            - Response ended inside the records array: Raised if the body was cut off
+        """
+        if self._phase == 'records':
+            raise Exception('Response ended inside the records array')
+        if self._phase == 'prefix':
+            return(utils.decode_json(bytes(self._buffer)))
+        return(utils.decode_json(bytes(self._envelope)))
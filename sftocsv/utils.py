@@ -1,9 +1,19 @@
 import os
+import re
 import json
 import requests
 from datetime import datetime, timezone
 import copy
 import csv
+from operator import itemgetter
+from functools import lru_cache
+from .records import ColumnarRecords, RecordSchema
+
+try:
+    import orjson
+    _json_decoder = orjson.loads
+except ImportError:
+    _json_decoder = json.loads
 
 class utils:
 
@@ -159,6 +169,48 @@ class utils:
         return(return_dict)
     
     
+    @staticmethod
+    def set_json_decoder(decoder=None):
+        """
+        #### Inputs: 
+            -@decoder: callable taking bytes or str and returning the decoded json, 
+                if None the default is restored (orjson if it's installed, otherwise json.loads)
+        #### Expected Behaviour: 
+            - Sets the decoder used by decode_json, which is what every query page is parsed with 
+        #### Returns: 
+            - None 
+        #### Side Effects: 
+            - Changes the decoder for all Sftocsv instances
+        #### Exceptions: 
+            - None 
+        """
+        global _json_decoder
+        if decoder is None:
+            try:
+                import orjson
+                decoder = orjson.loads
+            except ImportError:
+                decoder = json.loads
+        _json_decoder = decoder
+
+
+    @staticmethod
+    def decode_json(content: bytes | str):
+        """
+        #### Inputs: 
+            -@content: raw json content of a response
+        #### Expected Behaviour: 
+            - decodes the content with the decoder set by set_json_decoder 
+        #### Returns: 
+            - the decoded json
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - Whatever the decoder raises on invalid json
+        """
+        return(_json_decoder(content))
+    
+    
     @staticmethod
     def get_z_time(year: int, month: int, day:int) -> str:
         """
@@ -183,10 +235,13 @@ class utils:
         return(formatted)
     
     @staticmethod   
-    def split_nested_record_list(input_list: list[dict]) -> dict[str,list[dict]]: #tesed
+    def split_nested_record_list(input_list: list[dict], record_format: str = 'dict') -> dict[str,list[dict]]: #tesed
         """
         #### Input:    
-            - a list of dicts resulting from a nested query to sf data 
+            - a list (or any iterable) of dicts resulting from a nested query to sf data, read once, so 
+                ColumnarRecords are filled as records arrive rather than after a full list of dicts is built 
+            -@record_format: one of ('dict', 'columnar', 'row'), what each record type's records are stored as,
+                'row' makes Rows sharing one schema per record type 
         #### Expected Behaviour: 
             - for each record in the list; 
             each record is appended to a list stored in the return dict, under the key of its type
@@ -200,6 +255,7 @@ class utils:
             - None  (this isn't true)
         """
         output_dict = {}
+        schemas = {}
 
         def split_record(record: dict, parent_id: str, parent_type: str):
             try:
@@ -220,7 +276,13 @@ class utils:
                         split_record(record=nested_record, parent_id=record_id, parent_type=record_type)
                 else:
                     current_record[key] = value
-            output_dict[record_type] = output_dict.get(record_type, []) + [current_record]
+            if record_format == 'row':
+                if record_type not in schemas:
+                    schemas[record_type] = RecordSchema()
+                current_record = schemas[record_type].make_row(current_record)
+            if record_type not in output_dict:
+                output_dict[record_type] = ColumnarRecords() if record_format == 'columnar' else []
+            output_dict[record_type].append(current_record)
 
         for record in input_list:
             split_record(record,None,None)
@@ -248,6 +310,119 @@ class utils:
         while index + 1 <= len(in_list) and len(querystring.replace('<in>', f'({",".join(in_list[:index+1])})')) < 20000:
            index += 1
         return(querystring.replace('<in>', f'({",".join(in_list[:index])})'), in_list[index:])
+
+
+    @staticmethod
+    def mask_soql(querystring: str) -> str:
+        """
+        #### Inputs: 
+            -@querystring: soql query 
+        #### Expected Behaviour: 
+            - blanks out quoted values and everything in brackets (i.e subqueries), keeping every position, 
+                so the top level clauses can be found with a regex and cut out of the original querystring 
+        #### Returns: 
+            -str: the masked querystring, the same length as the querystring 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        masked = []
+        depth = 0
+        quoted = False
+        escaped = False
+        for char in querystring:
+            if quoted:
+                quoted = escaped or char != "'"
+                escaped = not escaped and char == '\\'
+                masked.append(' ')
+            elif char == "'":
+                quoted = True
+                masked.append(' ')
+            else:
+                depth += (char == '(') - (char == ')')
+                masked.append(char if depth == 0 and char != ')' else ' ')
+        return(''.join(masked))
+
+
+    @staticmethod
+    def add_where_condition(querystring: str, condition: str) -> str:
+        """
+        #### Inputs: 
+            -@querystring: soql query of form 'SELECT ... from ... [where ...] ...'
+            -@condition: soql condition, i.e "StageName = 'Parked'"
+        #### Expected Behaviour: 
+            - ANDs the condition onto the top level WHERE clause, or adds a WHERE clause after the FROM 
+                (before any GROUP BY, ORDER BY, LIMIT, OFFSET or FOR clause) if there isn't one 
+        #### Returns: 
+            -str: the querystring with the condition 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - No FROM found...: Raised if the querystring has no top level FROM
+        """
+        masked = utils.mask_soql(querystring)
+        from_match = re.search(r'\bfrom\b', masked, re.IGNORECASE)
+        if from_match is None:
+            raise Exception(f'No FROM found in query -->{querystring}<--')
+        where_match = re.compile(r'\bwhere\b', re.IGNORECASE).search(masked, from_match.end())
+        clause_start = where_match.end() if where_match is not None else from_match.end()
+        end_match = re.compile(r'\b(with|group\s+by|order\s+by|limit|offset|for)\b', re.IGNORECASE).search(masked, clause_start)
+        end = end_match.start() if end_match is not None else len(querystring)
+        if where_match is None:
+            return(f'{querystring[:end].rstrip()} WHERE {condition} {querystring[end:]}'.rstrip())
+        existing = querystring[where_match.end():end].strip()
+        return(f'{querystring[:where_match.end()]} ({existing}) AND ({condition}) {querystring[end:]}'.rstrip())
+
+
+    @staticmethod
+    def countable(querystring: str) -> bool:
+        """
+        #### Inputs: 
+            -@querystring: soql query of form 'SELECT ... from ... where ...'
+        #### Expected Behaviour: 
+            - checks the top level of the query for GROUP BY and OFFSET. A COUNT() probe of a grouped query 
+                counts records rather than groups, and COUNT() ignores OFFSET, so neither can be sized by one 
+        #### Returns: 
+            -bool: True if build_count_querystring gives the number of records the query returns 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        return(re.search(r'\b(group\s+by|offset)\b', utils.mask_soql(querystring), re.IGNORECASE) is None)
+
+
+    @staticmethod
+    def build_count_querystring(querystring: str) -> str:
+        """
+        #### Inputs: 
+            -@querystring: soql query of form 'SELECT ... from ... where ...'
+        #### Expected Behaviour: 
+            - swaps the select list for COUNT() and drops the ORDER BY clause (COUNT() doesn't allow it), 
+                keywords inside quoted values and subqueries are ignored 
+        #### Returns: 
+            -str: the count querystring, i.e 'SELECT COUNT() from lead where ...'
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - No FROM found...: Raised if the querystring has no top level FROM
+            - Can't count...: Raised if the query has a GROUP BY or OFFSET (see countable)
+        """
+        if not utils.countable(querystring):
+            raise Exception(f"Can't count a query with GROUP BY or OFFSET -->{querystring}<--")
+        masked = utils.mask_soql(querystring)
+        from_match = re.search(r'\bfrom\b', masked, re.IGNORECASE)
+        if from_match is None:
+            raise Exception(f'No FROM found in query -->{querystring}<--')
+        count_querystring = f'SELECT COUNT() {querystring[from_match.start():]}'
+        masked = f'SELECT COUNT() {masked[from_match.start():]}'
+        order_match = re.search(r'\border\s+by\b', masked, re.IGNORECASE)
+        if order_match is not None:
+            end_match = re.compile(r'\b(limit|offset|for|update)\b', re.IGNORECASE).search(masked, order_match.end())
+            order_end = end_match.start() if end_match is not None else len(masked)
+            count_querystring = f'{count_querystring[:order_match.start()].rstrip()} {count_querystring[order_end:]}'.rstrip()
+        return(count_querystring)
     
 
     @staticmethod
@@ -279,10 +454,11 @@ class utils:
     def build_key_list(dict_list: list[dict]) -> list:
         """
         #### Inputs: 
-            -@dict_list: a list of dicts
+            -@dict_list: a list of dicts (or ColumnarRecords)
         #### Expected Behaviour: 
             - Loop through all dicts in the list, getting the unique keys in them
                 all and then return the list
+            - ColumnarRecords already hold their unique keys, so their header is returned
         #### Returns: 
             - Unique list of keys 
         #### Side Effects: 
@@ -290,6 +466,8 @@ class utils:
         #### Exceptions: 
             - None 
         """
+        if isinstance(dict_list, ColumnarRecords):
+            return(list(dict_list.header))
         header_list = [] # set is not used because we want to preserve order
         for record in dict_list:
             for key in record.keys():
@@ -298,16 +476,19 @@ class utils:
         return(header_list)
     
     @staticmethod
-    def record_list_to_csv(record_list: list[dict], output_filename: str, append: bool = False):
+    def record_list_to_csv(record_list: list[dict], output_filename: str, append: bool = False, fields: list = None):
         """
         #### Inputs: 
-            -@record_list: a list of dicts, representative of a non-nested query result
+            -@record_list: a list of dicts (or ColumnarRecords), representative of a non-nested query result
             -@output_filename: the filename to save the resulting .csv as (don't include .csv)
             -@append: if True, will append to an existing file, else writes 
+            -@fields: optional, the only fields written. Other keys are dropped from the rows 
         #### Expected Behaviour: 
             - if append=True, open the existing file and use the combination of the existing fieldnames 
                 and any potential new fieldnames from record_list 
             - otherwise, build the fieldnames using build_key_list
+            - with fields, the header is the fields found in the records, in the order of fields. They're matched 
+                ignoring case and written the way the records spell them (see match_fields) 
             - write/append to the csv file
         #### Returns: 
             - None 
@@ -317,28 +498,84 @@ class utils:
             - None 
         """
         fieldnames = []
-        records = []
+        records = record_list
         if append:
+            records = []
             with open(f'{output_filename}.csv', 'r') as existing_file: 
                 reader = csv.DictReader(existing_file)
                 for row in reader:
                     records.append(row)
+            records.extend(record_list)
 
-        records.extend(record_list)
         fieldnames = utils.build_key_list(records)
+        if fields is not None:
+            present = set(fieldnames)
+            fieldnames = [field for field in utils.match_fields(fields, fieldnames) if field in present]
         with open(f'{output_filename}.csv', 'w') as f:
-            w = csv.DictWriter(f, fieldnames)
+            w = csv.DictWriter(f, fieldnames, extrasaction='raise' if fields is None else 'ignore')
             w.writeheader()
             w.writerows(records)
 
     @staticmethod
-    def record_list_dict_to_csv(record_list_dict: dict, filename_prefix: str,  append: bool = False):
+    def stream_records_to_csv(records, output_filename: str, fieldnames: list = None, append: bool = False, 
+                              fields: list = None) -> int:
+        """
+        #### Inputs: 
+            -@records: any iterable of records (i.e a generator from iter_records or the iter_ joins)
+            -@output_filename: the filename to save the resulting .csv as (don't include .csv)
+            -@fieldnames: the csv header. If None, the keys of the first record are used (or the existing header when appending)
+            -@append: if True, rows are added to the end of an existing file 
+            -@fields: optional, the only fields written. They're the header (in place of fieldnames), spelt like the 
+                first record's keys (matched ignoring case, see match_fields), and other keys are dropped 
+        #### Expected Behaviour: 
+            - each record is written as a row as soon as it's read, so records are never collected in memory 
+            - because the header is written before the rows, every key has to be known up front,
+                records without a key get an empty value 
+        #### Returns: 
+            - the number of rows written 
+        #### Side Effects: 
+            - Writes/appends to the output_filename
+        #### Exceptions: 
+            - ValueError: raised by csv.DictWriter if a record has a key that isn't in the fieldnames (unless fields is set)
+        """
+        records = iter(records)
+        path = f'{output_filename}.csv'
+        write_header = True
+        if append and os.path.isfile(path):
+            write_header = False
+            if fieldnames is None and fields is None:
+                with open(path, 'r') as existing_file:
+                    fieldnames = next(csv.reader(existing_file), [])
+        first_record = None
+        if fields is not None or fieldnames is None:
+            first_record = next(records, None)
+        if fields is not None:
+            fieldnames = utils.match_fields(fields, first_record.keys() if first_record is not None else ())
+        elif fieldnames is None:
+            fieldnames = list(first_record.keys()) if first_record is not None else []
+        count = 0
+        with open(path, 'a' if append else 'w') as f:
+            w = csv.DictWriter(f, fieldnames, extrasaction='raise' if fields is None else 'ignore')
+            if write_header:
+                w.writeheader()
+            if first_record is not None:
+                w.writerow(first_record)
+                count += 1
+            for record in records:
+                w.writerow(record)
+                count += 1
+        return(count)
+
+
+    @staticmethod
+    def record_list_dict_to_csv(record_list_dict: dict, filename_prefix: str,  append: bool = False, fields: list = None):
         """
         #### Inputs: 
             -@record_list_dict: dict of lists of dicts, keys are used in the filename, 
             lists of dicts are saved as CSVs, each dict being a row,
             -@filename_prefix: a a prefix to prepend to each filename, which will be followed by its key
             -@append:  if True, will append to an existing file, else writes 
+            -@fields: optional, the only fields written to each file, see record_list_to_csv 
         #### Expected Behaviour: 
             - Each key in the dict is used to create a new csv and to call records_to_csv, 
                 passing in a filename created from a combination of the filename_prefi and the corresponding 
@@ -352,7 +589,103 @@ class utils:
         """
         for key, value in record_list_dict.items():
             filename = f'{filename_prefix}_{key}.csv'
-            utils.record_list_to_csv(record_list=value, output_filename=filename, append=append)   
+            utils.record_list_to_csv(record_list=value, output_filename=filename, append=append, fields=fields)   
+
+
+    @staticmethod
+    def key_fields(key: str | tuple[str]) -> tuple[str]:
+        """
+        #### Inputs: 
+            -@key: a field name, or a tuple/list of field names for a composite key
+        #### Expected Behaviour: 
+            - normalizes the key into a tuple of field names
+        #### Returns: 
+            - tuple of field names
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - Empty key: Raised if no field names are given
+        """
+        fields = (key,) if isinstance(key, str) else tuple(key)
+        if len(fields) == 0:
+            raise Exception('Empty key')
+        return(fields)
+
+
+    @staticmethod
+    def key_getter(key: str | tuple[str], missing_as_none: bool = False, key_func=None):
+        """
+        #### Inputs: 
+            -@key: a field name, or a tuple/list of field names for a composite key
+            -@missing_as_none: if True a missing field reads as None (like record.get), 
+                otherwise a missing field raises KeyError
+            -@key_func: optional callable applied to each value of the key (i.e utils.normalize_key), None values are left as None
+        #### Expected Behaviour: 
+            - builds a function reading the key value of a record, a single value for a single field and a 
+                tuple of values for a composite key, so the value can be used directly in a hash index
+        #### Returns: 
+            - callable taking a record and returning its key value
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        fields = utils.key_fields(key)
+        if not missing_as_none:
+            getter = itemgetter(*fields)
+        elif len(fields) == 1:
+            field = fields[0]
+            getter = lambda record: record.get(field)
+        else:
+            getter = lambda record: tuple([record.get(field) for field in fields])
+        if key_func is None:
+            return(getter)
+        composite = len(fields) > 1
+        return(lambda record: utils.map_key(getter(record), key_func, composite))
+
+
+    @staticmethod
+    def map_key(key_value, key_func, composite: bool):
+        """
+        #### Inputs: 
+            -@key_value: a key value, a tuple of values for a composite key 
+            -@key_func: callable applied to each value, or None
+            -@composite: True if the key_value is a tuple of values
+        #### Expected Behaviour: 
+            - applies the key_func to each value of the key, None values are left as None 
+        #### Returns: 
+            - the mapped key value 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        if key_func is None:
+            return(key_value)
+        if composite:
+            return(tuple([None if value is None else key_func(value) for value in key_value]))
+        return(None if key_value is None else key_func(key_value))
+
+
+    @staticmethod
+    def normalize_key(value):
+        """
+        #### Inputs: 
+            -@value: a key value
+        #### Expected Behaviour: 
+            - for text, strips it, collapses runs of whitespace into single spaces and case folds it, 
+                so ' Jane.Doe@X.com' and 'jane.doe@x.com' match. Other values are returned as they are 
+            - meant as the key_func of the joins and RecordIndex
+        #### Returns: 
+            - the normalized value 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        if isinstance(value, str):
+            return(' '.join(value.split()).casefold())
+        return(value)
 
 
     @staticmethod
@@ -364,6 +697,75 @@ class utils:
         #### Expected Behaviour: 
             - Provided two dictionaries will add keys and values from record_two to record_one,
             - it only bothers about keeping record_one items in the case of a collision of keys
+            - the keys of record_one come first, then the new keys of record_two in their order 
+        #### Returns: 
+            - the combined dict 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        return_record = dict(record_one)
+        setdefault = return_record.setdefault
+        for key, value in record_two.items():
+            setdefault(key, value)
+        return(return_record)
+
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def lowered_keys(keys: tuple) -> dict:
+        """
+        #### Inputs: 
+            -@keys: tuple of a record's keys 
+        #### Expected Behaviour: 
+            - maps each lowercased key to the key. Cached, so records sharing their keys (one query's records, 
+                or one record type's) build it once 
+        #### Returns: 
+            - dict of lowercased key to key 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        return({key.lower(): key for key in keys})
+
+
+    @staticmethod
+    def match_fields(fields: list[str], keys) -> list[str]:
+        """
+        #### Inputs: 
+            -@fields: field names as the caller wrote them 
+            -@keys: the records' keys (i.e a header or a record's keys)
+        #### Expected Behaviour: 
+            - spells each field the way keys does, the exact name first, otherwise ignoring case like soql 
+                (i.e 'email' becomes 'Email'). A field not in keys is left as written 
+        #### Returns: 
+            - list of the field names, in the order of fields 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        keys = tuple(keys)
+        present = set(keys)
+        lowered = utils.lowered_keys(keys)
+        return([field if field in present else lowered.get(field.lower(), field) for field in fields])
+
+
+    @staticmethod
+    def combine_projected(record_one: dict, record_two: dict, fields: list[str]) -> dict: 
+        """
+        #### Inputs: 
+            -@record_one: a dict
+            -@record_two: a dict
+            -@fields: the fields to keep 
+        #### Expected Behaviour: 
+            - like combine_records, but only the fields are copied, so the unused fields of either record 
+                never make it into the combined dict. record_one wins a collision, fields missing from both are left out
+            - a field found in neither record by its exact name is matched case-insensitively (like Salesforce 
+                field names), under the record's own key. The lowercased keys are built once per set of keys (see lowered_keys) 
+            - the keys come in the order of fields 
         #### Returns: 
             - the combined dict 
         #### Side Effects: 
@@ -372,7 +774,78 @@ class utils:
             - None 
         """
         return_record = {}
-        return_record.update(record_one)
-        for key in [x for x in record_two if x not in return_record.keys()]:
-            return_record[key] = record_two[key]
+        lowered_one = None
+        for field in fields:
+            if field in record_one:
+                return_record[field] = record_one[field]
+            elif field in record_two:
+                return_record[field] = record_two[field]
+            else:
+                if lowered_one is None:
+                    lowered_one, lowered_two = utils.lowered_keys(tuple(record_one)), utils.lowered_keys(tuple(record_two))
+                key = lowered_one.get(field.lower())
+                if key is not None:
+                    return_record[key] = record_one[key]
+                    continue
+                key = lowered_two.get(field.lower())
+                if key is not None:
+                    return_record[key] = record_two[key]
         return(return_record)
+
+
+    @staticmethod
+    def projector(fields: list[str], nested: bool = False):
+        """
+        #### Inputs: 
+            -@fields: the fields to keep, relationship fields as dotted names (i.e 'Account.Name')
+            -@nested: True for the records of a nested query 
+        #### Expected Behaviour: 
+            - builds a function copying a raw query record with only the fields, keeping its 'attributes'. 
+                A dotted name keeps that field of the relationship dict, a relationship name on its own keeps all of it 
+            - fields are matched case-insensitively like in soql, the record keeps Salesforce's casing (i.e 'email' keeps 'Email') 
+            - for nested records the fields apply to every record type. 'Id' is always kept (children are linked to 
+                their parent by it) and relationship dicts and subqueries are kept with their own records pruned the same way 
+        #### Returns: 
+            - callable taking a raw record and returning the pruned copy 
+        #### Side Effects: 
+            - None 
+        #### Exceptions: 
+            - None 
+        """
+        if nested:
+            keep = {field.lower() for field in fields} | {'attributes', 'id'}
+
+            def prune_nested(record: dict) -> dict:
+                pruned = {}
+                for key, value in record.items():
+                    if key.lower() in keep:
+                        pruned[key] = value
+                    elif type(value) == dict:
+                        if value.get('attributes') != None:
+                            pruned[key] = prune_nested(value)
+                        elif 'records' in value:
+                            pruned[key] = dict(value, records=[prune_nested(nested_record) for nested_record in value['records']])
+                return(pruned)
+            return(prune_nested)
+
+        tree = {} # field name to None (keep it whole) or the tree of its relationship's fields
+        for field in fields:
+            branch = tree
+            *parents, name = field.lower().split('.')
+            for parent in parents:
+                if parent in branch and branch[parent] is None:
+                    break
+                branch = branch.setdefault(parent, {})
+            else:
+                branch[name] = None
+
+        def prune(record: dict, branch: dict) -> dict:
+            pruned = {}
+            for key, value in record.items():
+                if key == 'attributes':
+                    pruned[key] = value
+                elif key.lower() in branch:
+                    sub_branch = branch[key.lower()]
+                    pruned[key] = value if sub_branch is None or type(value) != dict else prune(value, sub_branch)
+            return(pruned)
+        return(lambda record: prune(record, tree))
@@ -0,0 +1,58 @@
+from unittest import TestCase
+from sftocsv import Sftocsv
+from sftocsv.records import ColumnarRecords
+
+
+class test_aggregate(TestCase):
+
+    def setUp(self):
+        self.opportunities = [{'StageName': 'Open', 'Type': 'New', 'Amount': 100, 'OwnerId': 'u1'},
+                              {'StageName': 'Won', 'Type': 'New', 'Amount': 250, 'OwnerId': 'u1'},
+                              {'StageName': 'Open', 'Type': 'Renewal', 'Amount': None, 'OwnerId': 'u2'},
+                              {'StageName': 'Open', 'Type': 'New', 'Amount': 50, 'OwnerId': 'u2'},
+                              {'Type': 'New', 'Amount': 10, 'OwnerId': 'u3'}]
+        self.aggregations = {'Deals': ('count', None), 'Priced': ('count', 'Amount'), 'Total': ('sum', 'Amount'),
+                             'Smallest': ('min', 'Amount'), 'Largest': ('max', 'Amount'), 'Owners': ('count_distinct', 'OwnerId')}
+
+    def test_group_by(self):
+        """
+        #### Function:
+            - Sftocsv.group_by
+        #### Inputs:
+            -@records: opportunities, one without a StageName and one without an Amount
+            -@keys: 'StageName'
+            -@aggregations: one of each function
+        #### Expected Behaviour:
+            - one row per StageName in the order first seen, a missing key groups as None, None amounts are skipped
+            - ColumnarRecords and a generator give the same result
+        #### Assertions:
+            - the groups and their aggregates
+        """
+        expected = [{'StageName': 'Open', 'Deals': 3, 'Priced': 2, 'Total': 150, 'Smallest': 50, 'Largest': 100, 'Owners': 2},
+                    {'StageName': 'Won', 'Deals': 1, 'Priced': 1, 'Total': 250, 'Smallest': 250, 'Largest': 250, 'Owners': 1},
+                    {'StageName': None, 'Deals': 1, 'Priced': 1, 'Total': 10, 'Smallest': 10, 'Largest': 10, 'Owners': 1}]
+        assert(Sftocsv.group_by(self.opportunities, 'StageName', self.aggregations) == expected)
+        assert(Sftocsv.group_by(ColumnarRecords(self.opportunities), 'StageName', self.aggregations) == expected)
+        assert(Sftocsv.group_by((x for x in self.opportunities), 'StageName', self.aggregations) == expected)
+
+    def test_group_by_composite(self):
+        """
+        #### Function:
+            - Sftocsv.group_by
+        #### Inputs:
+            -@keys: ('StageName', 'Type')
+            -@aggregations: a sum, then an invalid function and a sum without a field
+        #### Expected Behaviour:
+            - one row per pair of values, the invalid aggregations raise
+        #### Assertions:
+            - the groups, the exception messages
+        """
+        result = Sftocsv.group_by(self.opportunities, ('StageName', 'Type'), {'Total': ('sum', 'Amount')})
+        assert(result == [{'StageName': 'Open', 'Type': 'New', 'Total': 150}, {'StageName': 'Won', 'Type': 'New', 'Total': 250},
+                          {'StageName': 'Open', 'Type': 'Renewal', 'Total': None}, {'StageName': None, 'Type': 'New', 'Total': 10}])
+        with self.assertRaises(Exception) as context:
+            Sftocsv.group_by(self.opportunities, 'StageName', {'Mean': ('avg', 'Amount')})
+        assert(str(context.exception) == "group_by requires one of ('count', 'sum', 'min', 'max', 'count_distinct') as the function of 'Mean'")
+        with self.assertRaises(Exception) as context:
+            Sftocsv.group_by(self.opportunities, 'StageName', {'Total': ('sum', None)})
+        assert(str(context.exception) == "group_by requires a field for 'sum' of 'Total'")
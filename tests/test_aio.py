@@ -0,0 +1,192 @@
+from unittest import TestCase
+import asyncio
+import json
+import urllib
+from unittest.mock import patch
+from sftocsv import aio
+from sftocsv.aio import AsyncSftocsv
+
+
+class FakeContent:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def iter_chunked(self, size: int):
+        for i in range(0, len(self.body), size):
+            yield self.body[i:i + size]
+
+
+class FakeResponse:
+    def __init__(self, session, status: int, body: bytes):
+        self.session = session
+        self.status = status
+        self.content = FakeContent(body)
+        self.body = body
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.peak = max(self.session.peak, self.session.in_flight)
+        await asyncio.sleep(0.01)
+        return(self)
+
+    async def __aexit__(self, *exc_info):
+        self.session.in_flight -= 1
+
+    async def read(self) -> bytes:
+        return(self.body)
+
+
+class FakeSession:
+    """
+    stands in for an aiohttp.ClientSession, serving pages from a dict of url to (status, json)
+    """
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.urls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    def get(self, url: str, headers: dict = None):
+        self.urls.append(url)
+        status, body = self.pages.get(url, (200, None))
+        if body is None:
+            query = urllib.parse.unquote_plus(url.partition('?q=')[2])
+            body = {'totalSize': 1, 'done': True, 'records': [{'attributes': {'type': 'Lead'}, 'Query': query}]}
+        return(FakeResponse(self, status, json.dumps(body).encode()))
+
+
+class test_aio(TestCase):
+
+    def setUp(self):
+        self.base_url = 'https://example.my.salesforce.com'
+        self.first_url = f'{self.base_url}/services/data/v58.0/query/?q=select+id+from+lead'
+        self.pages = {self.first_url: (200, {'done': False, 'nextRecordsUrl': '/next/1',
+                                             'records': [{'attributes': {'type': 'Lead'}, 'Id': 'Id1'}]}),
+                      f'{self.base_url}/next/1': (200, {'done': True, 
+                                                        'records': [{'attributes': {'type': 'Lead'}, 'Id': 'Id2'}]})}
+
+    def test_async_query_records(self):
+        """
+        #### Function: 
+            - AsyncSftocsv.query_records, AsyncSftocsv.iter_records
+        #### Inputs: 
+            -@querystring: a query with 2 pages 
+        #### Expected Behaviour: 
+            - the pages are followed and the records come back like Sftocsv.query_records 
+        #### Assertions: 
+            - both return the 2 records without attributes 
+        """
+        session = FakeSession(self.pages)
+        client = AsyncSftocsv(self.base_url, 58.0, 'token', session=session)
+
+        async def run():
+            records = await client.query_records('select id from lead')
+            streamed = [record async for record in client.iter_records('select id from lead', chunk_size=7)]
+            return(records, streamed)
+        records, streamed = asyncio.run(run())
+        assert(records == [{'Id': 'Id1'}, {'Id': 'Id2'}])
+        assert(streamed == records)
+
+    def test_async_query_records_locator_pages(self):
+        """
+        #### Function: 
+            - AsyncSftocsv.query_records
+        #### Inputs: 
+            -@querystring: a query of 7 records in pages of 2, nextRecordsUrl of the form '<locator>-<offset>'
+        #### Expected Behaviour: 
+            - the pages after the first are requested together from their locator offsets, 
+                and put back in query order 
+        #### Assertions: 
+            - the records are in order, every page is requested once and the 3 later pages are in flight at once 
+        """
+        locator = '/services/data/v58.0/query/01gXX0000000001'
+        pages = {self.first_url: (200, {'totalSize': 7, 'done': False, 'nextRecordsUrl': f'{locator}-2',
+                                        'records': [{'attributes': {'type': 'Lead'}, 'Id': 'Id0'}, 
+                                                    {'attributes': {'type': 'Lead'}, 'Id': 'Id1'}]})}
+        for offset in range(2, 7, 2):
+            pages[f'{self.base_url}{locator}-{offset}'] = (200, {'totalSize': 7, 'done': offset == 6, 
+                'records': [{'attributes': {'type': 'Lead'}, 'Id': f'Id{i}'} for i in range(offset, min(offset + 2, 7))]})
+        session = FakeSession(pages)
+        client = AsyncSftocsv(self.base_url, 58.0, 'token', session=session)
+        records = asyncio.run(client.query_records('select id from lead'))
+        assert(records == [{'Id': f'Id{i}'} for i in range(7)])
+        assert(sorted(session.urls) == sorted(pages))
+        assert(session.peak == 3)
+
+    def test_async_query_records_uneven_pages(self):
+        """
+        #### Function: 
+            - AsyncSftocsv.query_records
+        #### Inputs: 
+            -@querystring: a query of 5 records in pages of 2, 1 and 2, nextRecordsUrl of the form '<locator>-<offset>'
+        #### Expected Behaviour: 
+            - the pages fetched from offsets of the first page's size don't add up to the totalSize, 
+                so the pages are followed from the first one's nextRecordsUrl instead 
+        #### Assertions: 
+            - every record comes back once, in order 
+        """
+        locator = '/services/data/v58.0/query/01gXX0000000001'
+        lead = lambda i: {'attributes': {'type': 'Lead'}, 'Id': f'Id{i}'}
+        pages = {self.first_url: (200, {'totalSize': 5, 'done': False, 'nextRecordsUrl': f'{locator}-2', 'records': [lead(0), lead(1)]}),
+                 f'{self.base_url}{locator}-2': (200, {'totalSize': 5, 'done': False, 'nextRecordsUrl': f'{locator}-3', 'records': [lead(2)]}),
+                 f'{self.base_url}{locator}-3': (200, {'totalSize': 5, 'done': True, 'records': [lead(3), lead(4)]}),
+                 f'{self.base_url}{locator}-4': (200, {'totalSize': 5, 'done': True, 'records': [lead(4)]})}
+        client = AsyncSftocsv(self.base_url, 58.0, 'token', session=FakeSession(pages))
+        records = asyncio.run(client.query_records('select id from lead'))
+        assert(records == [{'Id': f'Id{i}'} for i in range(5)])
+
+    def test_async_requires_aiohttp(self):
+        """
+        #### Function: 
+            - AsyncSftocsv.__init__
+        #### Inputs: 
+            -@session: None, with aiohttp not installed 
+        #### Expected Behaviour: 
+            - an ImportError names the 'aio' extra, passing a session still works 
+        #### Assertions: 
+            - the error message, a client is created with a session 
+        """
+        with patch.object(aio, 'aiohttp', None):
+            with self.assertRaises(ImportError) as e:
+                AsyncSftocsv(self.base_url, 58.0, 'token')
+            assert('sftocsv[aio]' in str(e.exception))
+            AsyncSftocsv(self.base_url, 58.0, 'token', session=FakeSession({}))
+
+    def test_async_query_error(self):
+        """
+        #### Function: 
+            - AsyncSftocsv.query_records
+        #### Inputs: 
+            -@querystring: a query answered with a 400
+        #### Expected Behaviour: 
+            - the error is raised like Sftocsv.query_records 
+        #### Assertions: 
+            - the exception names the query 
+        """
+        session = FakeSession({self.first_url: (400, [{'errorCode': 'MALFORMED_QUERY'}])})
+        client = AsyncSftocsv(self.base_url, 58.0, 'token', session=session)
+        with self.assertRaises(Exception) as e:
+            asyncio.run(client.query_records('select id from lead'))
+        assert(str(e.exception).startswith('Query of -->select+id+from+lead<-- raised error'))
+
+    def test_async_large_in_query_concurrency(self):
+        """
+        #### Function: 
+            - AsyncSftocsv.large_in_query
+        #### Inputs: 
+            -@in_list: long enough to need 6 chunk queries 
+            -@max_concurrency: 3
+        #### Expected Behaviour: 
+            - the chunk queries run concurrently, never more than max_concurrency at once, 
+                and the results are combined in chunk order 
+        #### Assertions: 
+            - 6 requests are made, the peak in flight is 3, the records are in chunk order 
+        """
+        session = FakeSession({})
+        client = AsyncSftocsv(self.base_url, 58.0, 'token', session=session, max_concurrency=3)
+        in_list = [f"'{i:018d}'" for i in range(5000)]
+        records = asyncio.run(client.large_in_query('select id from lead where id in <in>', in_list))
+        assert(len(session.urls) == len(records) == 6)
+        assert(session.peak == 3)
+        assert(records[0]['Query'].startswith("select id from lead where id in ('000000000000000000'"))
+        assert(records[-1]['Query'].endswith("'000000000000004999')"))
@@ -0,0 +1,167 @@
+from unittest import TestCase
+import os
+import csv
+import json
+import time
+import tempfile
+import threading
+import urllib
+from unittest.mock import patch
+from sftocsv import Sftocsv
+from sftocsv import batch
+from sftocsv.batch import RateLimiter, schedule, load_history, save_history
+from sftocsv.cache import QueryCache
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+
+
+class FakeSession:
+    """
+    stands in for a requests.Session, answering each query with one record per row asked for in its limit
+    """
+    def __init__(self):
+        self.urls = []
+        self.lock = threading.Lock()
+
+    def get(self, url: str, headers: dict = None):
+        with self.lock:
+            self.urls.append(url)
+        query = urllib.parse.unquote_plus(url.partition('?q=')[2])
+        if 'broken' in query:
+            return(FakeResponse(400, [{'errorCode': 'MALFORMED_QUERY'}]))
+        rows = int(query.rpartition('limit ')[2])
+        return(FakeResponse(200, {'done': True, 'records': [{'attributes': {'type': 'Lead'}, 'Id': f'Id{i}'}
+                                                            for i in range(rows)]}))
+
+
+class test_batch(TestCase):
+
+    def test_run_batch(self):
+        """
+        #### Function:
+            - Sftocsv.run_batch
+        #### Inputs:
+            -@manifest: 3 queries with outputs, one of them failing
+            -@session: a session shared by the jobs
+            -@history_path: a history file, empty on the first run
+        #### Expected Behaviour:
+            - every request goes through the session, each job's csv is written, the failure is reported
+                without stopping the others. The second run starts the biggest query first
+            - a job dict listed twice runs twice 
+        #### Assertions:
+            - the results are in manifest order with their rows and errors, the csvs hold the rows,
+                the history holds the successful queries, the second run asks for the biggest query first
+            - the repeated job gives 2 results from 2 requests
+        """
+        session = FakeSession()
+        resource = Sftocsv('https://example.my.salesforce.com', 58.0, 'token', session=session)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest = [{'query': 'select id from lead limit 2', 'output': os.path.join(temp_dir, 'small.csv')},
+                        {'query': 'select id from lead broken', 'output': os.path.join(temp_dir, 'broken.csv')},
+                        {'query': 'select id from lead limit 9', 'output': os.path.join(temp_dir, 'big.csv')}]
+            history_path = os.path.join(temp_dir, 'history.json')
+            results = resource.run_batch(manifest, workers=2, history_path=history_path)
+            assert([result['rows'] for result in results] == [2, None, 9])
+            assert(results[0]['error'] is None and results[2]['error'] is None)
+            assert(results[1]['error'].startswith('Query of -->select+id+from+lead+broken<-- raised error'))
+            assert(not os.path.exists(manifest[1]['output']))
+            with open(manifest[2]['output'], 'r') as big_file:
+                assert(len(list(csv.DictReader(big_file))) == 9)
+            history = load_history(history_path)
+            assert(sorted(x['rows'] for x in history.values()) == [2, 9])
+            assert(len(session.urls) == 3)
+
+            session.urls.clear()
+            resource.run_batch(manifest, workers=1, history_path=history_path)
+            assert([urllib.parse.unquote_plus(url.partition('?q=')[2]) for url in session.urls] ==
+                   ['select id from lead broken', 'select id from lead limit 9', 'select id from lead limit 2'])
+
+            session.urls.clear()
+            job = {'query': 'select id from lead limit 3'}
+            results = resource.run_batch([job, manifest[0], job], workers=2)
+            assert([result['rows'] for result in results] == [3, 2, 3])
+            assert(len(session.urls) == 3)
+
+    def test_run_batch_session(self):
+        """
+        #### Function:
+            - Sftocsv.run_batch
+        #### Inputs:
+            -@resource: an instance without a session
+            -@manifest: 3 queries without outputs
+        #### Expected Behaviour:
+            - one requests.Session is made for the batch, every job's request goes through it,
+                then it's closed and taken off the instance
+        #### Assertions:
+            - one session made, 3 requests on it, closed, the instance's session is None again
+        """
+        session = FakeSession()
+        session.close = lambda: setattr(session, 'closed', True)
+        session.mount = lambda prefix, adapter: None
+        resource = Sftocsv('https://example.my.salesforce.com', 58.0, 'token')
+        with patch.object(batch.requests, 'Session', return_value=session) as make_session:
+            results = resource.run_batch([{'query': f'select id from lead limit {i}'} for i in range(1, 4)], workers=2)
+        assert([result['rows'] for result in results] == [1, 2, 3])
+        make_session.assert_called_once()
+        assert(len(session.urls) == 3)
+        assert(session.closed and resource.session is None)
+
+    def test_save_history_failed_write(self):
+        """
+        #### Function:
+            - batch.save_history
+        #### Inputs:
+            -@history: first a valid history, then one json can't write
+        #### Expected Behaviour:
+            - the failed write re-raises, keeps the earlier history and leaves no temporary file
+        #### Assertions:
+            - the TypeError, the history read back, the files in the directory
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            history_path = os.path.join(temp_dir, 'history.json')
+            save_history(history_path, {'select id from lead': {'rows': 1, 'seconds': 0.5}})
+            with self.assertRaises(TypeError):
+                save_history(history_path, {'select id from lead': {'rows': object(), 'seconds': 0.5}})
+            assert(load_history(history_path) == {'select id from lead': {'rows': 1, 'seconds': 0.5}})
+            assert(os.listdir(temp_dir) == ['history.json'])
+
+    def test_schedule(self):
+        """
+        #### Function:
+            - batch.schedule
+        #### Inputs:
+            -@manifest: 3 jobs, one of them never run
+            -@history: row counts of the other 2, keyed on the normalized query
+        #### Expected Behaviour:
+            - the unknown job first, then the rest by rows descending, matching the query case insensitively
+        #### Assertions:
+            - the order of the jobs
+        """
+        manifest = [{'query': 'select id from contact'}, {'query': 'SELECT Id FROM Account'}, {'query': 'select id from lead'}]
+        history = {QueryCache.normalize_soql('select id from contact'): {'rows': 10, 'seconds': 1.0},
+                   QueryCache.normalize_soql('select id from account'): {'rows': 500, 'seconds': 4.0}}
+        assert([job['query'] for job in schedule(manifest, history)] ==
+               ['select id from lead', 'SELECT Id FROM Account', 'select id from contact'])
+
+    def test_rate_limiter(self):
+        """
+        #### Function:
+            - RateLimiter.acquire, Sftocsv with a rate_limiter
+        #### Inputs:
+            -@rate: 50 requests a second
+            -@burst: 2
+        #### Expected Behaviour:
+            - the burst goes straight through, after that each request waits for a token
+        #### Assertions:
+            - 7 requests take at least 5 intervals of 1/50th of a second
+        """
+        limiter = RateLimiter(rate=50, burst=2)
+        resource = Sftocsv('https://example.my.salesforce.com', 58.0, 'token', session=FakeSession(), rate_limiter=limiter)
+        start = time.monotonic()
+        for _ in range(7):
+            resource.query_records('select id from lead limit 1')
+        assert(time.monotonic() - start >= 5 / 50 * 0.95)
@@ -0,0 +1,60 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import json
+from sftocsv import Sftocsv
+from sftocsv.bulk import bulk_query
+
+
+class test_bulk(TestCase):
+
+    @patch("requests.post")
+    @patch("requests.get")
+    def test_bulk_query(self, mock_get, mock_post):
+        """
+        #### Function:
+            - bulk.bulk_query, Sftocsv.query_auto with the bulk engine
+        #### Inputs:
+            -@querystring: a query whose job is in progress on the first poll, with 2 result pages
+        #### Expected Behaviour:
+            - the job is created, polled until complete, and the result pages are read by following the locator.
+                Empty csv values read as None
+        #### Assertions:
+            - the records of both pages, the locator is passed on the second results request
+        """
+        base_url = 'https://examplecompany.my.salesforce.com'
+        job_url = f'{base_url}/services/data/v58.0/jobs/query/750x'
+        mock_post.return_value = Mock(status_code=200, content=json.dumps({'id': '750x', 'state': 'UploadComplete'}).encode())
+        mock_get.side_effect = [
+            Mock(status_code=200, content=json.dumps({'totalSize': 3, 'done': True, 'records': []}).encode()),
+            Mock(status_code=200, content=json.dumps({'id': '750x', 'state': 'InProgress'}).encode()),
+            Mock(status_code=200, content=json.dumps({'id': '750x', 'state': 'JobComplete', 'numberRecordsProcessed': 3}).encode()),
+            Mock(status_code=200, content=b'"Id","Name"\n"Id0","A"\n"Id1",""\n', headers={'Sforce-Locator': 'loc1'}),
+            Mock(status_code=200, content=b'"Id","Name"\n"Id2","C"\n', headers={'Sforce-Locator': 'null'})]
+        resource = Sftocsv(base_url=base_url, api_version=58.0, access_token='test_token')
+        with patch('sftocsv.bulk.time.sleep'):
+            records = resource.query_auto('select id, name from lead', bulk_threshold=3)
+        assert(records == [{'Id': 'Id0', 'Name': 'A'}, {'Id': 'Id1', 'Name': None}, {'Id': 'Id2', 'Name': 'C'}])
+        assert(mock_post.call_args.kwargs['json'] == {'operation': 'query', 'query': 'select id, name from lead'})
+        assert(mock_get.call_args.kwargs['url'] == f'{job_url}/results')
+        assert(mock_get.call_args.kwargs['params'] == {'locator': 'loc1'})
+
+    @patch("requests.post")
+    @patch("requests.get")
+    def test_bulk_query_failed(self, mock_get, mock_post):
+        """
+        #### Function:
+            - bulk.bulk_query
+        #### Inputs:
+            -@querystring: a query whose job fails
+        #### Expected Behaviour:
+            - the job's error message is raised
+        #### Assertions:
+            - the exception names the query, the state and the message
+        """
+        mock_post.return_value = Mock(status_code=200, content=json.dumps({'id': '750x'}).encode())
+        mock_get.return_value = Mock(status_code=200, content=json.dumps({'id': '750x', 'state': 'Failed',
+                                                                          'errorMessage': 'INVALID_FIELD'}).encode())
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        with self.assertRaises(Exception) as context:
+            bulk_query(resource, 'select idd from lead')
+        assert(str(context.exception) == 'Bulk query of -->select idd from lead<-- ended in state Failed: \n INVALID_FIELD')
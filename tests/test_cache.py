@@ -0,0 +1,168 @@
+from unittest.mock import patch
+from unittest import TestCase
+import os
+import time
+import shutil
+import tempfile
+import requests
+from sftocsv import Sftocsv
+from sftocsv.cache import QueryCache
+
+class test_cache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = '/tmp/sftocsv_test_cache'
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    ### --- normalize_soql tests ---
+    def test_normalize_soql(self):
+        """
+        #### Function:
+            - QueryCache.normalize_soql
+        #### Inputs:
+            -@querystring: 2 calls, the same query written with different case and whitespace
+        #### Expected Behaviour:
+            - whitespace is collapsed and keywords are lowercased, quoted literals keep their case
+        #### Assertions:
+            - both calls normalize to the same string, and the literal is untouched
+        """
+        first = QueryCache.normalize_soql("SELECT Id, Name\n  FROM Lead WHERE Name = 'Big  Co'")
+        second = QueryCache.normalize_soql("select id, name from lead where name = 'Big  Co'  ")
+        assert(first == second)
+        assert(first == "select id, name from lead where name = 'Big  Co'")
+
+    ### --- get/put tests ---
+    def test_put_get_invalidate(self):
+        """
+        #### Function:
+            - QueryCache.put, QueryCache.get, QueryCache.invalidate
+        #### Inputs:
+            -@pages: 2 pages of raw records
+        #### Expected Behaviour:
+            - the pages are written and read back unchanged, keyed on org and api version as well as soql
+            - after invalidate the entry is gone
+        #### Assertions:
+            - get returns the pages, a different org or version misses, invalidate removes the entry
+        """
+        cache = QueryCache(cache_dir=self.cache_dir)
+        pages = [[{'attributes': {'type': 'Lead'}, 'Id': 'Id1'}], [{'attributes': {'type': 'Lead'}, 'Id': 'Id2'}]]
+        cache.put('https://a.my.salesforce.com', 'v58.0', 'select id from lead', pages)
+        assert(cache.get('https://a.my.salesforce.com/', 'v58.0', 'SELECT Id FROM Lead') == pages)
+        assert(cache.get('https://b.my.salesforce.com', 'v58.0', 'select id from lead') == None)
+        assert(cache.get('https://a.my.salesforce.com', 'v59.0', 'select id from lead') == None)
+        assert(cache.invalidate('https://a.my.salesforce.com', 'v58.0', 'select id from lead') == True)
+        assert(cache.get('https://a.my.salesforce.com', 'v58.0', 'select id from lead') == None)
+
+    def test_default_cache_dir(self):
+        """
+        #### Function:
+            - QueryCache.__init__
+        #### Inputs:
+            -@cache_dir: None, with tempfile.tempdir pointed at a test folder
+        #### Expected Behaviour:
+            - the cache lives in 'sftocsv_cache' of the system temp folder
+        #### Assertions:
+            - the cache_dir, and that it was created
+        """
+        with patch.object(tempfile, 'tempdir', self.cache_dir):
+            cache = QueryCache()
+        assert(cache.cache_dir == os.path.join(self.cache_dir, 'sftocsv_cache'))
+        assert(os.path.isdir(cache.cache_dir))
+
+    def test_put_failed_write(self):
+        """
+        #### Function:
+            - QueryCache.put
+        #### Inputs:
+            -@pages: a page with a value json can't write
+        #### Expected Behaviour:
+            - the error is re-raised and the temporary file is removed, no entry is written
+        #### Assertions:
+            - the TypeError is raised, the cache directory is empty and get misses
+        """
+        cache = QueryCache(cache_dir=self.cache_dir)
+        with self.assertRaises(TypeError):
+            cache.put('https://a.my.salesforce.com', 'v58.0', 'select id from lead', [[{'Id': object()}]])
+        assert(os.listdir(self.cache_dir) == [])
+        assert(cache.get('https://a.my.salesforce.com', 'v58.0', 'select id from lead') == None)
+
+    def test_get_expired(self):
+        """
+        #### Function:
+            - QueryCache.get
+        #### Inputs:
+            -@ttl: 10 seconds, the entry's write time is moved back past it
+        #### Expected Behaviour:
+            - the entry is older than the ttl so it's treated as a miss and removed
+        #### Assertions:
+            - get returns None and the entry file no longer exists
+        """
+        cache = QueryCache(cache_dir=self.cache_dir, ttl=10)
+        cache.put('https://a.my.salesforce.com', 'v58.0', 'select id from lead', [[]])
+        path = cache.entry_path('https://a.my.salesforce.com', 'v58.0', 'select id from lead')
+        old = time.time() - 60
+        os.utime(path, (old, old))
+        assert(cache.get('https://a.my.salesforce.com', 'v58.0', 'select id from lead') == None)
+        assert(not os.path.isfile(path))
+
+    def test_evict_lru(self):
+        """
+        #### Function:
+            - QueryCache.evict
+        #### Inputs:
+            -@max_bytes: set to fit only two of the three entries written
+        #### Expected Behaviour:
+            - the first entry is read after the second is written, so the second is the least recently used,
+                writing the third pushes the cache over max_bytes and the second is evicted
+        #### Assertions:
+            - the first and third entries remain, the second is gone
+        """
+        cache = QueryCache(cache_dir=self.cache_dir)
+        pages = [[{'Id': f'Id{i}', 'Name': 'x' * 50} for i in range(20)]]
+        cache.put('org', 'v58.0', 'q1', pages)
+        entry_size = os.path.getsize(cache.entry_path('org', 'v58.0', 'q1'))
+        cache.max_bytes = entry_size * 2 + entry_size // 2
+        now = time.time()
+        cache.put('org', 'v58.0', 'q2', pages)
+        os.utime(cache.entry_path('org', 'v58.0', 'q1'), (now - 30, now))
+        os.utime(cache.entry_path('org', 'v58.0', 'q2'), (now - 20, now))
+        cache.get('org', 'v58.0', 'q1')
+        cache.put('org', 'v58.0', 'q3', pages)
+        assert(cache.get('org', 'v58.0', 'q1') == pages)
+        assert(cache.get('org', 'v58.0', 'q2') == None)
+        assert(cache.get('org', 'v58.0', 'q3') == pages)
+
+    ### --- Sftocsv with cache tests ---
+    @patch("requests.get")
+    def test_query_records_cached(self, mock_get):
+        """
+        #### Function:
+            - Sftocsv.query_records with a cache
+        #### Inputs:
+            -@querystring: the same nested query run twice, once with different formatting
+        #### Expected Behaviour:
+            - the first call misses and requests the records, the second is served from the cache,
+                the raw pages are cached so the nested split works on the cached result as well
+            - after invalidate_cached the next call requests again
+        #### Assertions:
+            - requests.get is only called on the first and last call, the results of all calls are equal
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"totalSize": 1, "done": true, "records": [{"attributes":{"type":"Account","url":"u"},"Name":"Test Name","Id":"test_id","Contacts":{"totalSize":1,"done":true,"records":[{"attributes":{"type":"Contact","url":"u"},"Id":"t_id","LastName":"Test"}]}}]}'
+        mock_get.return_value = response
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token',
+                           cache=QueryCache(cache_dir=self.cache_dir))
+        first = resource.query_records('select name, (select lastname from contacts) from account', nested=True)
+        second = resource.query_records('SELECT Name, (SELECT LastName FROM Contacts) FROM Account', nested=True)
+        assert(mock_get.call_count == 1)
+        assert(first == second == {'Account': [{'Name': 'Test Name', 'Id': 'test_id'}],
+                                   'Contact': [{'Account': 'test_id', 'Id': 't_id', 'LastName': 'Test'}]})
+        assert(resource.invalidate_cached('select name, (select lastname from contacts) from account') == True)
+        third = resource.query_records('select name, (select lastname from contacts) from account', nested=True)
+        assert(mock_get.call_count == 2)
+        assert(third == first)
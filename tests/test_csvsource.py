@@ -0,0 +1,63 @@
+from unittest import TestCase
+import os
+import tempfile
+from sftocsv import Sftocsv
+from sftocsv.csvsource import CsvSource, CsvIndex
+
+
+class test_csvsource(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.records = [{'Id': '1', 'AccountId': 'a1', 'Note': 'plain'},
+                        {'Id': '2', 'AccountId': 'a2', 'Note': 'two\nlines, "quoted"'},
+                        {'Id': '3', 'AccountId': 'a1', 'Note': ''}]
+        self.path = os.path.join(self.temp_dir.name, 'last_week.csv')
+        Sftocsv.records_to_csv(self.records, self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_csv_source_read(self):
+        """
+        #### Function:
+            - CsvSource iteration, len, indexing and slicing
+        #### Inputs:
+            -@path: a csv written by records_to_csv, with a value holding a line break and quotes, given without .csv
+        #### Expected Behaviour:
+            - iterating streams the rows, indexing reads single rows from their offsets, both give the written records
+        #### Assertions:
+            - the records read each way match the records written
+        """
+        source = CsvSource(self.path.rpartition('.csv')[0])
+        assert(list(source) == self.records)
+        assert(len(source) == 3)
+        assert(source[1] == self.records[1])
+        assert(source[-1] == self.records[2])
+        assert(source[0:2] == self.records[0:2])
+        with self.assertRaises(IndexError):
+            source[3]
+        source.close()
+        assert(source[0] == self.records[0])
+
+    def test_csv_index_joins(self):
+        """
+        #### Function:
+            - CsvSource.index, Sftocsv.inner_join, Sftocsv.outer_join, Sftocsv.semi_join with a CsvIndex
+        #### Inputs:
+            -@index: CsvIndex on AccountId
+            -@accounts: records with Ids, one without a match
+        #### Expected Behaviour:
+            - each join gives the same result as with the records the csv was written from
+        #### Assertions:
+            - the join results match, lookups read the rows of a key value
+        """
+        index = CsvSource(self.path).index('AccountId')
+        assert(isinstance(index, CsvIndex))
+        assert(index.lookup('a1') == [self.records[0], self.records[2]])
+        accounts = [{'AId': 'a1', 'Name': 'Acme'}, {'AId': 'a3', 'Name': 'Initech'}]
+        assert(Sftocsv.inner_join(accounts, index, 'AId', 'AccountId') == 
+               Sftocsv.inner_join(accounts, self.records, 'AId', 'AccountId'))
+        assert(Sftocsv.outer_join(accounts, index, 'AId', 'AccountId', side='full') == 
+               Sftocsv.outer_join(accounts, self.records, 'AId', 'AccountId', side='full'))
+        assert(Sftocsv.semi_join(accounts, index, 'AId', 'AccountId') == [accounts[0]])
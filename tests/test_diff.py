@@ -0,0 +1,99 @@
+from unittest import TestCase
+import os
+import tempfile
+from sftocsv import Sftocsv, CsvSource
+from sftocsv import diff
+
+
+class test_diff(TestCase):
+
+    def setUp(self):
+        self.old = [{'Id': '1', 'Status': 'Open', 'Amount': 10},
+                    {'Id': '2', 'Status': 'Open', 'Amount': 20},
+                    {'Id': '3', 'Status': 'Closed', 'Amount': 30}]
+        self.new = [{'Id': '2', 'Status': 'Won', 'Amount': 20},
+                    {'Id': '3', 'Status': 'Closed', 'Amount': 30},
+                    {'Id': '4', 'Status': 'Open', 'Amount': 40}]
+
+    def test_diff_records(self):
+        """
+        #### Function:
+            - Sftocsv.diff_records
+        #### Inputs:
+            -@old: 3 records
+            -@new: a generator of 3 records, one changed, one unchanged, one new, one of the old missing
+        #### Expected Behaviour:
+            - the records are sorted into inserted, deleted and changed with the fields that differ
+        #### Assertions:
+            - each list holds the expected records and deltas, a repeated key raises
+        """
+        result = Sftocsv.diff_records(self.old, (record for record in self.new))
+        assert(result['inserted'] == [self.new[2]])
+        assert(result['deleted'] == [self.old[0]])
+        assert(result['changed'] == [{'key': '2', 'old': self.old[1], 'new': self.new[0], 'deltas': {'Status': ('Open', 'Won')}}])
+        assert(Sftocsv.diff_records(self.old, self.new, fields=['Amount']) ==
+               {'inserted': [self.new[2]], 'deleted': [self.old[0]], 'changed': []})
+        with self.assertRaises(Exception) as context:
+            Sftocsv.diff_records(self.old, self.new + [self.new[0]])
+        assert(str(context.exception) == "diff_records key '2' is not unique in the new records")
+
+    def test_iter_diff_records_csv(self):
+        """
+        #### Function:
+            - Sftocsv.iter_diff_records with a CsvSource
+        #### Inputs:
+            -@old: a CsvSource of the old records written by records_to_csv (so every value is a string)
+            -@new: the new records
+            -@value_func: str, so the csv strings compare equal to the numbers of the query
+        #### Expected Behaviour:
+            - the differences stream out, inserted and changed in new order then deleted
+        #### Assertions:
+            - the changes and their deltas
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'old.csv')
+            Sftocsv.records_to_csv(self.old, path)
+            entries = list(Sftocsv.iter_diff_records(CsvSource(path), self.new, value_func=str))
+        assert([(entry['change'], entry['key']) for entry in entries] == [('changed', '2'), ('inserted', '4'), ('deleted', '1')])
+        assert(entries[0]['deltas'] == {'Status': ('Open', 'Won')})
+        assert(entries[2]['old'] == {'Id': '1', 'Status': 'Open', 'Amount': '10'})
+
+    def test_iter_diff_records_nulls(self):
+        """
+        #### Function:
+            - Sftocsv.iter_diff_records, diff.fingerprint
+        #### Inputs:
+            -@old: a CsvSource of records with None values, written by records_to_csv (None becomes an empty cell)
+            -@new: the same records, one with its keys in another order and one with a field left out
+            -@value_func: str
+        #### Expected Behaviour:
+            - missing fields, None and '' compare equal so nothing has changed
+            - the fingerprint doesn't depend on the order of the keys
+        #### Assertions:
+            - no entries, equal fingerprints
+        """
+        records = [{'Id': '1', 'Amount': None, 'Desc': 'x'}, {'Id': '2', 'Amount': 5, 'Desc': None}]
+        new = [{'Desc': 'x', 'Amount': None, 'Id': '1'}, {'Id': '2', 'Amount': 5}]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'old.csv')
+            Sftocsv.records_to_csv(records, path)
+            assert(list(Sftocsv.iter_diff_records(CsvSource(path), new, value_func=str)) == [])
+        assert(diff.fingerprint(records[0], None) == diff.fingerprint(new[0], None))
+        assert(Sftocsv.diff_records(records, new)['changed'] == [])
+
+    def test_iter_diff_records_hash_collisions(self):
+        """
+        #### Function:
+            - Sftocsv.diff_records, diff.fingerprint
+        #### Inputs:
+            -@old, @new: records whose values collide under hash() (hash(-1) == hash(-2), hash(2**61 + 5) == hash(6))
+        #### Expected Behaviour:
+            - the fingerprints differ, so the changes are found with and without fields
+        #### Assertions:
+            - each pair is reported as changed with its delta
+        """
+        for old_value, new_value in [(-1, -2), (2**61 + 5, 6)]:
+            assert(hash(old_value) == hash(new_value))
+            for fields in (None, ['Amount']):
+                changed = Sftocsv.diff_records([{'Id': 'a', 'Amount': old_value}], [{'Id': 'a', 'Amount': new_value}], 'Id', fields=fields)['changed']
+                assert([entry['deltas'] for entry in changed] == [{'Amount': (old_value, new_value)}])
@@ -0,0 +1,98 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from datetime import date, datetime, timezone, timedelta
+import json
+import urllib
+from sftocsv import Sftocsv, Field
+
+
+class test_filters(TestCase):
+
+    def test_filter_local_and_soql(self):
+        """
+        #### Function:
+            - Field expressions, called on records and compiled with to_soql
+        #### Inputs:
+            -@expression: comparisons, isin, like, a relationship field, a null check, combined with &, | and ~
+        #### Expected Behaviour:
+            - records are matched like soql would, including nulls and ignoring the case of text and of field names, 
+                and the soql is quoted and escaped
+        #### Assertions:
+            - the matching records, the soql of the expression
+        """
+        records = [{'StageName': 'Parked', 'Amount': 500, 'Account': {'Name': 'Acme Ltd'}, 'CloseDate': '2024-03-01'},
+                   {'StageName': 'Won', 'Amount': 2000, 'Account': None, 'CloseDate': '2023-12-01'},
+                   {'StageName': "O'Neil", 'Amount': None, 'Account': {'Name': 'Initech'}, 'CloseDate': None}]
+        assert([x for x in records if (Field('StageName') == 'Parked')(x)] == [records[0]])
+        assert([x for x in records if (Field('StageName') == 'PARKED')(x)] == [records[0]])
+        assert([x for x in records if (Field('StageName') != 'parked')(x)] == records[1:])
+        assert([x for x in records if Field('StageName').isin(['won', "o'neil"])(x)] == records[1:])
+        assert([x for x in records if (Field('Amount') > 1000)(x)] == [records[1]])
+        assert([x for x in records if (Field('Amount') != None)(x)] == records[:2])
+        assert([x for x in records if Field('Account.Name').like('acme%')(x)] == [records[0]])
+        assert([x for x in records if Field('account.NAME').like('acme%')(x)] == [records[0]])
+        assert([x for x in records if (Field('stagename') == 'Won')(x)] == [records[1]])
+        assert([x for x in records if (Field('CloseDate') >= date(2024, 1, 1))(x)] == [records[0]])
+        expression = (Field('StageName').isin(['Won', "O'Neil"]) | (Field('Amount') < 100)) & ~(Field('Account.Name') == 'Initech')
+        assert([x for x in records if expression(x)] == [records[1]])
+        assert(expression.to_soql() == "((StageName IN ('Won', 'O\\'Neil')) OR (Amount < 100)) AND (NOT (Account.Name = 'Initech'))")
+        assert((Field('CloseDate') >= date(2024, 1, 1)).to_soql() == 'CloseDate >= 2024-01-01')
+        assert((Field('IsClosed') == False).to_soql() == 'IsClosed = false')
+        assert((Field('Amount') > 1e20).to_soql() == 'Amount > 100000000000000000000')
+        assert((Field('Amount') > 1.5e-7).to_soql() == 'Amount > 0.00000015')
+        assert(Field('StageName').isin([]).to_soql() == 'Id = null')
+        assert(Field('StageName').not_in([]).to_soql() == 'Id != null')
+        assert([x for x in records if Field('StageName').isin([])(x)] == [])
+        assert((Field('CreatedDate') > datetime(2024, 1, 1, 10, tzinfo=timezone(timedelta(hours=2)))).to_soql() ==
+               'CreatedDate > 2024-01-01T08:00:00Z')
+        naive = datetime(2024, 1, 1, 10)
+        assert((Field('CreatedDate') > naive).to_soql() == 
+               f"CreatedDate > {naive.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}")
+        created = [{'CreatedDate': '2024-01-05T10:00:00.000+0000'}, {'CreatedDate': '2024-01-05T11:30:00.000+0000'}]
+        at_ten = datetime(2024, 1, 5, 10, tzinfo=timezone.utc)
+        assert([x for x in created if (Field('CreatedDate') == at_ten)(x)] == created[:1])
+        assert([x for x in created if Field('CreatedDate').isin([at_ten])(x)] == created[:1])
+        assert([x for x in created if (Field('CreatedDate') > datetime(2024, 1, 5, 12, tzinfo=timezone(timedelta(hours=1))))(x)] == created[1:])
+        with self.assertRaises(TypeError) as context:
+            (Field('StageName') == 'Won') and (Field('Amount') > 5)
+        assert(str(context.exception) == 'Combine filter expressions with & (and), | (or) and ~ (not), not and/or/not')
+
+    @patch("requests.get")
+    def test_query_records_where(self, mock_get):
+        """
+        #### Function:
+            - Sftocsv.query_records with where
+        #### Inputs:
+            -@querystring: a query with a WHERE clause and an ORDER BY
+            -@where: a condition on a filterable field and one on a rich text field
+        #### Expected Behaviour:
+            - the object is described once, the filterable condition is added to the WHERE clause,
+                the rich text condition is run on the records
+            - a local condition on a field written in lower case still matches the records' 'Notes__c'
+        #### Assertions:
+            - the querystring sent, the records left after the local filter, one describe for 2 queries
+        """
+        describe = {'fields': [{'name': 'Id', 'filterable': True}, {'name': 'StageName', 'filterable': True},
+                               {'name': 'Notes__c', 'filterable': False}]}
+        page = {'done': True, 'records': [{'attributes': {'type': 'Opportunity'}, 'Id': '1', 'Notes__c': 'call back'},
+                                          {'attributes': {'type': 'Opportunity'}, 'Id': '2', 'Notes__c': 'lost'}]}
+
+        def respond(url, headers):
+            body = describe if url.endswith('/describe') else page
+            return(Mock(status_code=200, content=json.dumps(body).encode()))
+        mock_get.side_effect = respond
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        where = (Field('StageName') == 'Parked') & Field('Notes__c').like('%call%')
+        for _ in range(2):
+            records = resource.query_records("select id, notes__c from opportunity where amount > 5 order by id", where=where)
+            assert(records == [{'Id': '1', 'Notes__c': 'call back'}])
+        urls = [x.kwargs['url'] for x in mock_get.call_args_list]
+        assert(urls[0] == 'https://examplecompany.my.salesforce.com/services/data/v58.0/sobjects/opportunity/describe')
+        assert(len(urls) == 3)
+        assert(urllib.parse.unquote_plus(urls[1].partition('?q=')[2]) ==
+               "select id, notes__c from opportunity where (amount > 5) AND (StageName = 'Parked') order by id")
+        mock_get.reset_mock()
+        resource.query_records('select id from opportunity', where=Field('StageName') == 'Parked', local_fields=['StageName'])
+        assert(mock_get.call_args.kwargs['url'] == 'https://examplecompany.my.salesforce.com/services/data/v58.0/query/?q=select+id+from+opportunity')
+        records = resource.query_records('select id, notes__c from opportunity', where=Field('notes__c').like('%CALL%'), local_fields=['notes__c'])
+        assert(records == [{'Id': '1', 'Notes__c': 'call back'}])
@@ -0,0 +1,96 @@
+from unittest import TestCase
+from sftocsv import Sftocsv
+from sftocsv.index import RecordIndex
+from sftocsv.utils import utils
+
+class test_index(TestCase):
+
+    def test_record_index_lookup(self):
+        """
+        #### Function: 
+            - RecordIndex.lookup, RecordIndex.get
+        #### Inputs: 
+            -@records: records with a repeated key value and a record missing the key
+            -@key: 'AccountId'
+        #### Expected Behaviour: 
+            - lookup finds every record of a key value in order, get finds the first 
+            - a missing key field reads as None 
+        #### Assertions: 
+            - lookup and get return the expected records, misses return empty/default 
+        """
+        records = [{'Id': 'o1', 'AccountId': 'a1'}, {'Id': 'o2', 'AccountId': 'a2'}, 
+                   {'Id': 'o3', 'AccountId': 'a1'}, {'Id': 'o4'}]
+        index = RecordIndex(records, 'AccountId')
+        assert(len(index) == 4)
+        assert(index.lookup('a1') == [records[0], records[2]])
+        assert(index.lookup(None) == [records[3]])
+        assert(index.lookup('a3') == [])
+        assert(index.get('a2') == records[1])
+        assert(index.get('a3', 'default') == 'default')
+        assert('a1' in index and 'a3' not in index)
+
+    def test_record_index_composite_unique(self):
+        """
+        #### Function: 
+            - RecordIndex with a composite unique key
+        #### Inputs: 
+            -@key: ('FirstName', 'LastName')
+            -@unique: True
+        #### Expected Behaviour: 
+            - lookups take a tuple of values, a repeated key raises 
+        #### Assertions: 
+            - the lookup matches, the duplicate raises the not unique exception 
+        """
+        records = [{'FirstName': 'A', 'LastName': 'B'}, {'FirstName': 'A', 'LastName': 'C'}]
+        index = RecordIndex(records, ('FirstName', 'LastName'), unique=True)
+        assert(index.lookup(('A', 'C')) == [records[1]])
+        with self.assertRaises(Exception) as e:
+            RecordIndex(records + [{'FirstName': 'A', 'LastName': 'B'}], ('FirstName', 'LastName'), unique=True)
+        assert(str(e.exception) == "RecordIndex key ('A', 'B') is not unique")
+
+    def test_record_index_joins(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join, Sftocsv.outer_join, Sftocsv.semi_join with a RecordIndex
+        #### Inputs: 
+            -@index: RecordIndex of accounts on Id, reused for each join 
+            -@opportunities: records with AccountIds, one without a match 
+        #### Expected Behaviour: 
+            - each join gives the same result as with the list the index was built from 
+            - an index on a different key raises 
+        #### Assertions: 
+            - the results are equal and the key mismatch raises 
+        """
+        accounts = [{'Id': 'a1', 'Name': 'A'}, {'Id': 'a2', 'Name': 'B'}, {'Name': 'No Id'}]
+        opportunities = [{'AccountId': 'a1', 'Amount': 1}, {'AccountId': 'a1', 'Amount': 2}, {'AccountId': 'a3', 'Amount': 3}]
+        index = RecordIndex(accounts, 'Id')
+        assert(Sftocsv.inner_join(opportunities, index, 'AccountId', 'Id') == 
+               Sftocsv.inner_join(opportunities, accounts, 'AccountId', 'Id'))
+        assert(Sftocsv.outer_join(opportunities, index, 'AccountId', 'Id', 'full') == 
+               Sftocsv.outer_join(opportunities, accounts, 'AccountId', 'Id', 'full'))
+        assert(Sftocsv.outer_join(index, opportunities, 'Id', 'AccountId', 'right') == 
+               Sftocsv.outer_join(accounts, opportunities, 'Id', 'AccountId', 'right'))
+        assert(Sftocsv.semi_join(opportunities, index, 'AccountId', 'Id') == opportunities[:2])
+        with self.assertRaises(Exception) as e:
+            Sftocsv.inner_join(opportunities, index, 'AccountId', 'Name')
+        assert(str(e.exception) == "right_key must match the key of the RecordIndex ('Id',)")
+
+    def test_record_index_key_func(self):
+        """
+        #### Function: 
+            - RecordIndex with key_func
+        #### Inputs: 
+            -@key_func: utils.normalize_key
+        #### Expected Behaviour: 
+            - lookups are normalized, joins take the index's key_func and a different key_func raises 
+        #### Assertions: 
+            - lookups and the join match ignoring case, the mismatch raises 
+        """
+        contacts = [{'Email': 'Jane@X.com', 'Name': 'Jane'}]
+        index = RecordIndex(contacts, 'Email', key_func=utils.normalize_key)
+        assert(index.lookup(' jane@x.com') == contacts)
+        leads = [{'Id': 'L1', 'LeadEmail': 'JANE@x.com'}]
+        assert(Sftocsv.inner_join(leads, index, 'LeadEmail', 'Email') == [{'Id': 'L1', 'LeadEmail': 'JANE@x.com', 'Name': 'Jane'}])
+        with self.assertRaises(Exception) as e:
+            Sftocsv.inner_join(leads, index, 'LeadEmail', 'Email', key_func=str.lower)
+        assert(str(e.exception) == 'key_func must match the key_func of the RecordIndex')
@@ -0,0 +1,92 @@
+from unittest import TestCase
+from sftocsv import Sftocsv
+from sftocsv import merge
+from sftocsv.utils import utils
+
+class test_merge(TestCase):
+
+    def test_key_runs_groups_equal_keys(self):
+        """
+        #### Function: 
+            - merge.key_runs
+        #### Inputs: 
+            -@records: sorted records with a None key and repeated keys 
+        #### Expected Behaviour: 
+            - consecutive records with the same key are grouped, None first 
+        #### Assertions: 
+            - the runs hold the expected records in order 
+        """
+        records = [{'Key': None}, {'Key': 1}, {'Key': 1}, {'Key': 2}, {'Key': 3}, {'Key': 3}]
+        runs = [run for _, run in merge.key_runs(iter(records), utils.key_getter('Key', missing_as_none=True), composite=False)]
+        assert(runs == [[{'Key': None}], [{'Key': 1}, {'Key': 1}], [{'Key': 2}], [{'Key': 3}, {'Key': 3}]])
+
+    def test_merge_inner_join_duplicate_runs(self):
+        """
+        #### Function: 
+            - Sftocsv.iter_inner_join with strategy='merge'
+        #### Inputs: 
+            -@left_list: generator of records sorted on Email, with a repeated key 
+            -@right_list: generator of records sorted on Email, with a repeated key 
+        #### Expected Behaviour: 
+            - every pair of records in matching runs is combined, the records come out in key order 
+        #### Assertions: 
+            - the result equals the expected records 
+        """
+        left_list = [{'Id': 'L1', 'Email': 'a@x.com'}, {'Id': 'L2', 'Email': 'b@x.com'}, 
+                     {'Id': 'L3', 'Email': 'b@x.com'}, {'Id': 'L4', 'Email': 'd@x.com'}]
+        right_list = [{'ContactEmail': 'b@x.com', 'Name': 'N1'}, {'ContactEmail': 'b@x.com', 'Name': 'N2'}, 
+                      {'ContactEmail': 'c@x.com', 'Name': 'N3'}, {'ContactEmail': 'd@x.com', 'Name': 'N4'}]
+        result = list(Sftocsv.iter_inner_join(iter(left_list), iter(right_list), 'Email', 'ContactEmail', strategy='merge'))
+        assert(result == [{'Id': 'L2', 'Email': 'b@x.com', 'Name': 'N1'}, {'Id': 'L2', 'Email': 'b@x.com', 'Name': 'N2'},
+                          {'Id': 'L3', 'Email': 'b@x.com', 'Name': 'N1'}, {'Id': 'L3', 'Email': 'b@x.com', 'Name': 'N2'},
+                          {'Id': 'L4', 'Email': 'd@x.com', 'Name': 'N4'}])
+
+    def test_merge_full_outer_join(self):
+        """
+        #### Function: 
+            - Sftocsv.outer_join with strategy='merge'
+        #### Inputs: 
+            -@left_list, right_list: sorted records with keys on one side only 
+            -@side: 'full'
+        #### Expected Behaviour: 
+            - unmatched records of either side come out at their place in key order 
+        #### Assertions: 
+            - the result equals the expected records 
+        """
+        left_list = [{'Id': 'L1', 'Key': 1}, {'Id': 'L2', 'Key': 3}]
+        right_list = [{'RightKey': 2, 'Name': 'N2'}, {'RightKey': 3, 'Name': 'N3'}]
+        result = Sftocsv.outer_join(left_list, right_list, 'Key', 'RightKey', 'full', strategy='merge')
+        assert(result == [{'Id': 'L1', 'Key': 1}, {'RightKey': 2, 'Name': 'N2'}, {'Id': 'L2', 'Key': 3, 'Name': 'N3'}])
+
+    def test_merge_join_order_key(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join with strategy='merge' and order_key
+        #### Inputs: 
+            -@left_list, right_list: sorted ignoring case, like soql sorts text fields 
+            -@order_key: str.lower
+        #### Expected Behaviour: 
+            - the lists are accepted as sorted, keys still match exactly 
+        #### Assertions: 
+            - only the exactly equal keys are joined 
+        """
+        left_list = [{'Id': 'L1', 'Email': 'a@x.com'}, {'Id': 'L2', 'Email': 'B@x.com'}]
+        right_list = [{'ContactEmail': 'A@x.com', 'Name': 'N1'}, {'ContactEmail': 'b@x.com', 'Name': 'N2'}, 
+                      {'ContactEmail': 'B@x.com', 'Name': 'N3'}]
+        result = Sftocsv.inner_join(left_list, right_list, 'Email', 'ContactEmail', strategy='merge', order_key=str.lower)
+        assert(result == [{'Id': 'L2', 'Email': 'B@x.com', 'Name': 'N3'}])
+
+    def test_merge_join_unsorted_exception(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join with strategy='merge'
+        #### Inputs: 
+            -@right_list: not sorted on its key 
+        #### Expected Behaviour: 
+            - the out of order record raises 
+        #### Assertions: 
+            - the exception message names the list and keys 
+        """
+        with self.assertRaises(Exception) as e:
+            Sftocsv.inner_join([{'Key': 1}], [{'Key': 2}, {'Key': 1}], 'Key', 'Key', strategy='merge')
+        assert(str(e.exception) == 'merge join requires the right_list sorted on its key, found 1 after 2')
@@ -0,0 +1,78 @@
+from unittest import TestCase
+import os
+import csv
+import tempfile
+from sftocsv import Sftocsv, CsvSource, utils
+from sftocsv import parallel
+
+class test_parallel(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.left_path = os.path.join(self.temp_dir.name, 'left.csv')
+        self.right_path = os.path.join(self.temp_dir.name, 'right.csv')
+        left_list = [{'Id': f'L{i}', 'Key': f'k{i % 90}' if i % 40 else '', 'Desc': 'line one\nline "two"' if i % 7 == 0 else 'x'}
+                     for i in range(600)]
+        right_list = [{'RightKey': f'K{i % 120}', 'Name': f'N{i}'} for i in range(300)]
+        Sftocsv.records_to_csv(left_list, self.left_path)
+        Sftocsv.records_to_csv(right_list, self.right_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_row_chunks(self):
+        """
+        #### Function:
+            - parallel.row_chunks
+        #### Inputs:
+            -@path: a csv with quoted values holding line breaks and quotes
+            -@chunks: 1, then 9
+        #### Expected Behaviour:
+            - the ranges cover every row after the header once and never cut a row
+        #### Assertions:
+            - the header, the rows read from the ranges put together equal the rows of the file
+        """
+        with open(self.left_path, 'r', newline='') as left_file:
+            expected = list(csv.DictReader(left_file))
+        for chunks in (1, 9):
+            header, ranges = parallel.row_chunks(self.left_path, chunks)
+            assert(header == ['Id', 'Key', 'Desc'])
+            assert(len(ranges) == chunks)
+            rows = []
+            with open(self.left_path, 'rb') as left_file:
+                for start, end in ranges:
+                    left_file.seek(start)
+                    rows.extend(csv.DictReader(left_file.read(end - start).decode().splitlines(keepends=True), fieldnames=header))
+            assert(rows == expected)
+
+    def test_parallel_join_csv_matches_joins(self):
+        """
+        #### Function:
+            - Sftocsv.parallel_join_csv
+        #### Inputs:
+            -@left_csv: 600 rows, some with an empty key, some with line breaks in a value
+            -@right_csv: 300 rows with repeated keys in another case
+            -@workers: 2, key_func utils.normalize_key
+        #### Expected Behaviour:
+            - the same rows as joining the two CsvSources in one process, for the inner join and each side of
+                the outer join, the header following the join (the right key hidden unless preserved)
+        #### Assertions:
+            - the counts, the headers, the sorted rows
+        """
+        left, right = CsvSource(self.left_path), CsvSource(self.right_path)
+        output_path = os.path.join(self.temp_dir.name, 'joined.csv')
+        for side, preserve_key in (('inner', False), ('inner', True), ('left', False), ('right', False), ('full', False)):
+            count = Sftocsv.parallel_join_csv(self.left_path, right, 'Key', 'RightKey', output_path, side=side,
+                                              preserve_key=preserve_key, workers=2, key_func=utils.normalize_key)
+            if side == 'inner':
+                expected = Sftocsv.inner_join(left, right, 'Key', 'RightKey', preserve_right_key=preserve_key, key_func=utils.normalize_key)
+            else:
+                expected = Sftocsv.outer_join(left, right, 'Key', 'RightKey', side, key_func=utils.normalize_key)
+            with open(output_path, 'r', newline='') as output_file:
+                header, *rows = list(csv.reader(output_file))
+            assert(count == len(rows) == len(expected))
+            assert(('RightKey' in header) == (preserve_key or side in ('right', 'full')))
+            assert(sorted(rows) == sorted([[record.get(field, '') for field in header] for record in expected]))
+        with self.assertRaises(Exception) as context:
+            Sftocsv.parallel_join_csv(left, right, 'Key', 'RightKey', output_path, side='outer')
+        assert(str(context.exception) == 'parallel_join_csv requires one of ("inner", "left", "right", "full") in "side" argument')
@@ -0,0 +1,105 @@
+from unittest import TestCase
+from sftocsv import Sftocsv
+from sftocsv import planner
+
+class test_planner(TestCase):
+
+    def setUp(self):
+        self.accounts = [{'Id': f'a{i}', 'AccountName': f'A{i}'} for i in range(20)]
+        self.opportunities = [{'OpportunityId': f'o{i}', 'AccountId': f'a{i % 25}'} for i in range(100)]
+        self.roles = [{'RoleOpportunityId': f'o{i % 120}', 'ContactId': f'c{i % 5}'} for i in range(300)]
+        self.contacts = [{'ContactKey': 'c1', 'ContactName': 'C1'}]
+        self.lists = {'Account': self.accounts, 'Opportunity': self.opportunities, 
+                      'OpportunityContactRole': self.roles, 'Contact': self.contacts}
+        self.conditions = [('Account', 'Id', 'Opportunity', 'AccountId'),
+                           ('Opportunity', 'OpportunityId', 'OpportunityContactRole', 'RoleOpportunityId'),
+                           ('OpportunityContactRole', 'ContactId', 'Contact', 'ContactKey')]
+
+    def test_key_stats(self):
+        """
+        #### Function: 
+            - planner.key_stats
+        #### Inputs: 
+            -@records: records with repeated key values and one missing the key 
+        #### Expected Behaviour: 
+            - rows, distinct key values and missing keys are counted 
+        #### Assertions: 
+            - the counts are as expected 
+        """
+        records = [{'Key': 1}, {'Key': 1}, {'Key': 2}, {}]
+        assert(planner.key_stats(records, ('Key',)) == {'rows': 4, 'distinct': 2, 'missing': 1})
+
+    def test_multi_join_dry_run(self):
+        """
+        #### Function: 
+            - Sftocsv.multi_join with dry_run
+        #### Inputs: 
+            -@lists: Account, Opportunity, OpportunityContactRole and a single Contact
+        #### Expected Behaviour: 
+            - the most selective join (the role to the single contact) is planned first, 
+                every list is joined once through a condition 
+        #### Assertions: 
+            - the plan starts with the contact join and covers every list 
+        """
+        steps = Sftocsv.multi_join(self.lists, self.conditions, dry_run=True)
+        assert({steps[0]['join'], steps[1]['join']} == {'OpportunityContactRole', 'Contact'})
+        assert(sorted(step['join'] for step in steps) == sorted(self.lists))
+        assert(steps[0]['on'] == [] and all(step['on'] for step in steps[1:]))
+        assert(steps[-1]['with'] == [step['join'] for step in steps[:-1]])
+
+    def test_multi_join_matches_chained_joins(self):
+        """
+        #### Function: 
+            - Sftocsv.multi_join
+        #### Inputs: 
+            -@lists, conditions: the chain Account to Opportunity to OpportunityContactRole to Contact 
+        #### Expected Behaviour: 
+            - the same records as chaining inner_join in the written order with the keys kept 
+        #### Assertions: 
+            - the sorted results are equal 
+        """
+        chained = Sftocsv.inner_join(self.accounts, self.opportunities, 'Id', 'AccountId', preserve_right_key=True)
+        chained = Sftocsv.inner_join(chained, self.roles, 'OpportunityId', 'RoleOpportunityId', preserve_right_key=True)
+        chained = Sftocsv.inner_join(chained, self.contacts, 'ContactId', 'ContactKey', preserve_right_key=True)
+        result = Sftocsv.multi_join(self.lists, self.conditions)
+        assert(len(result) == len(chained) > 0)
+        assert(sorted(sorted(x.items()) for x in result) == sorted(sorted(x.items()) for x in chained))
+        assert(list(result[0]) == ['Id', 'AccountName', 'OpportunityId', 'AccountId', 'RoleOpportunityId', 'ContactId', 
+                                   'ContactKey', 'ContactName'])
+
+    def test_multi_join_exceptions(self):
+        """
+        #### Function: 
+            - Sftocsv.multi_join
+        #### Inputs: 
+            -@conditions: one naming an unknown list, one leaving a list unconnected 
+        #### Expected Behaviour: 
+            - both raise 
+        #### Assertions: 
+            - the exception messages are as expected 
+        """
+        with self.assertRaises(Exception) as e:
+            Sftocsv.multi_join(self.lists, [('Account', 'Id', 'Lead', 'AccountId')])
+        assert(str(e.exception) == "multi_join has no list named 'Lead'")
+        with self.assertRaises(Exception) as e:
+            Sftocsv.multi_join(self.lists, self.conditions[:2])
+        assert(str(e.exception) == 'multi_join conditions must connect every list')
+
+    def test_multi_join_self_condition(self):
+        """
+        #### Function: 
+            - Sftocsv.multi_join
+        #### Inputs: 
+            -@conditions: only a condition joining a list to itself, then one mixed in with the others 
+        #### Expected Behaviour: 
+            - both raise rather than failing inside the planner or dropping the condition 
+        #### Assertions: 
+            - the exception messages are as expected 
+        """
+        message = "multi_join condition joins 'Account' to itself, add the list again under another name to self join"
+        with self.assertRaises(Exception) as e:
+            Sftocsv.multi_join(self.lists, [('Account', 'Id', 'Account', 'Id')])
+        assert(str(e.exception) == message)
+        with self.assertRaises(Exception) as e:
+            Sftocsv.multi_join(self.lists, self.conditions + [('Account', 'AccountName', 'Account', 'Id')])
+        assert(str(e.exception) == message)
@@ -0,0 +1,210 @@
+from unittest import TestCase
+import os
+import csv
+import shutil
+import pickle
+from sftocsv import Sftocsv
+from sftocsv.records import ColumnarRecords, ColumnarRow, RecordSchema, MergedRecord
+
+class test_records(TestCase):
+
+    ### --- ColumnarRecords tests ---
+    def test_columnar_records_list_compatible(self):
+        """
+        #### Function: 
+            - ColumnarRecords
+        #### Inputs: 
+            -@records: 3 records, the second missing a key and having a None value, the third adding a new key
+        #### Expected Behaviour: 
+            - one column per key with a shared header, missing keys stay missing and None stays None 
+            - iterating, indexing (including negative) and slicing behave like the list of dicts
+        #### Assertions: 
+            - the container equals the input list, indexing and slicing return the expected records
+            - column returns None where a record doesn't have the key
+        """
+        input_list = [{'Id': 'Id1', 'Email': 'a@x.com'},
+                      {'Id': 'Id2', 'Name': None},
+                      {'Id': 'Id3', 'Email': 'c@x.com', 'Phone': '123'}]
+        records = ColumnarRecords(input_list)
+        assert(records.header == ['Id', 'Email', 'Name', 'Phone'])
+        assert(len(records) == 3)
+        assert(records == input_list)
+        assert(list(records) == input_list)
+        assert(records[1] == {'Id': 'Id2', 'Name': None})
+        assert(records[-1] == input_list[-1])
+        assert(records[1:] == input_list[1:])
+        assert(records.column('Email') == ['a@x.com', None, 'c@x.com'])
+        with self.assertRaises(IndexError):
+            records[3]
+
+    def test_columnar_records_write_through(self):
+        """
+        #### Function: 
+            - ColumnarRecords, ColumnarRow
+        #### Inputs: 
+            -@records: 2 records, the second missing 'Email'
+        #### Expected Behaviour: 
+            - records read by index or in a loop are ColumnarRows, setting a field on them writes to the columns, 
+                a new field adds a column missing from the other records, deleting a field makes it missing 
+            - a slice is a copy, to_records gives plain dicts, a pickled row loads as a dict 
+        #### Assertions: 
+            - the changes show in the container, changing a slice or to_records result doesn't 
+        """
+        records = ColumnarRecords([{'Id': 'Id1', 'Email': 'a@x.com'}, {'Id': 'Id2'}])
+        assert(isinstance(records[0], ColumnarRow))
+        records[1]['Email'] = 'b@x.com'
+        for record in records:
+            record['Status'] = 'Done' if record['Id'] == 'Id1' else record.get('Status')
+        del records[0]['Email']
+        assert(records == [{'Id': 'Id1', 'Status': 'Done'}, {'Id': 'Id2', 'Email': 'b@x.com', 'Status': None}])
+        assert(records.header == ['Id', 'Email', 'Status'])
+        with self.assertRaises(KeyError):
+            del records[0]['Email']
+        records[0:1][0]['Id'] = 'changed'
+        records.to_records()[0]['Id'] = 'changed'
+        assert(records[0]['Id'] == 'Id1')
+        loaded = pickle.loads(pickle.dumps(records[1]))
+        assert(type(loaded) == dict and loaded == {'Id': 'Id2', 'Email': 'b@x.com', 'Status': None})
+
+    def test_columnar_records_joins(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join, Sftocsv.outer_join with ColumnarRecords inputs
+        #### Inputs: 
+            -@left_list: ColumnarRecords 
+            -@right_list: ColumnarRecords
+        #### Expected Behaviour: 
+            - the joins read the containers as they would lists of dicts 
+        #### Assertions: 
+            - the results equal the joins of the equivalent lists
+        """
+        left = [{'Id': 'a1', 'Name': 'A'}, {'Id': 'a2', 'Name': 'B'}]
+        right = [{'AccountId': 'a1', 'Amount': 10}, {'AccountId': 'a1', 'Amount': 20}, {'AccountId': 'a3', 'Amount': 30}]
+        assert(Sftocsv.inner_join(ColumnarRecords(left), ColumnarRecords(right), 'Id', 'AccountId') == 
+               Sftocsv.inner_join(left, right, 'Id', 'AccountId'))
+        assert(Sftocsv.outer_join(ColumnarRecords(left), ColumnarRecords(right), 'Id', 'AccountId', side='full') == 
+               Sftocsv.outer_join(left, right, 'Id', 'AccountId', side='full'))
+
+    def test_columnar_records_to_csv(self):
+        """
+        #### Function: 
+            - Sftocsv.records_to_csv with ColumnarRecords
+        #### Inputs: 
+            -@records: ColumnarRecords with a record missing a key
+            -@output_filename: 'test_file.csv'
+        #### Expected Behaviour: 
+            - the header comes straight from the container and each record is written as a row 
+        #### Assertions: 
+            - the file read back has every row, with '' for the missing value
+        """
+        os.mkdir('testing_folder')
+        os.chdir('testing_folder')
+        try:
+            records = ColumnarRecords([{'Id': 'Id1', 'Email': 'a@x.com'}, {'Id': 'Id2'}])
+            Sftocsv.records_to_csv(records, output_filename='test_file.csv')
+            with open('test_file.csv', 'r') as r:
+                output_list = list(csv.DictReader(r))
+            assert(output_list == [{'Id': 'Id1', 'Email': 'a@x.com'}, {'Id': 'Id2', 'Email': ''}])
+        finally:
+            os.chdir('..')
+            shutil.rmtree('testing_folder')
+
+
+    ### --- RecordSchema / Row tests ---
+    def test_row_mapping(self):
+        """
+        #### Function: 
+            - RecordSchema.make_row, Row
+        #### Inputs: 
+            -@record: 2 records made from one schema, the second adding a field the first doesn't have 
+        #### Expected Behaviour: 
+            - both rows share the schema, the first row doesn't have the field added after it 
+            - rows read like dicts, including None values and .get defaults 
+        #### Assertions: 
+            - indexing, get, in, len, keys and == against dicts behave as they would on the dicts
+            - a missing key raises KeyError
+        """
+        schema = RecordSchema()
+        first = schema.make_row({'Id': 'Id1', 'Email': 'a@x.com', 'Phone': None})
+        second = schema.make_row({'Id': 'Id2', 'Name': 'B'})
+        assert(first._schema is second._schema)
+        assert(schema.fields == ['Id', 'Email', 'Phone', 'Name'])
+        assert(first['Email'] == 'a@x.com')
+        assert(first.get('Phone', 'default') == None)
+        assert(first.get('Name', 'default') == 'default')
+        assert('Name' in second and 'Name' not in first and 'Email' not in second)
+        assert(len(second) == 2)
+        assert(list(second.keys()) == ['Id', 'Name'])
+        assert(first == {'Id': 'Id1', 'Email': 'a@x.com', 'Phone': None})
+        assert({'Id': 'Id2', 'Name': 'B'} == second)
+        assert([x['Id'] for x in [first, second] if x.get('Email')] == ['Id1'])
+        with self.assertRaises(KeyError):
+            second['Email']
+
+    def test_row_joins(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join with Row inputs
+        #### Inputs: 
+            -@left_list: list of Rows
+            -@right_list: list of Rows
+        #### Expected Behaviour: 
+            - the join reads the rows like dicts and combines them into dicts 
+        #### Assertions: 
+            - the result is equal to the join of the equivalent dicts
+        """
+        left = [{'Id': 'a1', 'Name': 'A'}, {'Id': 'a2', 'Name': 'B'}]
+        right = [{'AccountId': 'a1', 'Amount': 10}, {'AccountId': 'a2', 'Amount': 20}]
+        left_schema, right_schema = RecordSchema(), RecordSchema()
+        left_rows = [left_schema.make_row(x) for x in left]
+        right_rows = [right_schema.make_row(x) for x in right]
+        assert(Sftocsv.inner_join(left_rows, right_rows, 'Id', 'AccountId') == Sftocsv.inner_join(left, right, 'Id', 'AccountId'))
+
+    ### --- MergedRecord tests ---
+    def test_merged_record_view(self):
+        """
+        #### Function: 
+            - MergedRecord
+        #### Inputs: 
+            -@left: record sharing a key with the right 
+            -@right: record with a join key to hide 
+        #### Expected Behaviour: 
+            - left values win on collisions, hidden keys are left out, keys are in left then right order 
+            - changing the view copies it into a dict and leaves the source records untouched 
+        #### Assertions: 
+            - reads, len, order and equality match utils.combine_records, the sources are unchanged after a change 
+        """
+        left = {'Id': 'L1', 'Name': 'Left'}
+        right = {'AccountId': 'L1', 'Name': 'Right', 'Amount': 10}
+        merged = MergedRecord(left, right, ('AccountId',))
+        assert(merged == {'Id': 'L1', 'Name': 'Left', 'Amount': 10})
+        assert(list(merged) == ['Id', 'Name', 'Amount'])
+        assert(len(merged) == 3)
+        assert(merged['Name'] == 'Left')
+        assert('AccountId' not in merged and merged.get('AccountId') == None)
+        with self.assertRaises(KeyError):
+            merged['AccountId']
+        merged['Name'] = 'Changed'
+        del merged['Amount']
+        assert(merged == {'Id': 'L1', 'Name': 'Changed'})
+        assert(left == {'Id': 'L1', 'Name': 'Left'})
+        assert(right == {'AccountId': 'L1', 'Name': 'Right', 'Amount': 10})
+
+    def test_join_views(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join, Sftocsv.outer_join with views=True
+        #### Inputs: 
+            -@left_list, right_list: records with a fan out of 2 on one key and an unmatched left record
+        #### Expected Behaviour: 
+            - matched records are MergedRecord views equal to the records of the normal joins 
+        #### Assertions: 
+            - the results are equal and the matches are MergedRecords 
+        """
+        left = [{'Id': 'a1', 'Name': 'A'}, {'Id': 'a2', 'Name': 'B'}]
+        right = [{'AccountId': 'a1', 'Amount': 10}, {'AccountId': 'a1', 'Amount': 20}]
+        result = Sftocsv.inner_join(left, right, 'Id', 'AccountId', views=True)
+        assert(all(isinstance(x, MergedRecord) for x in result))
+        assert(result == Sftocsv.inner_join(left, right, 'Id', 'AccountId'))
+        result = Sftocsv.outer_join(left, right, 'Id', 'AccountId', 'left', True, views=True)
+        assert(result == Sftocsv.outer_join(left, right, 'Id', 'AccountId', 'left', True))
@@ -1,11 +1,15 @@
 from sftocsv import Sftocsv
 from sftocsv import utils
+from sftocsv.records import ColumnarRecords
+from sftocsv import Field, RecordIndex
 from unittest.mock import Mock, patch, call 
 import requests
 import json
 from unittest import TestCase
 import os
 import csv
+import shutil
+import copy
 class test_sftocsv(TestCase):
     if os.path.isfile("/tmp/sf_token_store.json"):
         os.remove('/tmp/sf_token_store.json') #this can't be kept forever. Tests should never affect production
@@ -180,6 +184,77 @@ class test_sftocsv(TestCase):
             resp = resource.query_records('select id from opportunity')
         assert(f'Query of -->select+id+from+opportunity<-- on nextUrl -->fake_url<-- raised error: \n error' == str(context.exception)) 
 
+    @patch("requests.get")
+    def test_query_records_columnar(self, mock_get):
+        """
+        #### Function: 
+            - Sftocsv.query_records
+        #### Inputs:
+            3 calls
+            1. -@record_format: 'columnar'
+            2. -@record_format: 'row'
+            3. -@record_format: 'other'
+        #### Expected Behaviour: 
+            - 1. the attributes are removed and the records are loaded into a ColumnarRecords
+            - 2. the attributes are removed and each record becomes a Row sharing one schema
+            - 3. the record_format isn't recognised so an exception is raised
+        #### Assertions: 
+            - the returned value is a ColumnarRecords equal to the expected records
+            - the returned Rows are equal to the expected records and share a schema
+            - the expected exception is raised
+        """
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        mock_response = requests.Response()
+        mock_response._content = b"""{"totalSize":2,"done":true,"records":[{"attributes":{"type":"Opportunity","url":"u"},"Id":"Id1", "field": "value1"},
+                                                                         {"attributes":{"type":"Opportunity","url":"u"},"Id":"Id2", "field": null}]}"""
+        mock_response.status_code = 200
+        mock_get.return_value = mock_response
+        resp = resource.query_records("select id, field from opportunity", record_format='columnar')
+        assert(isinstance(resp, ColumnarRecords))
+        assert(resp == [{"Id" : "Id1", "field": "value1"}, {"Id": "Id2", "field": None}])
+        mock_response._content = mock_response._content.replace(b'"Id2"', b'"Id3"')
+        resp = resource.query_records("select id, field from opportunity", record_format='row')
+        assert(resp == [{"Id" : "Id1", "field": "value1"}, {"Id": "Id3", "field": None}])
+        assert(resp[0]._schema is resp[1]._schema)
+        with self.assertRaises(Exception) as context:
+            resource.query_records("select id, field from opportunity", record_format='other')
+        assert(str(context.exception) == 'query_records requires one of ("dict", "columnar", "row") in "record_format" argument')
+
+    @patch("requests.get")
+    def test_query_records_fields(self, mock_get):
+        """
+        #### Function: 
+            - Sftocsv.query_records with fields
+        #### Inputs: 
+            -@querystring: a query selecting more fields than are kept, over 2 pages
+            -@fields: ['Id', 'Account.Name'], with a local where filter on a field that isn't kept
+            -@nested: False, then True 
+        #### Expected Behaviour: 
+            - the filter runs on the whole records, then each page is cut down to the fields,
+                keeping only the Name of the Account relationship 
+            - nested records keep their Id and are still split by type 
+        #### Assertions: 
+            - the returned records only have the fields
+        """
+        page_1 = {'done': False, 'nextRecordsUrl': '/next', 'records': [
+            {'attributes': {'type': 'Contact'}, 'Id': 'c1', 'Notes__c': 'keep', 'Email': 'a@x.com',
+             'Account': {'attributes': {'type': 'Account'}, 'Name': 'Acme', 'Industry': 'Retail'}},
+            {'attributes': {'type': 'Contact'}, 'Id': 'c2', 'Notes__c': 'drop', 'Email': 'b@x.com', 'Account': None}]}
+        page_2 = {'done': True, 'records': [
+            {'attributes': {'type': 'Contact'}, 'Id': 'c3', 'Notes__c': 'keep', 'Email': 'c@x.com', 'Account': None}]}
+        mock_get.side_effect = lambda url, headers: Mock(status_code=200, content=json.dumps(page_2 if url.endswith('/next') else page_1).encode())
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        resp = resource.query_records('select id, notes__c, email, account.name, account.industry from contact',
+                                      where=Field('Notes__c') == 'keep', local_fields=['Notes__c'], fields=['Id', 'Account.Name'])
+        assert(resp == [{'Id': 'c1', 'Account': {'attributes': {'type': 'Account'}, 'Name': 'Acme'}}, 
+                        {'Id': 'c3', 'Account': None}])
+        page_1 = {'done': True, 'records': [
+            {'attributes': {'type': 'Account'}, 'Id': 'a1', 'Name': 'Acme', 'Industry': 'Retail', 
+             'Contacts': {'done': True, 'records': [{'attributes': {'type': 'Contact'}, 'Id': 'c1', 'LastName': 'Doe', 'Title': 'CEO'}]}}]}
+        resp = resource.query_records('select id, name, industry, (select id, lastname, title from contacts) from account', 
+                                      nested=True, fields=['Name', 'LastName'])
+        assert(resp == {'Account': [{'Id': 'a1', 'Name': 'Acme'}], 'Contact': [{'Account': 'a1', 'Id': 'c1', 'LastName': 'Doe'}]})
+
     @patch.object(utils, 'split_nested_record_list')
     @patch("requests.get")
     def test_query_records_nested(self, mock_get, mock_split_nested_record_list):
@@ -204,7 +279,68 @@ class test_sftocsv(TestCase):
         mock_get.return_value = mock_response
         resp = resource.query_records("select name, (select lastname from contacts) from account", nested=True)
         expected_value = [{"attributes":{"type":"Account","url":"contact_url"},"Name":"Test Name","Id":"test_id","Contacts":{"totalSize":1,"done":True,"records":[{"attributes":{"type":"Contact","url":"contact_url"},"AccountId":"test_a_id","Id":"t_id","LastName":"Test"}]}}]
-        mock_split_nested_record_list.assert_called_once_with(expected_value)
+        mock_split_nested_record_list.assert_called_once()
+        records, = mock_split_nested_record_list.call_args.args
+        assert(list(records) == expected_value) # the records are passed on as they're read from the pages
+        assert(mock_split_nested_record_list.call_args.kwargs == {'record_format': 'dict'})
+
+
+    ### --- iter_records tests ---
+    @patch("requests.get")
+    def test_iter_records_stream(self, mock_get):
+        """
+        #### Function: 
+            - Sftocsv.iter_records, Sftocsv.query_records with stream=True
+        #### Inputs: 
+            -@querystring: 'select id from opportunity'
+            -@chunk_size: 7, so records are split across chunks
+        #### Expected Behaviour: 
+            - each page is requested with stream=True and parsed chunk by chunk,
+                the nextRecordsUrl of the first page is followed
+            - attributes are removed as nested is False
+        #### Assertions: 
+            - the records of both pages are yielded in order, query_records(stream=True) returns the same list
+            - the second request goes to the nextRecordsUrl as a stream
+        """
+        def build_responses():
+            response_1 = requests.Response()
+            response_1.status_code = 200
+            response_1._content = b'{"totalSize":2,"done": false, "nextRecordsUrl": "/fake_url", "records":[{"attributes":{"type":"Opportunity","url":"u"},"Id":"Id1"}]}'
+            response_1._content_consumed = True
+            response_2 = requests.Response()
+            response_2.status_code = 200
+            response_2._content = b'{"totalSize":2,"done": true, "records":[{"attributes":{"type":"Opportunity","url":"u"},"Id":"Id2"}]}'
+            response_2._content_consumed = True
+            return [response_1, response_2]
+        mock_get.side_effect = build_responses()
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        resp = list(resource.iter_records('select id from opportunity', chunk_size=7))
+        assert(resp == [{'Id': 'Id1'}, {'Id': 'Id2'}])
+        assert(mock_get.call_args_list[1] == call(url='https://examplecompany.my.salesforce.com/fake_url',
+                                                  headers={'Authorization': 'Bearer test_token'}, stream=True))
+        mock_get.side_effect = build_responses()
+        assert(resource.query_records('select id from opportunity', stream=True) == [{'Id': 'Id1'}, {'Id': 'Id2'}])
+
+    @patch("requests.get")
+    def test_iter_records_error(self, mock_get):
+        """
+        #### Function: 
+            - Sftocsv.iter_records
+        #### Inputs: 
+            -@querystring: 'select id from opportunity'
+        #### Expected Behaviour: 
+            - the mocked response is non-200 so the same exception as query_records is raised
+        #### Assertions: 
+            - the expected exception is raised
+        """
+        response = requests.Response()
+        response.status_code = 400
+        response._content = 'error'
+        mock_get.return_value = response
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        with self.assertRaises(Exception) as context:
+            list(resource.iter_records('select id from opportunity'))
+        assert(str(context.exception) == 'Query of -->select+id+from+opportunity<-- raised error: \n error')
 
 
     ### --- large_in_query tests --- 
@@ -308,6 +444,164 @@ class test_sftocsv(TestCase):
         mock_query_records.assert_has_calls([call("select id from opportunity where id in ('Id1', 'Id2', 'Id3')"), 
                                              call("select id from opportunity where id in ('Id4', 'Id5', 'Id6')")])
 
+    @patch("requests.get")
+    @patch("requests.post")
+    def test_query_composite(self, mock_post, mock_get):
+        """
+        #### Function: 
+            - Sftocsv.query_composite
+        #### Inputs: 
+            -@querystrings: 30 small queries, the first has a second page 
+        #### Expected Behaviour: 
+            - the queries are posted as 2 composite batches (25 and 5 subrequests), the second page 
+                of the first query is fetched with a get, the results come back in query order 
+        #### Assertions: 
+            - 2 posts with the expected subrequests, 1 get for the next page, the records of each query 
+        """
+        def batch_response(**kwargs):
+            results = []
+            for request in kwargs['json']['batchRequests']:
+                query_id = request['url'].rpartition('%27')[0].rpartition('%27')[2]
+                result = {'done': True, 'records': [{'attributes': {'type': 'Lead'}, 'Id': query_id}]}
+                if query_id == 'Id0':
+                    result.update({'done': False, 'nextRecordsUrl': '/next/1'})
+                results.append({'statusCode': 200, 'result': result})
+            return(Mock(status_code=200, content=bytes(json.dumps({'hasErrors': False, 'results': results}), 'utf-8')))
+        mock_post.side_effect = batch_response
+        mock_get.return_value = Mock(status_code=200, content=bytes(json.dumps({'done': True, 
+                                     'records': [{'attributes': {'type': 'Lead'}, 'Id': 'Id0b'}]}), 'utf-8'))
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        querystrings = [f"select id from lead where id = 'Id{i}'" for i in range(30)]
+        results = resource.query_composite(querystrings)
+        assert(results[0] == [{'Id': 'Id0'}, {'Id': 'Id0b'}])
+        assert(results[1:] == [[{'Id': f'Id{i}'}] for i in range(1, 30)])
+        assert(mock_post.call_count == 2)
+        first_batch = mock_post.call_args_list[0].kwargs
+        assert(first_batch['url'] == 'https://examplecompany.my.salesforce.com/services/data/v58.0/composite/batch')
+        assert(len(first_batch['json']['batchRequests']) == 25)
+        assert(first_batch['json']['batchRequests'][1] == {'method': 'GET', 
+               'url': 'v58.0/query/?q=select+id+from+lead+where+id+%3D+%27Id1%27'})
+        assert(len(mock_post.call_args_list[1].kwargs['json']['batchRequests']) == 5)
+        mock_get.assert_called_once_with(url='https://examplecompany.my.salesforce.com/next/1', 
+                                         headers={'Authorization': 'Bearer test_token'})
+
+    @patch("requests.post")
+    def test_query_composite_error(self, mock_post):
+        """
+        #### Function: 
+            - Sftocsv.query_composite
+        #### Inputs: 
+            -@querystrings: 2 queries, the second subrequest fails 
+        #### Expected Behaviour: 
+            - the failing subrequest is raised naming its query 
+        #### Assertions: 
+            - the exception names the second query 
+        """
+        results = [{'statusCode': 200, 'result': {'done': True, 'records': []}},
+                   {'statusCode': 400, 'result': [{'errorCode': 'MALFORMED_QUERY'}]}]
+        mock_post.return_value = Mock(status_code=200, content=bytes(json.dumps({'hasErrors': True, 'results': results}), 'utf-8'))
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        with self.assertRaises(Exception) as context:
+            resource.query_composite(['select id from lead', 'select idd from lead'])
+        assert(str(context.exception).startswith('Query of -->select+idd+from+lead<-- raised error'))
+
+    @patch("requests.post")
+    def test_large_in_query_composite(self, mock_post):
+        """
+        #### Function: 
+            - Sftocsv.large_in_query with composite=True
+        #### Inputs: 
+            -@in_list: long enough to need 3 chunk queries 
+        #### Expected Behaviour: 
+            - the chunk queries go out as subrequests of one composite batch and are combined in chunk order 
+        #### Assertions: 
+            - 1 post with 3 subrequests, the records of each chunk in order 
+        """
+        results = [{'statusCode': 200, 'result': {'done': True, 'records': [{'attributes': {'type': 'Lead'}, 'Id': f'Id{i}'}]}}
+                   for i in range(3)]
+        mock_post.return_value = Mock(status_code=200, content=bytes(json.dumps({'hasErrors': False, 'results': results}), 'utf-8'))
+        resource = Sftocsv(base_url='https://examplecompany.my.salesforce.com', api_version=58.0, access_token='test_token')
+        in_list = [f"'{i:018d}'" for i in range(2500)]
+        resp = resource.large_in_query('select id from lead where id in (<in>)', in_list, composite=True)
+        assert(resp == [{'Id': 'Id0'}, {'Id': 'Id1'}, {'Id': 'Id2'}])
+        assert(mock_post.call_count == 1)
+        assert(len(mock_post.call_args.kwargs['json']['batchRequests']) == 3)
+
+    @patch("requests.get")
+    def test_query_auto(self, mock_get):
+        """
+        #### Function: 
+            - Sftocsv.query_auto, Sftocsv.count_records
+        #### Inputs: 
+            -@querystring: a query of 5 records in pages of 2, called with thresholds below and above its count 
+        #### Expected Behaviour: 
+            - the COUNT() probe picks 'rest' under the parallel_threshold and 'parallel' over it 
+            - the parallel engine requests the pages by locator offset and returns them in query order 
+            - a GROUP BY query skips the probe and uses 'rest' 
+        #### Assertions: 
+            - the dry run plans, the records of both engines, the offset urls requested 
+        """
+        base_url = 'https://examplecompany.my.salesforce.com'
+        records = [{'attributes': {'type': 'Lead'}, 'Id': f'Id{i}'} for i in range(5)]
+
+        def respond(url, headers, **kwargs):
+            if 'COUNT%28%29' in url:
+                body = {'totalSize': 5, 'done': True, 'records': []}
+            else:
+                offset = int(url.rpartition('-')[2]) if '/locator1-' in url else 0
+                body = {'totalSize': 5, 'done': offset + 2 >= 5, 'records': copy.deepcopy(records[offset:offset + 2])}
+                if offset + 2 < 5:
+                    body['nextRecordsUrl'] = f'/services/data/v58.0/query/locator1-{offset + 2}'
+            return(Mock(status_code=200, content=bytes(json.dumps(body), 'utf-8')))
+        mock_get.side_effect = respond
+        resource = Sftocsv(base_url=base_url, api_version=58.0, access_token='test_token')
+        assert(resource.count_records('select id from lead order by name') == 5)
+        assert(mock_get.call_args.kwargs['url'] == f'{base_url}/services/data/v58.0/query/?q=SELECT+COUNT%28%29+from+lead')
+        assert(resource.query_auto('select id from lead', dry_run=True) == {'engine': 'rest', 'count': 5})
+        assert(resource.query_auto('select id from lead', parallel_threshold=5, dry_run=True) == {'engine': 'parallel', 'count': 5})
+        assert(resource.query_auto('select id from lead', parallel_threshold=5, bulk_threshold=5, dry_run=True) 
+               == {'engine': 'bulk', 'count': 5})
+        expected = [{'Id': f'Id{i}'} for i in range(5)]
+        assert(resource.query_auto('select id from lead') == expected)
+        mock_get.reset_mock()
+        assert(resource.query_auto('select id from lead', parallel_threshold=5, workers=2) == expected)
+        urls = sorted(x.kwargs['url'] for x in mock_get.call_args_list)
+        assert(urls[-2:] == [f'{base_url}/services/data/v58.0/query/locator1-2', f'{base_url}/services/data/v58.0/query/locator1-4'])
+        mock_get.reset_mock()
+        assert(resource.query_auto('select leadsource, count(id) from lead group by leadsource', parallel_threshold=0, dry_run=True)
+               == {'engine': 'rest', 'count': None})
+        mock_get.assert_not_called()
+
+    @patch("requests.get")
+    def test_query_auto_uneven_pages(self, mock_get):
+        """
+        #### Function: 
+            - Sftocsv.query_auto with the parallel engine
+        #### Inputs: 
+            -@querystring: a query of 5 records whose second page only holds 1 record (pages of 2, 1, 2)
+        #### Expected Behaviour: 
+            - the pages fetched from offsets worked out from the first page's size skip a record, so they're 
+                dropped and the pages are followed from the first one's nextRecordsUrl 
+        #### Assertions: 
+            - every record comes back once, in order 
+        """
+        base_url = 'https://examplecompany.my.salesforce.com'
+        records = [{'attributes': {'type': 'Lead'}, 'Id': f'Id{i}'} for i in range(5)]
+
+        def page(url):
+            if 'COUNT%28%29' in url:
+                return({'totalSize': 5, 'done': True, 'records': []})
+            offset = int(url.rpartition('-')[2]) if '/locator1-' in url else 0
+            end = offset + (1 if offset == 2 else 2)
+            body = {'totalSize': 5, 'done': end >= 5, 'records': copy.deepcopy(records[offset:end])}
+            if end < 5:
+                body['nextRecordsUrl'] = f'/services/data/v58.0/query/locator1-{end}'
+            return(body)
+        mock_get.side_effect = lambda url, headers, **kwargs: Mock(status_code=200, content=bytes(json.dumps(page(url)), 'utf-8'))
+        resource = Sftocsv(base_url=base_url, api_version=58.0, access_token='test_token')
+        expected = [{'Id': f'Id{i}'} for i in range(5)]
+        assert(resource.query_auto('select id from lead', parallel_threshold=5, workers=2) == expected)
+
     ### --- records_to_csv tests ---
     @patch.object(utils, 'record_list_dict_to_csv')
     @patch.object(utils, 'record_list_to_csv')
@@ -458,6 +752,146 @@ class test_sftocsv(TestCase):
         assert resp == expected_response
 
 
+    def test_inner_join_composite_key(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join
+        #### Inputs: 
+            -@left_list: contacts, one matching a lead on all of first name, last name and company,
+                one matching on only two of them, one missing a key field
+            -@right_list: leads
+            -@left_key: ('FirstName', 'LastName', 'Company')
+            -@right_key: ('First', 'Last', 'Org')
+        #### Expected Behaviour: 
+            - only records matching on every field of the composite key are combined 
+            - the right key fields are removed as preserve_right_key is False
+        #### Assertions: 
+            - the returned list has the single combined record 
+            - keys of different lengths raise the expected exception 
+        """
+        contacts = [{'FirstName': 'Ann', 'LastName': 'Lee', 'Company': 'Acme', 'Id': 'c1'},
+                    {'FirstName': 'Ann', 'LastName': 'Lee', 'Company': 'Other', 'Id': 'c2'},
+                    {'FirstName': 'Ann', 'LastName': 'Lee', 'Id': 'c3'}]
+        leads = [{'First': 'Ann', 'Last': 'Lee', 'Org': 'Acme', 'LeadId': 'l1'},
+                 {'First': 'Bob', 'Last': 'Lee', 'Org': 'Other', 'LeadId': 'l2'}]
+        resp = Sftocsv.inner_join(contacts, leads, ('FirstName', 'LastName', 'Company'), ('First', 'Last', 'Org'))
+        assert(resp == [{'FirstName': 'Ann', 'LastName': 'Lee', 'Company': 'Acme', 'Id': 'c1', 'LeadId': 'l1'}])
+        with self.assertRaises(Exception) as context:
+            Sftocsv.inner_join(contacts, leads, ('FirstName', 'LastName'), 'First')
+        assert(str(context.exception) == 'left_key and right_key must have the same number of fields')
+
+
+    ### --- semi_join / anti_join tests ---
+    def test_semi_join(self):
+        """
+        #### Function: 
+            - Sftocsv.semi_join
+        #### Inputs: 
+            -@left_list: leads, one with 2 matching contacts, one with none, one with no Email key
+            -@right_list: contacts
+            -@left_key: 'Email'
+            -@right_key: 'Email'
+        #### Expected Behaviour: 
+            - the left records with a match are returned once each, no matter how many matches they have
+            - relationship dict keys can't be hashed, they're compared instead like inner_join (list or RecordIndex)
+        #### Assertions: 
+            - the returned list only has the matched lead, and it's the same object as the input record 
+        """
+        leads = [{'Id': 'l1', 'Email': 'a@x.com'}, {'Id': 'l2', 'Email': 'b@x.com'}, {'Id': 'l3'}]
+        contacts = [{'Id': 'c1', 'Email': 'a@x.com'}, {'Id': 'c2', 'Email': 'a@x.com'}, {'Id': 'c3'}]
+        resp = Sftocsv.semi_join(leads, contacts, 'Email', 'Email')
+        assert(resp == [{'Id': 'l1', 'Email': 'a@x.com'}])
+        assert(resp[0] is leads[0])
+        contacts = [{'Id': 'c1', 'Account': {'Name': 'Acme'}}, {'Id': 'c2', 'Account': {'Name': 'Initech'}}]
+        accounts = [{'Account': {'Name': 'Acme'}}, {'Account': None}]
+        assert(Sftocsv.semi_join(contacts, accounts, 'Account', 'Account') == contacts[:1])
+        assert(Sftocsv.anti_join(contacts, accounts, 'Account', 'Account') == contacts[1:])
+        assert(Sftocsv.semi_join(contacts, RecordIndex(accounts, 'Account'), 'Account', 'Account') == contacts[:1])
+
+    def test_anti_join(self):
+        """
+        #### Function: 
+            - Sftocsv.anti_join
+        #### Inputs: 
+            -@left_list: accounts, one with an opportunity, one without, one with no Id key
+            -@right_list: opportunities
+            -@left_key: 'Id'
+            -@right_key: 'AccountId'
+        #### Expected Behaviour: 
+            - the left records with no match are returned, a record without the key can't match so it's kept
+        #### Assertions: 
+            - the returned list has the unmatched accounts, as the same objects as the input records 
+        """
+        accounts = [{'Id': 'a1', 'Name': 'A'}, {'Id': 'a2', 'Name': 'B'}, {'Name': 'C'}]
+        opportunities = [{'Id': 'o1', 'AccountId': 'a1'}, {'Id': 'o2'}]
+        resp = Sftocsv.anti_join(accounts, opportunities, 'Id', 'AccountId')
+        assert(resp == [{'Id': 'a2', 'Name': 'B'}, {'Name': 'C'}])
+        assert(resp[0] is accounts[1])
+
+
+    ### --- lazy join tests ---
+    def test_iter_joins_lazy(self):
+        """
+        #### Function: 
+            - Sftocsv.iter_inner_join, Sftocsv.iter_outer_join, Sftocsv.iter_natural_join
+        #### Inputs: 
+            -@left_list: a generator of records that counts how many have been read
+            -@right_list: list[dict]
+        #### Expected Behaviour: 
+            - each join reads the right_list up front, then only reads as many left records 
+                as it needs to produce the next combined record
+            - the full results equal the list versions of the joins 
+        #### Assertions: 
+            - after taking the first result only the first left record has been read
+            - the full results equal inner_join, outer_join and natural_join
+        """
+        left = [{'lkey': 'a', 'key1': 1}, {'lkey': 'b', 'key1': 2}, {'lkey': 'c', 'key1': 3}]
+        right = [{'rkey': 'a', 'key2': 4}, {'rkey': 'c', 'key2': 5}, {'rkey': 'z', 'key2': 6}]
+        read = []
+        def left_stream():
+            for record in left:
+                read.append(record)
+                yield record
+        lazy = Sftocsv.iter_inner_join(left_stream(), right, 'lkey', 'rkey')
+        assert(next(lazy) == {'lkey': 'a', 'key1': 1, 'key2': 4})
+        assert(len(read) == 1)
+        assert(list(lazy) == Sftocsv.inner_join(left, right, 'lkey', 'rkey')[1:])
+        assert(list(Sftocsv.iter_outer_join(left_stream(), right, 'lkey', 'rkey', side='full')) ==
+               Sftocsv.outer_join(left, right, 'lkey', 'rkey', side='full'))
+        assert(list(Sftocsv.iter_natural_join(left_stream(), [{'key1': 2, 'x': 1}])) ==
+               Sftocsv.natural_join(left, [{'key1': 2, 'x': 1}]))
+
+    def test_records_to_csv_stream(self):
+        """
+        #### Function: 
+            - Sftocsv.records_to_csv with a generator
+        #### Inputs: 
+            -@records: an iter_inner_join generator 
+            -@output_filename: 'test_file.csv'
+            -@fieldnames: not passed in, then passed in with append=True 
+        #### Expected Behaviour: 
+            - the generator isn't a list or dict so the records are streamed to the file, 
+                the header is taken from the first record
+            - appending reuses the existing header without writing it again 
+        #### Assertions: 
+            - the file read back has the rows of both calls under one header
+        """
+        os.mkdir('testing_folder')
+        os.chdir('testing_folder')
+        try:
+            left = [{'lkey': 'a', 'key1': '1'}, {'lkey': 'b', 'key1': '2'}]
+            right = [{'rkey': 'a', 'key2': '4'}, {'rkey': 'b', 'key2': '5'}]
+            Sftocsv.records_to_csv(Sftocsv.iter_inner_join(left, right, 'lkey', 'rkey'), output_filename='test_file.csv')
+            Sftocsv.records_to_csv(Sftocsv.iter_inner_join(left[:1], right, 'lkey', 'rkey'), output_filename='test_file.csv', append=True)
+            with open('test_file.csv', 'r') as r:
+                output_list = list(csv.DictReader(r))
+            assert(output_list == [{'lkey': 'a', 'key1': '1', 'key2': '4'}, {'lkey': 'b', 'key1': '2', 'key2': '5'},
+                                   {'lkey': 'a', 'key1': '1', 'key2': '4'}])
+        finally:
+            os.chdir('..')
+            shutil.rmtree('testing_folder')
+
+
     ### --- natural_join tests ---
     def test_natural_join_empties(self):
         """
@@ -858,4 +1292,99 @@ class test_sftocsv(TestCase):
                            {'key3': 'val1h', 'key4': 'val2h', 'rkey': 'z'}]
         assert resp == expected_result
 
- 
\ No newline at end of file
+ 
+
+    def test_outer_join_composite_key(self):
+        """
+        #### Function:
+            - Sftocsv.outer_join
+        #### Inputs: 
+            -@left_list: list[dict]
+            -@right_list: list[dict]
+            -@left_key: ('a', 'b')
+            -@right_key: ('x', 'y')
+            -@side: 'full'
+        #### Expected Behaviour: 
+            - records are matched when both fields of the composite key match, 
+                unmatched records from both sides are kept as in any full join
+        #### Assertions: 
+            - The returned list is as expected 
+        """
+        input_left = [{'a': 1, 'b': 1, 'l': 'l1'}, {'a': 1, 'b': 2, 'l': 'l2'}]
+        input_right = [{'x': 1, 'y': 2, 'r': 'r1'}, {'x': 2, 'y': 1, 'r': 'r2'}]
+        resp = Sftocsv.outer_join(input_left, input_right, ('a', 'b'), ('x', 'y'), side='full')
+        assert(resp == [{'a': 1, 'b': 1, 'l': 'l1'},
+                        {'a': 1, 'b': 2, 'l': 'l2', 'r': 'r1'},
+                        {'x': 2, 'y': 1, 'r': 'r2'}])
+
+    def test_joins_key_func(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join, Sftocsv.outer_join, Sftocsv.semi_join with key_func
+        #### Inputs: 
+            -@input_left: emails differing in case and whitespace from the right
+            -@key_func: utils.normalize_key
+        #### Expected Behaviour: 
+            - keys match after normalizing, the records keep their original values 
+        #### Assertions: 
+            - the returned lists are as expected and the input records are unchanged 
+        """
+        input_left = [{'Id': 'L1', 'Email': ' Jane@X.com'}, {'Id': 'L2', 'Email': 'bob@x.com'}]
+        input_right = [{'ContactEmail': 'jane@x.COM', 'Name': 'Jane'}]
+        resp = Sftocsv.inner_join(input_left, input_right, 'Email', 'ContactEmail', key_func=utils.normalize_key)
+        assert(resp == [{'Id': 'L1', 'Email': ' Jane@X.com', 'Name': 'Jane'}])
+        resp = Sftocsv.outer_join(input_left, input_right, 'Email', 'ContactEmail', 'left', key_func=utils.normalize_key)
+        assert(resp == [{'Id': 'L1', 'Email': ' Jane@X.com', 'Name': 'Jane'}, {'Id': 'L2', 'Email': 'bob@x.com'}])
+        assert(Sftocsv.semi_join(input_left, input_right, 'Email', 'ContactEmail', key_func=utils.normalize_key) == input_left[:1])
+        assert(Sftocsv.inner_join(input_left, input_right, 'Email', 'ContactEmail') == [])
+        assert(input_right == [{'ContactEmail': 'jane@x.COM', 'Name': 'Jane'}])
+
+    def test_joins_fields(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join, Sftocsv.outer_join, Sftocsv.records_to_csv with fields
+        #### Inputs: 
+            -@input_left, @input_right: records with more fields than are kept
+            -@fields: ['Name', 'rkey', 'Title', 'Missing']
+        #### Expected Behaviour: 
+            - the combined records only have the fields found in either record, in the order of fields, 
+                the right key is still left out unless it's preserved 
+            - unmatched outer records are cut down too 
+            - records_to_csv only writes the fields, streamed or not, matching them ignoring case and 
+                writing the records' spelling in the header 
+            - views can't be used with fields 
+            - fields match case-insensitively, keeping the records' keys, and a hidden key stays hidden in any case 
+        #### Assertions: 
+            - the returned lists, the files read back and the raised exception are as expected
+        """
+        input_left = [{'lkey': 1, 'Name': 'Jane', 'Email': 'j@x.com'}, {'lkey': 2, 'Name': 'Bob', 'Email': 'b@x.com'}]
+        input_right = [{'rkey': 1, 'Title': 'CEO', 'Phone': '123'}]
+        fields = ['Name', 'rkey', 'Title', 'Missing']
+        assert(Sftocsv.inner_join(input_left, input_right, 'lkey', 'rkey', fields=fields) == [{'Name': 'Jane', 'Title': 'CEO'}])
+        assert(Sftocsv.inner_join(input_left, input_right, 'lkey', 'rkey', preserve_right_key=True, fields=fields) == 
+               [{'Name': 'Jane', 'rkey': 1, 'Title': 'CEO'}])
+        for strategy in ('hash', 'grace', 'merge'):
+            assert(Sftocsv.outer_join(input_left, input_right, 'lkey', 'rkey', 'left', strategy=strategy, fields=fields) == 
+                   [{'Name': 'Jane', 'Title': 'CEO'}, {'Name': 'Bob'}])
+        assert(Sftocsv.inner_join(input_left, input_right, 'lkey', 'rkey', fields=['name', 'RKEY', 'title']) == [{'Name': 'Jane', 'Title': 'CEO'}])
+        assert(Sftocsv.outer_join(input_left, input_right, 'lkey', 'rkey', 'left', fields=['name', 'title']) == 
+               [{'Name': 'Jane', 'Title': 'CEO'}, {'Name': 'Bob'}])
+        with self.assertRaises(Exception) as context:
+            Sftocsv.inner_join(input_left, input_right, 'lkey', 'rkey', views=True, fields=fields)
+        assert(str(context.exception) == "inner_join can't use views and fields together")
+        os.mkdir('testing_folder')
+        os.chdir('testing_folder')
+        try:
+            Sftocsv.records_to_csv(input_left, output_filename='test_file.csv', fields=['Email', 'Name', 'Missing'])
+            with open('test_file.csv', 'r') as r:
+                assert(list(csv.reader(r)) == [['Email', 'Name'], ['j@x.com', 'Jane'], ['b@x.com', 'Bob']])
+            Sftocsv.records_to_csv(iter(input_left), output_filename='test_file.csv', fields=['Name'])
+            with open('test_file.csv', 'r') as r:
+                assert(list(csv.reader(r)) == [['Name'], ['Jane'], ['Bob']])
+            for records in (input_left, iter(input_left)):
+                Sftocsv.records_to_csv(records, output_filename='test_file.csv', fields=['email', 'NAME'])
+                with open('test_file.csv', 'r') as r:
+                    assert(list(csv.reader(r)) == [['Email', 'Name'], ['j@x.com', 'Jane'], ['b@x.com', 'Bob']])
+        finally:
+            os.chdir('..')
+            shutil.rmtree('testing_folder')
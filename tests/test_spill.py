@@ -0,0 +1,99 @@
+from unittest import TestCase
+import os
+import shutil
+from sftocsv import Sftocsv
+from sftocsv import spill
+from sftocsv.utils import utils
+
+class test_spill(TestCase):
+
+    def setUp(self):
+        self.spill_dir = 'spill_test_dir'
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    @staticmethod
+    def sort_records(records: list[dict]) -> list:
+        return(sorted(sorted(record.items()) for record in records))
+
+    def test_partition_records_round_trip(self):
+        """
+        #### Function: 
+            - spill.partition_records, spill.read_partition
+        #### Inputs: 
+            -@records: 1000 records over 10 key values
+            -@partitions: 4
+        #### Expected Behaviour: 
+            - every record is written to exactly one partition, all records of a key value share a partition 
+        #### Assertions: 
+            - reading the partitions back gives the input records, each key value is found in a single partition
+        """
+        records = [{'Id': i, 'Key': i % 10} for i in range(1000)]
+        parts = spill.partition_records(records, utils.key_getter('Key', missing_as_none=True), 4, self.spill_dir, 'test')
+        assert(len(parts) == 4)
+        read_back = [list(spill.read_partition(path)) for path, _ in parts]
+        assert(self.sort_records([record for part in read_back for record in part]) == self.sort_records(records))
+        for key in range(10):
+            assert(sum(1 for part in read_back if any(record['Key'] == key for record in part)) == 1)
+
+    def test_grace_inner_join_matches_hash(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join with strategy='grace'
+        #### Inputs: 
+            -@left_list: 2000 records, some missing the key 
+            -@right_list: 500 records with repeated keys 
+            -@memory_budget: small enough that partitions are split again
+        #### Expected Behaviour: 
+            - the same records as the in memory hash join, in partition order 
+        #### Assertions: 
+            - sorted results are equal, and no partition files are left behind 
+        """
+        left_list = [{'Id': f'L{i}', 'Key': i % 300} if i % 50 else {'Id': f'L{i}'} for i in range(2000)]
+        right_list = [{'RightKey': i % 250, 'Name': f'N{i}'} for i in range(500)]
+        expected = Sftocsv.inner_join(left_list, right_list, 'Key', 'RightKey')
+        result = Sftocsv.inner_join(left_list, right_list, 'Key', 'RightKey', strategy='grace',
+                                    memory_budget=4096, spill_dir=self.spill_dir)
+        assert(len(result) == len(expected))
+        assert(self.sort_records(result) == self.sort_records(expected))
+        assert(os.listdir(self.spill_dir) == [])
+
+    def test_grace_outer_join_matches_hash(self):
+        """
+        #### Function: 
+            - Sftocsv.outer_join with strategy='grace'
+        #### Inputs: 
+            -@left_list, right_list: records with partly overlapping composite keys
+            -@side: each of 'left', 'right', 'full'
+        #### Expected Behaviour: 
+            - the same records as the in memory outer join for each side 
+        #### Assertions: 
+            - sorted results are equal 
+        """
+        left_list = [{'Id': f'L{i}', 'A': i % 40, 'B': i % 3} for i in range(400)]
+        right_list = [{'A2': i % 60, 'B2': i % 3, 'Name': f'N{i}'} for i in range(300)]
+        for side in ('left', 'right', 'full'):
+            expected = Sftocsv.outer_join(left_list, right_list, ('A', 'B'), ('A2', 'B2'), side)
+            result = Sftocsv.outer_join(left_list, right_list, ('A', 'B'), ('A2', 'B2'), side, strategy='grace',
+                                        memory_budget=2048, spill_dir=self.spill_dir)
+            assert(self.sort_records(result) == self.sort_records(expected))
+
+    def test_join_strategy_exception(self):
+        """
+        #### Function: 
+            - Sftocsv.inner_join, Sftocsv.outer_join
+        #### Inputs: 
+            -@strategy: 'nested'
+        #### Expected Behaviour: 
+            - an invalid strategy raises 
+        #### Assertions: 
+            - both joins raise their strategy exception 
+        """
+        with self.assertRaises(Exception) as e:
+            Sftocsv.inner_join([], [], 'Id', 'Id', strategy='nested')
+        assert(str(e.exception) == 'inner_join requires one of ("hash", "grace", "merge") in "strategy" argument')
+        with self.assertRaises(Exception) as e:
+            Sftocsv.outer_join([], [], 'Id', 'Id', 'left', strategy='nested')
+        assert(str(e.exception) == 'outer_join requires one of ("hash", "grace", "merge") in "strategy" argument')
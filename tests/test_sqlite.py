@@ -0,0 +1,67 @@
+from unittest import TestCase
+import os
+import sqlite3
+import tempfile
+from sftocsv import Sftocsv
+from sftocsv.records import ColumnarRecords
+from sftocsv.sqlite import write_table
+
+
+class test_sqlite(TestCase):
+
+    def test_records_to_sqlite_nested(self):
+        """
+        #### Function:
+            - Sftocsv.records_to_sqlite
+        #### Inputs:
+            -@records: a nested result of accounts and contacts, contacts carrying their 'Account' parent id
+            -@database: a file path
+        #### Expected Behaviour:
+            - one table per type, Id and the parent type column are indexed, the tables join in sql
+        #### Assertions:
+            - the row counts, the indexes, the result of a join query
+        """
+        records = {'Account': [{'Id': 'a1', 'Name': 'Acme'}, {'Id': 'a2', 'Name': 'Initech'}],
+                   'Contact': [{'Id': 'c1', 'LastName': 'Doe', 'Account': 'a1'},
+                               {'Id': 'c2', 'LastName': 'Roe', 'Account': 'a1'},
+                               {'Id': 'c3', 'LastName': 'Poe', 'Account': 'a2'}]}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'records.db')
+            assert(Sftocsv.records_to_sqlite(records, path) == {'Account': 2, 'Contact': 3})
+            connection = sqlite3.connect(path)
+            indexes = {row[0] for row in connection.execute("select name from sqlite_master where type = 'index'")}
+            assert(indexes == {'Account_Id_idx', 'Contact_Id_idx', 'Contact_Account_idx'})
+            rows = connection.execute('select c.LastName from Contact c join Account a on c.Account = a.Id '
+                                      "where a.Name = 'Acme' order by c.LastName").fetchall()
+            assert(rows == [('Doe',), ('Roe',)])
+            connection.close()
+
+    def test_records_to_sqlite_stream(self):
+        """
+        #### Function:
+            - Sftocsv.records_to_sqlite, sqlite.write_table
+        #### Inputs:
+            -@records: a generator whose later records have a new key and a relationship dict, then ColumnarRecords appended
+            -@batch_size: 2, so the new key turns up in a later batch
+        #### Expected Behaviour:
+            - the new column is added, earlier rows read it as NULL, the relationship dict is stored as json
+            - appending adds rows, replacing drops the old ones, a missing table name raises
+        #### Assertions:
+            - the rows of the table after each write
+        """
+        def generate():
+            yield {'Id': '1', 'Name': 'A'}
+            yield {'Id': '2', 'Name': 'B'}
+            yield {'Id': '3', 'Name': 'C', 'Owner': {'Name': 'X'}}
+        connection = sqlite3.connect(':memory:')
+        assert(Sftocsv.records_to_sqlite(generate(), connection, table='Lead', batch_size=2) == 3)
+        assert(connection.execute('select * from Lead order by Id').fetchall() ==
+               [('1', 'A', None), ('2', 'B', None), ('3', 'C', '{"Name": "X"}')])
+        columnar = ColumnarRecords([{'Id': '4', 'Name': 'D'}])
+        assert(Sftocsv.records_to_sqlite(columnar, connection, table='Lead', append=True) == 1)
+        assert(connection.execute('select count(*) from Lead').fetchone() == (4,))
+        assert(write_table(connection, 'Lead', [{'Id': '5'}]) == 1)
+        assert(connection.execute('select * from Lead').fetchall() == [('5',)])
+        with self.assertRaises(Exception) as context:
+            Sftocsv.records_to_sqlite([{'Id': '1'}], connection)
+        assert(str(context.exception) == 'records_to_sqlite requires a table name for non-nested records')
@@ -0,0 +1,66 @@
+from unittest import TestCase
+import json
+from sftocsv.streaming import PageStreamParser
+
+class test_streaming(TestCase):
+
+    ### --- PageStreamParser tests ---
+    def test_feed_byte_at_a_time(self):
+        """
+        #### Function: 
+            - PageStreamParser.feed, PageStreamParser.close
+        #### Inputs: 
+            -@chunk: a page fed one byte at a time, values contain quotes, escapes, brackets and a nested 
+                'records' key so the parser can't rely on simple text matching
+        #### Expected Behaviour: 
+            - each record is decoded as soon as its closing brace arrives 
+            - close decodes the rest of the page with an empty records list
+        #### Assertions: 
+            - the records come back in order and equal to the input 
+            - the envelope keeps nextRecordsUrl and the keys after the records array
+        """
+        records = [{'attributes': {'type': 'Lead'}, 'Id': f'Id{i}', 'Notes': 'a "quoted" \\ [value] {x}: y',
+                    'Child': {'records': [{'Id': 'c'}]}} for i in range(3)]
+        page = {'totalSize': 3, 'done': False, 'nextRecordsUrl': '/next', 'records': records, 'after': {'records': [1]}}
+        data = json.dumps(page).encode('utf-8')
+        parser = PageStreamParser()
+        output = []
+        for i in range(len(data)):
+            output += parser.feed(data[i:i + 1])
+        assert(output == records)
+        assert(parser.close() == {'totalSize': 3, 'done': False, 'nextRecordsUrl': '/next', 'records': [], 'after': {'records': [1]}})
+
+    def test_feed_emits_per_record(self):
+        """
+        #### Function: 
+            - PageStreamParser.feed
+        #### Inputs: 
+            -@chunk: 2 calls, the first ends part way through the second record
+        #### Expected Behaviour: 
+            - the first record is returned by the first call, the second once its remaining bytes arrive 
+        #### Assertions: 
+            - each call returns only the records it completed
+        """
+        data = b'{"done":true,"records":[{"Id":"Id1"},{"Id":"Id2"}]}'
+        split = data.index(b'"Id2"')
+        parser = PageStreamParser()
+        assert(parser.feed(data[:split]) == [{'Id': 'Id1'}])
+        assert(parser.feed(data[split:]) == [{'Id': 'Id2'}])
+        assert(parser.close() == {'done': True, 'records': []})
+
+    def test_close_truncated(self):
+        """
+        #### Function: 
+            - PageStreamParser.close
+        #### Inputs: 
+            -@chunk: a page cut off inside the records array
+        #### Expected Behaviour: 
+            - close finds the records array was never closed and raises
+        #### Assertions: 
+            - the expected exception is raised
+        """
+        parser = PageStreamParser()
+        parser.feed(b'{"done":true,"records":[{"Id":"Id1"},{"Id"')
+        with self.assertRaises(Exception) as context:
+            parser.close()
+        assert(str(context.exception) == 'Response ended inside the records array')
@@ -5,6 +5,7 @@ from unittest import TestCase
 import os
 import csv
 from sftocsv.utils import utils
+from sftocsv.records import ColumnarRecords, Row
 import shutil
 class test_utils(TestCase):
     
@@ -263,6 +264,30 @@ class test_utils(TestCase):
         ###
 
 
+    ### --- set_json_decoder / decode_json tests ---
+    def test_set_json_decoder(self):
+        """
+        #### Function: 
+            - utils.set_json_decoder, utils.decode_json
+        #### Inputs: 
+            2 calls 
+            1. -@decoder: a Mock returning a fixed value
+            2. -@decoder: None
+        #### Expected Behaviour: 
+            - 1. decode_json hands the content to the set decoder and returns its result
+            - 2. the default decoder is restored and decodes the content as json 
+        #### Assertions: 
+            - the mock is called with the content and its value is returned
+            - after restoring, the content is decoded normally
+        """
+        mock_decoder = Mock(return_value={'records': []})
+        utils.set_json_decoder(mock_decoder)
+        assert(utils.decode_json(b'{"records": [1]}') == {'records': []})
+        mock_decoder.assert_called_once_with(b'{"records": [1]}')
+        utils.set_json_decoder(None)
+        assert(utils.decode_json(b'{"records": [1]}') == {'records': [1]})
+
+
     ### --- get_z_time tests ---
     def test_get_z_time(self): 
         """
@@ -501,6 +526,33 @@ class test_utils(TestCase):
         assert(resp['inner'] == [{'Id': 'id3', 'key1': 'valueC', 'linkage': 'id2'}])
 
     
+    def test_split_nested_record_list_formats(self):
+        """
+        #### Function:
+            - utils.split_nested_record_list
+        #### Input:
+            -@input_list: an Account with 2 nested Contacts 
+            -@record_format: 2 calls, 'row' then 'columnar' (given a generator, as query_records passes it)
+        #### Expected Behaviour:
+            - the records are split as they are for dicts, then stored per type as Rows sharing 
+                one schema per type, or as one ColumnarRecords per type 
+        #### Assertions:
+            - both results are equal to the dict result, the Contact rows share a schema
+        """
+        input_list = [{'attributes': {'type': 'Account', 'url': 'u'}, 'Id': 'a1', 'Name': 'A',
+                       'Contacts': {'totalSize': 2, 'done': True, 'records': [
+                           {'attributes': {'type': 'Contact', 'url': 'u'}, 'Id': 'c1', 'Email': 'a@x.com'},
+                           {'attributes': {'type': 'Contact', 'url': 'u'}, 'Id': 'c2', 'Email': None}]}}]
+        expected = {'Contact': [{'Account': 'a1', 'Id': 'c1', 'Email': 'a@x.com'}, {'Account': 'a1', 'Id': 'c2'}],
+                    'Account': [{'Id': 'a1', 'Name': 'A'}]}
+        rows = utils.split_nested_record_list(input_list, record_format='row')
+        assert(rows == expected)
+        assert(isinstance(rows['Contact'][0], Row))
+        assert(rows['Contact'][0]._schema is rows['Contact'][1]._schema)
+        columnar = utils.split_nested_record_list(iter(input_list), record_format='columnar')
+        assert(isinstance(columnar['Contact'], ColumnarRecords))
+        assert(columnar == expected)
+
     ### --- build_in_querystring tests ---
     def test_build_in_querystring_smaller(self):
         """
@@ -750,4 +802,81 @@ class test_utils(TestCase):
 
 
 
-        
\ No newline at end of file
+        
+    ### --- normalize_key tests ---
+    def test_normalize_key(self):
+        """
+        #### Function: 
+            - utils.normalize_key, utils.key_getter with key_func
+        #### Inputs: 
+            -@value: text differing in case and whitespace, a number and None
+        #### Expected Behaviour: 
+            - text is stripped, whitespace collapsed and case folded, other values are unchanged 
+            - a key_getter with the key_func applies it to each key value, None stays None 
+        #### Assertions: 
+            - the normalized values are as expected 
+        """
+        assert(utils.normalize_key('  Jane   DOE ') == 'jane doe')
+        assert(utils.normalize_key(5) == 5)
+        getter = utils.key_getter(('Email', 'Name'), missing_as_none=True, key_func=utils.normalize_key)
+        assert(getter({'Email': 'A@X.com '}) == ('a@x.com', None))
+
+    ### --- build_count_querystring tests ---
+    def test_build_count_querystring(self):
+        """
+        #### Function: 
+            - utils.build_count_querystring
+        #### Inputs: 
+            -@querystring: queries with a subquery, an order by, a limit and keywords inside quoted values, 
+                then queries with a top level GROUP BY or OFFSET 
+        #### Expected Behaviour: 
+            - the select list becomes COUNT() and the order by is dropped, quoted values and subqueries are left alone 
+            - GROUP BY and OFFSET queries aren't countable 
+        #### Assertions: 
+            - the built querystrings are as expected, a query without FROM raises, 
+                GROUP BY and OFFSET only make a query uncountable at the top level and raise when built 
+        """
+        assert(utils.build_count_querystring('select id, name from lead') == 'SELECT COUNT() from lead')
+        assert(utils.build_count_querystring("SELECT Id, (select id from contacts) FROM Account WHERE Name = 'from x order by' ORDER BY Name DESC LIMIT 10")
+               == "SELECT COUNT() FROM Account WHERE Name = 'from x order by' LIMIT 10")
+        assert(utils.build_count_querystring("select id from lead where name = 'it\\'s (from' order by createddate")
+               == "SELECT COUNT() from lead where name = 'it\\'s (from'")
+        with self.assertRaises(Exception) as context:
+            utils.build_count_querystring('select id')
+        assert(str(context.exception) == 'No FROM found in query -->select id<--')
+        assert(utils.countable("select id, (select id from contacts order by name limit 5 offset 5) from account where name = 'group by'"))
+        for querystring in ['select leadsource, count(id) from lead group by leadsource', 'select id from lead order by name limit 10 offset 20']:
+            assert(not utils.countable(querystring))
+            with self.assertRaises(Exception) as context:
+                utils.build_count_querystring(querystring)
+            assert(str(context.exception) == f"Can't count a query with GROUP BY or OFFSET -->{querystring}<--")
+
+    def test_projector(self):
+        """
+        #### Function:
+            - utils.projector
+        #### Inputs:
+            -@fields: plain, dotted and whole relationship names
+            -@nested: False, then True
+        #### Expected Behaviour:
+            - the attributes and the fields are kept, a dotted name keeps that field of the relationship,
+                a relationship name on its own keeps all of it
+            - nested, the Id is kept and subquery records are pruned the same way
+            - fields match whatever their case, the records keep Salesforce's casing
+        #### Assertions:
+            - the pruned records are as expected and the input record is unchanged
+        """
+        record = {'attributes': {'type': 'Contact'}, 'Id': 'c1', 'Email': 'a@x.com',
+                  'Account': {'attributes': {'type': 'Account'}, 'Name': 'Acme', 'Owner': {'Name': 'Jo', 'Email': 'jo@x.com'}},
+                  'Owner': {'Name': 'Al', 'Email': 'al@x.com'}}
+        project = utils.projector(['Email', 'Account.Owner.Name', 'Owner'])
+        assert(project(record) == {'attributes': {'type': 'Contact'}, 'Email': 'a@x.com',
+                                   'Account': {'attributes': {'type': 'Account'}, 'Owner': {'Name': 'Jo'}},
+                                   'Owner': {'Name': 'Al', 'Email': 'al@x.com'}})
+        assert(record['Account']['Owner'] == {'Name': 'Jo', 'Email': 'jo@x.com'})
+        assert(utils.projector(['email', 'ACCOUNT.owner.name', 'owner'])(record) == project(record))
+        nested_record = {'attributes': {'type': 'Account'}, 'Id': 'a1', 'Name': 'Acme', 'Industry': 'Retail',
+                         'Contacts': {'done': True, 'records': [{'attributes': {'type': 'Contact'}, 'Id': 'c1', 'Title': 'CEO'}]}}
+        assert(utils.projector(['name'], nested=True)(nested_record) ==
+               {'attributes': {'type': 'Account'}, 'Id': 'a1', 'Name': 'Acme',
+                'Contacts': {'done': True, 'records': [{'attributes': {'type': 'Contact'}, 'Id': 'c1'}]}})